@@ -0,0 +1,271 @@
+import asyncio
+import json
+import secrets
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Optional, Tuple
+from aiohttp import web
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, scoped_session
+from auth.authentification import authenticate_client
+from config.database import load_database_config, create_salon_engine, create_session_factory, session_scope
+from management.service_management import ServiceService, CategoryService
+from management.schedule_management import AppointmentService
+from management.instrumentation import metrics
+from models.base import create_schema
+from models.schedule import Appointment
+from exceptions import ClientError, ServiceError, MasterError, ScheduleError
+
+# сколько потоков выполняют запросы к бд: не больше, чем соединений в пуле
+API_MAX_WORKERS = 15
+
+# время жизни токена клиента
+TOKEN_TTL_SECONDS = 12 * 60 * 60
+
+# ключи приложения aiohttp
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+SESSIONS_KEY = web.AppKey("session_factory", scoped_session)
+TOKENS_KEY = web.AppKey("tokens", dict)
+
+# ошибки предметной области -> ответ 400 с текстом ошибки
+DOMAIN_ERRORS = (ClientError, ServiceError, MasterError, ScheduleError)
+
+
+def _json_error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({"error": message}, ensure_ascii=False), content_type="application/json")
+
+
+def _parse(value: Any, parse: Callable[[Any], Any], name: str) -> Any:
+    """
+    Разбирает поле запроса (тело, строка запроса или путь)
+
+    Только здесь ошибки разбора превращаются в ответ 400: ValueError и TypeError
+    из остального кода - ошибки сервера, и их не нужно выдавать за ошибки клиента.
+
+    Args:
+        value: Значение поля, None - поле не передано
+        parse: Преобразование (int, date.fromisoformat и т.п.)
+        name: Имя поля для текста ошибки
+
+    Returns:
+        Any: Разобранное значение
+    """
+    if value is None:
+        raise _bad_request(f"Не указан параметр {name}")
+    try:
+        return parse(value)
+    except (ValueError, TypeError):
+        raise _bad_request(f"Неверный параметр {name}: {value}")
+
+
+def _service_json(service) -> Dict[str, Any]:
+    return {"service_id": service.service_id, "service_name": service.service_name, "category_id": service.category_id,
+            "duration_minutes": service.duration_minutes, "price": float(service.price)}
+
+
+def _appointment_json(appointment: Appointment) -> Dict[str, Any]:
+    return {"appointment_id": appointment.appointment_id, "master_id": appointment.master_id,
+            "service_id": appointment.service_id, "schedule_id": appointment.schedule_id,
+            "start": appointment.start_datetime.isoformat(), "end": appointment.end_datetime.isoformat(),
+            "status": appointment.status.value, "notes": appointment.notes or ""}
+
+
+async def run_in_session(app: web.Application, work: Callable[[Session], Any]) -> Any:
+    """
+    Выполняет синхронную работу с бд в пуле потоков приложения
+
+    Каждый вызов получает свою сессию (session_scope) и должен вернуть уже
+    готовые для JSON данные: ORM-объекты после закрытия сессии не читаются.
+
+    Args:
+        app: Приложение
+        work: Функция от сессии
+
+    Returns:
+        Any: Результат work
+    """
+    def call() -> Any:
+        with session_scope(app[SESSIONS_KEY]) as session:
+            return work(session)
+    return await asyncio.get_running_loop().run_in_executor(app[EXECUTOR_KEY], call)
+
+
+def _client_id(request: web.Request) -> int:
+    """ID клиента по токену из заголовка Authorization: Bearer <токен>"""
+    header = request.headers.get("Authorization", "")
+    token = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+    entry: Optional[Tuple[int, float]] = request.app[TOKENS_KEY].get(token)
+    if not entry or entry[1] < time_module.monotonic():
+        request.app[TOKENS_KEY].pop(token, None)
+        raise web.HTTPUnauthorized(text='{"error": "Требуется вход"}', content_type="application/json")
+    return entry[0]
+
+
+def _prune_tokens(tokens: Dict[str, Tuple[int, float]]) -> None:
+    """Удаляет истекшие токены: иначе токены, которые больше не предъявят, копятся все время работы процесса"""
+    now = time_module.monotonic()
+    for token in [token for token, (_, expires_at) in tokens.items() if expires_at < now]:
+        tokens.pop(token, None)
+
+
+async def _read_json(request: web.Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text='{"error": "Тело запроса должно быть JSON"}', content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text='{"error": "Тело запроса должно быть JSON-объектом"}', content_type="application/json")
+    return body
+
+
+@web.middleware
+async def error_middleware(request: web.Request, handler) -> web.StreamResponse:
+    # ошибки сервисов превращаются в JSON-ответ 400; неверные параметры отклоняет _parse
+    try:
+        return await handler(request)
+    except DOMAIN_ERRORS as e:
+        return _json_error(400, str(e))
+
+
+async def login(request: web.Request) -> web.Response:
+    body = await _read_json(request)
+    phone, password = _parse(body.get("phone"), str, "phone"), _parse(body.get("password"), str, "password")
+
+    def work(session: Session) -> Optional[Dict[str, Any]]:
+        client = authenticate_client(session, phone, password)
+        return {"client_id": client.client_id, "full_name": client.full_name} if client else None
+
+    client = await run_in_session(request.app, work)
+    if not client:
+        return _json_error(401, "Неверный телефон или пароль")
+
+    _prune_tokens(request.app[TOKENS_KEY])
+    token = secrets.token_urlsafe(32)
+    request.app[TOKENS_KEY][token] = (client["client_id"], time_module.monotonic() + TOKEN_TTL_SECONDS)
+    return web.json_response({"token": token, **client})
+
+
+async def logout(request: web.Request) -> web.Response:
+    _client_id(request)
+    request.app[TOKENS_KEY].pop(request.headers["Authorization"][len("Bearer "):], None)
+    return web.json_response({"ok": True})
+
+
+async def list_categories(request: web.Request) -> web.Response:
+    categories = await run_in_session(request.app, lambda session: [
+        {"category_id": category.category_id, "category_name": category.category_name}
+        for category in CategoryService(session).get_all_categories()])
+    return web.json_response(categories)
+
+
+async def list_services(request: web.Request) -> web.Response:
+    category_id = _parse(request.query["category_id"], int, "category_id") if request.query.get("category_id") else None
+
+    def work(session: Session):
+        service_service = ServiceService(session)
+        services = service_service.get_services_by_category(category_id) if category_id is not None else service_service.get_all_services()
+        return [_service_json(service) for service in services]
+
+    return web.json_response(await run_in_session(request.app, work))
+
+
+async def service_availability(request: web.Request) -> web.Response:
+    service_id = _parse(request.match_info["service_id"], int, "service_id")
+    target_date = _parse(request.query.get("date"), date.fromisoformat, "date")
+
+    def work(session: Session):
+        availability = AppointmentService(session).get_service_availability(service_id, target_date)
+        return [{"master_id": master_id, "master_name": schedule.master.full_name, "schedule_id": schedule.schedule_id,
+                 "slots": [slot.isoformat() for slot in slots]}
+                for master_id, (schedule, slots) in availability.items()]
+
+    return web.json_response(await run_in_session(request.app, work))
+
+
+async def list_appointments(request: web.Request) -> web.Response:
+    client_id = _client_id(request)
+    appointments = await run_in_session(request.app, lambda session: [
+        _appointment_json(appointment) for appointment in AppointmentService(session).get_client_appointments(client_id)])
+    return web.json_response(appointments)
+
+
+async def create_appointment(request: web.Request) -> web.Response:
+    client_id = _client_id(request)
+    body = await _read_json(request)
+    service_id = _parse(body.get("service_id"), int, "service_id")
+    schedule_id = _parse(body.get("schedule_id"), int, "schedule_id")
+    start = _parse(body.get("start"), datetime.fromisoformat, "start")
+    notes = _parse(body.get("notes", ""), str, "notes")
+
+    def work(session: Session):
+        appointment = AppointmentService(session).create_appointment(client_id, service_id, schedule_id, start, notes)
+        return _appointment_json(appointment) #type:ignore
+
+    return web.json_response(await run_in_session(request.app, work), status=201)
+
+
+async def cancel_appointment(request: web.Request) -> web.Response:
+    client_id = _client_id(request)
+    appointment_id = _parse(request.match_info["appointment_id"], int, "appointment_id")
+    await run_in_session(request.app, lambda session: AppointmentService(session).client_cancel_appointment(appointment_id, client_id))
+    return web.json_response({"appointment_id": appointment_id, "status": "CANCELLED"})
+
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    # пусто, пока замеры не включены (management.instrumentation)
+    return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+
+def create_app(session_factory: scoped_session, max_workers: int = API_MAX_WORKERS) -> web.Application:
+    """
+    Создает HTTP/JSON API салона
+
+    Обработчики асинхронные, а работа с бд выполняется сервисами management в пуле
+    из max_workers потоков, поэтому одно приложение держит сотни соединений,
+    не занимая больше потоков и соединений с бд, чем задано.
+
+    Args:
+        session_factory: Реестр сессий из create_session_factory
+        max_workers: Размер пула потоков для запросов к бд
+
+    Returns:
+        web.Application: Приложение aiohttp
+    """
+    app = web.Application(middlewares=[error_middleware])
+    app[SESSIONS_KEY] = session_factory
+    app[EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="salon-api")
+    app[TOKENS_KEY] = {}
+
+    async def shutdown_executor(app: web.Application) -> None:
+        app[EXECUTOR_KEY].shutdown(wait=True)
+    app.on_cleanup.append(shutdown_executor)
+
+    app.router.add_post("/api/login", login)
+    app.router.add_post("/api/logout", logout)
+    app.router.add_get("/api/categories", list_categories)
+    app.router.add_get("/api/services", list_services)
+    app.router.add_get("/api/services/{service_id}/availability", service_availability)
+    app.router.add_get("/api/appointments", list_appointments)
+    app.router.add_post("/api/appointments", create_appointment)
+    app.router.add_post("/api/appointments/{appointment_id}/cancel", cancel_appointment)
+    app.router.add_get("/metrics", prometheus_metrics)
+    return app
+
+
+def run_api(host: str = "127.0.0.1", port: int = 8080, engine: Optional[Engine] = None) -> None:
+    """Запускает API с настройками подключения из load_database_config (или на готовом движке)"""
+    config = load_database_config()
+    if engine is None:
+        engine = create_salon_engine(config)
+        create_schema(engine)
+    max_workers = 1 if config.is_sqlite else config.pool_size + config.max_overflow
+    web.run_app(create_app(create_session_factory(engine), max_workers), host=host, port=port)
+
+
+if __name__ == "__main__":
+    run_api()
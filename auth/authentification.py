@@ -12,15 +12,31 @@ admin_password = "admin123"
 def simple_hash(password: str) -> str:
     return hashlib.md5(password.encode('utf-8')).hexdigest()
 
+# проверка телефона и пароля клиента без ввода-вывода (меню и HTTP API)
+def authenticate_client(session: Session, phone: str, password: str) -> Optional[Client]:
+    """
+    Ищет клиента по телефону и проверяет пароль
+
+    Args:
+        session: Сессия бд
+        phone: Телефон в любом формате
+        password: Пароль
+
+    Returns:
+        Optional[Client]: Клиент или None, если телефон или пароль неверны
+    """
+    client = session.query(Client).filter(Client.phone == normalize_phone(phone)).first()
+    if client and client.password_hash == simple_hash(password): #type: ignore
+        return client
+    return None
+
 # вход для клиента
 def login_client(session: Session) -> Optional[Client]:
     try:
         phone, password = AuthUI.show_client_login_prompt()
         
-        normalized_phone = normalize_phone(phone)
-        
-        client = session.query(Client).filter(Client.phone == normalized_phone).first()
-        if client and client.password_hash == simple_hash(password): #type: ignore
+        client = authenticate_client(session, phone, password)
+        if client:
             AuthUI.show_client_login_success(client)
             return client
         else:
@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time as timer
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+from models.base import Base
+from models.clients import Client
+from models.masters import Master
+from models.services import Service, ServiceCategory
+from models.schedule import MasterSchedule, Appointment, AppointmentStatus
+from management.schedule_management import ScheduleService, AppointmentService
+
+# Время горячих запросов расписания до и после создания индексов
+# Запуск: python benchmarks/bench_indexes.py --appointments 1000000 [--database-url postgresql://...]
+
+MASTERS = 200
+CLIENTS = 50000
+FIRST_DAY = date(2024, 1, 1)
+
+
+def seed(engine, appointments: int, seed_value: int = 7) -> None:
+    """Заполняет базу мастерами, клиентами, расписаниями на год и записями"""
+    rnd = random.Random(seed_value)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        conn.execute(insert(ServiceCategory), [{"category_id": 1, "category_name": "общая"}])
+        conn.execute(insert(Service), [{"service_id": i, "service_name": f"Услуга {i}", "duration_minutes": 30 * i,
+                                        "price": 1000 * i, "category_id": 1} for i in range(1, 5)])
+        conn.execute(insert(Master), [{"master_id": i, "first_name": "Мастер", "last_name": str(i), "phone": f"+7900{i:07d}",
+                                       "email": f"m{i}@salon.ru", "specialty": "Универсал"} for i in range(1, MASTERS + 1)])
+        conn.execute(insert(Client), [{"client_id": i, "first_name": "Клиент", "last_name": str(i), "phone": f"+7901{i:07d}",
+                                       "email": f"c{i}@mail.ru", "password_hash": "x"} for i in range(1, CLIENTS + 1)])
+
+        schedules = []
+        schedule_id = 0
+        for day in range(365):
+            for master_id in range(1, MASTERS + 1):
+                schedule_id += 1
+                schedules.append({"schedule_id": schedule_id, "master_id": master_id, "work_date": FIRST_DAY + timedelta(days=day),
+                                  "start_time": time(9, 0), "end_time": time(21, 0), "is_day_off": False})
+        conn.execute(insert(MasterSchedule), schedules)
+
+        statuses = list(AppointmentStatus)
+        batch = []
+        for appointment_id in range(1, appointments + 1):
+            schedule = schedules[rnd.randrange(len(schedules))]
+            start = datetime.combine(schedule["work_date"], time(9, 0)) + timedelta(minutes=30 * rnd.randrange(22)) #type:ignore
+            batch.append({"appointment_id": appointment_id, "master_id": schedule["master_id"], "client_id": rnd.randint(1, CLIENTS),
+                          "service_id": 1, "schedule_id": schedule["schedule_id"], "start_datetime": start,
+                          "end_datetime": start + timedelta(minutes=30), "status": rnd.choice(statuses), "created_at": start})
+            if len(batch) == 50000:
+                conn.execute(insert(Appointment), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Appointment), batch)
+
+
+def drop_indexes(engine) -> None:
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def create_indexes(engine) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def measure(engine, repeat: int) -> dict:
+    """Замеряет среднее время (мс) горячих запросов на случайных ключах"""
+    rnd = random.Random(11)
+    session = sessionmaker(engine)()
+    schedule_service = ScheduleService(session)
+    appointment_service = AppointmentService(session)
+    results = {}
+
+    def run(name, action):
+        started = timer.perf_counter()
+        for _ in range(repeat):
+            action()
+            session.expunge_all()
+        results[name] = (timer.perf_counter() - started) / repeat * 1000
+
+    def random_day():
+        return FIRST_DAY + timedelta(days=rnd.randrange(365))
+
+    run("get_available_time_slots", lambda: schedule_service.get_available_time_slots(rnd.randint(1, MASTERS * 365), 60))
+    run("create_appointment conflict check", lambda: session.query(Appointment).filter(
+        Appointment.schedule_id == rnd.randint(1, MASTERS * 365), Appointment.status == AppointmentStatus.SCHEDULED,
+        Appointment.start_datetime < datetime(2024, 6, 1, 13, 0), Appointment.end_datetime > datetime(2024, 6, 1, 12, 0)).all()) #type:ignore
+    run("get_master_appointments", lambda: appointment_service.get_master_appointments(rnd.randint(1, MASTERS), random_day()))
+    run("get_client_appointments", lambda: appointment_service.get_client_appointments(rnd.randint(1, CLIENTS), AppointmentStatus.SCHEDULED))
+    run("get_schedule_by_date", lambda: schedule_service.get_schedule_by_date(rnd.randint(1, MASTERS), random_day()))
+    session.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк индексов расписания")
+    parser.add_argument("--appointments", type=int, default=1000000)
+    parser.add_argument("--database-url", default=None, help="По умолчанию временный файл SQLite")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    engine = create_engine(url)
+
+    print(f"Заполнение базы: {args.appointments} записей...")
+    seed(engine, args.appointments)
+
+    drop_indexes(engine)
+    before = measure(engine, args.repeat)
+    create_indexes(engine)
+    after = measure(engine, args.repeat)
+
+    print(f"{'запрос':<36} {'без индексов, мс':>16} {'с индексами, мс':>16}")
+    for name in before:
+        print(f"{name:<36} {before[name]:>16.2f} {after[name]:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
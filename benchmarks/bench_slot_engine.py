@@ -0,0 +1,48 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import timeit
+from datetime import datetime, date, time, timedelta
+from management.slot_engine import find_free_slots, naive_free_slots
+
+# Сравнение пошагового перебора слотов с интервальным поиском на загруженных днях
+# Запуск: python benchmarks/bench_slot_engine.py
+
+
+def make_day(bookings: int, seed: int = 1):
+    """Генерирует сутки работы с заданным числом коротких записей и парой перерывов"""
+    rnd = random.Random(seed)
+    day = date(2025, 1, 15)
+    day_start = datetime.combine(day, time(0, 0))
+    day_end = datetime.combine(day, time(23, 59))
+
+    breaks = [(datetime.combine(day, time(13, 0)), datetime.combine(day, time(14, 0))),
+              (datetime.combine(day, time(18, 0)), datetime.combine(day, time(18, 30)))]
+
+    starts = sorted(rnd.sample(range(0, 24 * 60 - 5), bookings))
+    appointments = []
+    for minute in starts:
+        start = day_start + timedelta(minutes=minute)
+        appointments.append((start, start + timedelta(minutes=rnd.randint(1, 4))))
+    return day_start, day_end, breaks, appointments
+
+
+def run():
+    print(f"{'записей':>8} {'перебор, мс':>12} {'интервалы, мс':>14} {'ускорение':>10}")
+    for bookings in (10, 100, 300, 600, 1000):
+        day_start, day_end, breaks, appointments = make_day(bookings)
+        busy = breaks + appointments
+        duration = 30
+
+        assert find_free_slots(day_start, day_end, busy, duration) == naive_free_slots(day_start, day_end, breaks, appointments, duration)
+
+        repeat = 5
+        naive = min(timeit.repeat(lambda: naive_free_slots(day_start, day_end, breaks, appointments, duration), number=1, repeat=repeat))
+        fast = min(timeit.repeat(lambda: find_free_slots(day_start, day_end, busy, duration), number=1, repeat=repeat))
+        print(f"{bookings:>8} {naive * 1000:>12.2f} {fast * 1000:>14.2f} {naive / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run()
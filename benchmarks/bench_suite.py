@@ -0,0 +1,299 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time as timer
+from datetime import datetime, date, time, timedelta
+from typing import Any, Callable, Dict, List
+from sqlalchemy import create_engine, event, insert, select, func, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from models.base import Base, master_service_category
+from models.clients import Client, SalonCard, DiscountLevel
+from models.masters import Master
+from models.services import Service, ServiceCategory
+from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
+from management.schedule_management import ScheduleService, AppointmentService
+from management.client_management import PurchaseService
+from management.statistics_management import StatisticsService
+
+# Набор замеров основных сценариев на сгенерированном большом салоне
+# Запуск: python benchmarks/bench_suite.py [--masters 50 --clients 5000 --days 14 --appointments 5000]
+#         [--database-url postgresql://...] [--output results.json] [--baseline old.json --threshold 0.2]
+# Код выхода 1, если сценарий стал медленнее базового замера больше чем на threshold
+# или стал делать больше запросов. Сравнивается минимальное время вызова: медиана
+# при нескольких повторах зависит от фоновой нагрузки машины и дает ложные регрессии.
+
+FIRST_DAY = date(2024, 1, 1)
+DAY_START = time(9, 0)
+DAY_END = time(21, 0)
+CELLS_PER_DAY = 24          # получасовых ячеек с 9:00 до 21:00
+CATEGORIES = 4
+SERVICES_PER_CATEGORY = 4   # длительности 30, 60, 90, 120 минут
+
+# статусы сгенерированных записей и их доли
+STATUS_WEIGHTS = {AppointmentStatus.SCHEDULED: 5, AppointmentStatus.COMPLETED: 3,
+                  AppointmentStatus.CANCELLED: 1, AppointmentStatus.NO_SHOW: 1}
+
+# меньше повторов при сравнении с базовым замером не допускается: минимум из нескольких вызовов шумит
+MIN_BASELINE_REPEAT = 10
+
+
+class SalonSize:
+    def __init__(self, masters: int, clients: int, days: int, appointments: int):
+        self.masters = masters
+        self.clients = clients
+        self.days = days
+        self.appointments = appointments
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"masters": self.masters, "clients": self.clients, "days": self.days, "appointments": self.appointments}
+
+
+def generate_salon(engine: Engine, size: SalonSize, seed: int = 7) -> None:
+    """
+    Заполняет пустую базу детерминированными данными
+
+    Мастера работают каждый день с 9 до 21 с перерывом 13-14, каждый умеет две категории.
+    Записи не пересекаются и не попадают на перерыв. Последний день оставлен без записей
+    для сценария create_appointment. После загрузки сводка daily_stats перестраивается.
+    Строки вставляются с явными ID, поэтому на PostgreSQL последовательности ключей
+    затем выставляются на максимальный ID.
+    """
+    rnd = random.Random(seed)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    services: List[Dict[str, Any]] = [
+        {"service_id": category * SERVICES_PER_CATEGORY + i + 1, "service_name": f"Услуга {category}-{i}",
+         "duration_minutes": 30 * (i + 1), "price": 1000 * (i + 1), "category_id": category + 1}
+        for category in range(CATEGORIES) for i in range(SERVICES_PER_CATEGORY)]
+
+    with engine.begin() as conn:
+        conn.execute(insert(ServiceCategory), [{"category_id": i + 1, "category_name": f"категория {i + 1}"} for i in range(CATEGORIES)])
+        conn.execute(insert(Service), services)
+        conn.execute(insert(Master), [{"master_id": i, "first_name": "Мастер", "last_name": str(i), "phone": f"+7900{i:07d}",
+                                       "email": f"m{i}@salon.ru", "specialty": "Универсал"} for i in range(1, size.masters + 1)])
+        conn.execute(insert(master_service_category), [{"master_id": i, "category_id": (i + shift) % CATEGORIES + 1}
+                                                       for i in range(1, size.masters + 1) for shift in (0, 1)])
+        conn.execute(insert(Client), [{"client_id": i, "first_name": "Клиент", "last_name": str(i), "phone": f"+7901{i:07d}",
+                                       "email": f"c{i}@mail.ru", "password_hash": "x"} for i in range(1, size.clients + 1)])
+        conn.execute(insert(SalonCard), [{"client_id": i, "discount_level": DiscountLevel.STANDARD, "total_spent": 0.0,
+                                          "issue_date": datetime.combine(FIRST_DAY, DAY_START)} for i in range(1, size.clients + 1)])
+
+        schedules: List[Dict[str, Any]] = []
+        for day in range(size.days):
+            for master_id in range(1, size.masters + 1):
+                schedules.append({"schedule_id": len(schedules) + 1, "master_id": master_id, "work_date": FIRST_DAY + timedelta(days=day),
+                                  "start_time": DAY_START, "end_time": DAY_END, "is_day_off": False})
+        conn.execute(insert(MasterSchedule), schedules)
+        conn.execute(insert(MasterBreak), [{"schedule_id": schedule["schedule_id"], "break_start": time(13, 0), "break_end": time(14, 0),
+                                            "reason": "обед"} for schedule in schedules])
+
+        # занятые получасовые ячейки расписаний, перерыв 13-14 - ячейки 8 и 9
+        occupied = {schedule["schedule_id"]: {8, 9} for schedule in schedules}
+        bookable = [schedule for schedule in schedules if schedule["work_date"] < FIRST_DAY + timedelta(days=size.days - 1)]
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        batch: List[Dict[str, Any]] = []
+        attempts = 0
+        while len(batch) < size.appointments and attempts < size.appointments * 20 and bookable:
+            attempts += 1
+            schedule = bookable[rnd.randrange(len(bookable))]
+            category_id = (schedule["master_id"] + rnd.randrange(2)) % CATEGORIES + 1
+            service = services[(category_id - 1) * SERVICES_PER_CATEGORY + rnd.randrange(SERVICES_PER_CATEGORY)]
+            cells = service["duration_minutes"] // 30
+            first = rnd.randrange(CELLS_PER_DAY - cells + 1)
+            wanted = set(range(first, first + cells))
+            if wanted & occupied[schedule["schedule_id"]]:
+                continue
+            occupied[schedule["schedule_id"]] |= wanted
+            start = datetime.combine(schedule["work_date"], DAY_START) + timedelta(minutes=30 * first)
+            batch.append({"appointment_id": len(batch) + 1, "master_id": schedule["master_id"], "client_id": rnd.randint(1, size.clients),
+                          "service_id": service["service_id"], "schedule_id": schedule["schedule_id"], "start_datetime": start,
+                          "end_datetime": start + timedelta(minutes=service["duration_minutes"]),
+                          "status": rnd.choices(statuses, weights)[0], "created_at": start})
+        for offset in range(0, len(batch), 20000):
+            conn.execute(insert(Appointment), batch[offset:offset + 20000])
+        if conn.dialect.name == "postgresql":
+            advance_sequences(conn)
+
+    session = sessionmaker(engine)()
+    StatisticsService(session).rebuild_daily_stats()
+    # строки вставлены в обход сервисов: маски занятости дней строятся по ним один раз
+    ScheduleService(session).check_occupancy(rebuild=True)
+    session.close()
+
+
+def advance_sequences(conn: Connection) -> None:
+    """Выставляет последовательности автоинкрементных ключей PostgreSQL на максимальный ID таблиц"""
+    for table in Base.metadata.sorted_tables:
+        column = table.autoincrement_column
+        if column is None:
+            continue
+        last_id = conn.execute(select(func.max(column))).scalar()
+        # пустая таблица: следующий nextval вернет 1
+        conn.execute(text("SELECT setval(pg_get_serial_sequence(:table, :column), :value, :is_called)"),
+                     {"table": table.name, "column": column.name, "value": last_id or 1, "is_called": last_id is not None})
+
+
+class QueryCounter:
+    """Считает запросы движка между reset() и значением count"""
+    def __init__(self, engine: Engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+def measure(session: Session, counter: QueryCounter, action: Callable[[int], Any], repeat: int) -> Dict[str, float]:
+    """
+    Выполняет action(i) repeat раз, между вызовами очищая сессию
+
+    Returns:
+        Dict[str, float]: median_ms, min_ms, mean_ms и queries (запросов за вызов, среднее)
+    """
+    durations = []
+    queries = 0
+    for i in range(repeat):
+        session.expunge_all()
+        counter.reset()
+        started = timer.perf_counter()
+        action(i)
+        durations.append((timer.perf_counter() - started) * 1000)
+        queries += counter.count
+    return {"median_ms": round(statistics.median(durations), 3), "min_ms": round(min(durations), 3),
+            "mean_ms": round(statistics.fmean(durations), 3), "queries": round(queries / repeat, 2)}
+
+
+def run_scenarios(engine: Engine, size: SalonSize, repeat: int, seed: int = 11) -> Dict[str, Dict[str, float]]:
+    """Замеряет сценарии на уже заполненной базе (изменяющие сценарии идут последними)"""
+    rnd = random.Random(seed)
+    session = sessionmaker(engine)()
+    counter = QueryCounter(engine)
+    schedule_service = ScheduleService(session)
+    appointment_service = AppointmentService(session)
+    purchase_service = PurchaseService(session)
+    schedules = size.masters * size.days
+    last_day = FIRST_DAY + timedelta(days=size.days - 1)
+
+    def random_day() -> date:
+        return FIRST_DAY + timedelta(days=rnd.randrange(size.days))
+
+    # прогрев кэшей каталога и мастеров, чтобы первый сценарий не платил за них
+    appointment_service.find_available_masters(1, FIRST_DAY)
+
+    results = {}
+    results["get_available_time_slots"] = measure(session, counter, lambda i: schedule_service.get_available_time_slots(
+        rnd.randint(1, schedules), 60), repeat)
+    results["find_available_masters"] = measure(session, counter, lambda i: appointment_service.find_available_masters(
+        rnd.randint(1, CATEGORIES * SERVICES_PER_CATEGORY), random_day()), repeat)
+    results["get_all_appointments"] = measure(session, counter, lambda i: appointment_service.get_all_appointments(
+        AppointmentStatus.SCHEDULED, random_day(), None), repeat)
+
+    # последний день свободен: каждый вызов записывает к следующему мастеру на 10:00
+    bookings = min(repeat, size.masters)
+    results["create_appointment"] = measure(session, counter, lambda i: appointment_service.create_appointment(
+        rnd.randint(1, size.clients), ((i + 1) % CATEGORIES) * SERVICES_PER_CATEGORY + 2,
+        (size.days - 1) * size.masters + i + 1, datetime.combine(last_day, time(10, 0))), bookings)
+
+    # новые дни после сгенерированного периода: неделя на мастера
+    results["bulk_add_schedule"] = measure(session, counter, lambda i: schedule_service.bulk_add_schedule(
+        i % size.masters + 1, last_day + timedelta(days=1 + 7 * (i // size.masters)),
+        last_day + timedelta(days=7 + 7 * (i // size.masters)), DAY_START, DAY_END), repeat)
+
+    results["post_purchase"] = measure(session, counter, lambda i: purchase_service.post_purchase(
+        rnd.randint(1, size.clients), 1500.0), repeat)
+    results["post_purchases_batch_100"] = measure(session, counter, lambda i: purchase_service.post_purchases(
+        [(rnd.randint(1, size.clients), 1500.0) for _ in range(100)]), repeat)
+    session.close()
+    return results
+
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     threshold: float, min_delta_ms: float) -> List[str]:
+    """
+    Сравнивает замеры с базовыми
+
+    Время считается регрессией, если минимальное время вызова выросло больше чем
+    на threshold (доля) и больше чем на min_delta_ms; число запросов - при любом росте.
+
+    Returns:
+        List[str]: Описания регрессий
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["min_ms"] > base["min_ms"] * (1 + threshold) and result["min_ms"] - base["min_ms"] > min_delta_ms:
+            regressions.append(f"{name}: мин. {base['min_ms']:.2f} -> {result['min_ms']:.2f} мс")
+        if result["queries"] > base["queries"]:
+            regressions.append(f"{name}: запросов {base['queries']} -> {result['queries']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк сценариев салона")
+    parser.add_argument("--masters", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", default=None, help="По умолчанию временный файл SQLite. База будет очищена!")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимый рост минимального времени, доля")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Меньший рост времени не считается регрессией")
+    args = parser.parse_args()
+    if args.baseline and args.repeat < MIN_BASELINE_REPEAT:
+        parser.error(f"для сравнения с --baseline нужно --repeat не меньше {MIN_BASELINE_REPEAT}")
+
+    size = SalonSize(args.masters, args.clients, args.days, args.appointments)
+    url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_suite.db")
+    engine = create_engine(url)
+
+    print(f"Генерация салона: {size.as_dict()}...")
+    started = timer.perf_counter()
+    generate_salon(engine, size, args.seed)
+    print(f"Готово за {timer.perf_counter() - started:.1f} с")
+
+    results = run_scenarios(engine, size, args.repeat)
+    print(f"{'сценарий':<28} {'медиана, мс':>12} {'мин, мс':>10} {'запросов':>9}")
+    for name, result in results.items():
+        print(f"{name:<28} {result['median_ms']:>12.2f} {result['min_ms']:>10.2f} {result['queries']:>9}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"dialect": engine.dialect.name, "size": size.as_dict(), "repeat": args.repeat, "seed": args.seed,
+                   "scenarios": results}, file, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("size") != size.as_dict() or baseline.get("dialect") != engine.dialect.name:
+            print("Внимание: базовый замер сделан на другой базе или другом размере салона")
+        if baseline.get("repeat", 0) < MIN_BASELINE_REPEAT:
+            print(f"Внимание: в базовом замере меньше {MIN_BASELINE_REPEAT} повторов, сравнение ненадежно")
+        regressions = find_regressions(results, baseline["scenarios"], args.threshold, args.min_delta_ms)
+        if regressions:
+            print("РЕГРЕССИИ:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import sys
+import time as timer
+import traceback
+from logging.handlers import RotatingFileHandler
+from typing import Any, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Журнал медленных запросов: каждый запрос дольше порога пишется строкой JSON
+# с параметрами, вызвавшим его методом сервиса, стеком и планом EXPLAIN.
+# Включается для движка явно (enable_slow_query_log) или настройкой slow_query_ms.
+
+# файл журнала по умолчанию
+SLOW_QUERY_LOG_FILE = "slow_queries.log"
+
+# ротация: размер файла и число старых файлов
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
+# сколько кадров стека (кода проекта) сохранять
+SLOW_QUERY_STACK_DEPTH = 12
+
+# запросы, для которых можно получить план
+EXPLAINABLE_PREFIXES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+# значения параметров этих столбцов (и производных имен: password_hash_1) в журнал не пишутся
+REDACTED_COLUMNS = ("password_hash", "password")
+REDACTED_VALUE = "***"
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MANAGEMENT_DIR = os.path.join(_PROJECT_DIR, "management") + os.sep
+_SKIPPED_FILES = (os.path.abspath(__file__), os.path.join(_MANAGEMENT_DIR, "instrumentation.py"))
+
+
+def _is_project_file(filename: str) -> bool:
+    filename = os.path.abspath(filename)
+    return (filename.startswith(_PROJECT_DIR + os.sep) and filename not in _SKIPPED_FILES
+            and "site-packages" not in filename)
+
+
+def _is_secret(name: str) -> bool:
+    name = name.lower()
+    return any(column in name for column in REDACTED_COLUMNS)
+
+
+def _redacted_parameters(statement: str, parameters: Any, context: Any) -> Any:
+    """
+    Параметры запроса для журнала: значения столбцов с учетными данными заменены на ***
+
+    Именованные параметры проверяются по имени. Позиционные (sqlite, ?) сопоставляются
+    с именами через скомпилированный запрос; если имен нет, а запрос касается такого
+    столбца, скрываются все значения.
+    """
+    if isinstance(parameters, list):
+        # executemany: список наборов параметров
+        return [_redacted_parameters(statement, row, context) for row in parameters]
+    if isinstance(parameters, dict):
+        return {name: REDACTED_VALUE if _is_secret(name) else value for name, value in parameters.items()}
+    if not parameters or not _is_secret(statement):
+        return parameters
+    names = getattr(getattr(context, "compiled", None), "positiontup", None)
+    if not names or len(parameters) % len(names):
+        return [REDACTED_VALUE] * len(parameters)
+    # INSERT нескольких строк одним запросом повторяет набор параметров для каждой строки
+    return [REDACTED_VALUE if _is_secret(names[i % len(names)]) else value for i, value in enumerate(parameters)]
+
+
+def _calling_method() -> Optional[str]:
+    """Ближайший публичный метод модулей management, из которого выполняется запрос"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_MANAGEMENT_DIR) and filename not in _SKIPPED_FILES:
+            name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+            if not name.split(".")[-1].startswith(("_", "<")):
+                return name
+        frame = frame.f_back #type:ignore
+    return None
+
+
+def _project_stack() -> List[str]:
+    stack = [f"{os.path.relpath(entry.filename, _PROJECT_DIR)}:{entry.lineno} in {entry.name}"
+             for entry in traceback.extract_stack() if _is_project_file(entry.filename)]
+    return stack[-SLOW_QUERY_STACK_DEPTH:]
+
+
+# журнал медленных запросов одного движка
+class SlowQueryLog:
+    def __init__(self, path: str = SLOW_QUERY_LOG_FILE, threshold_ms: float = 200, analyze: bool = False,
+                 max_bytes: int = SLOW_QUERY_LOG_MAX_BYTES, backup_count: int = SLOW_QUERY_LOG_BACKUP_COUNT):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.analyze = analyze
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+        # отдельный логгер, не зарегистрированный в logging: записи не уходят в корневой
+        self.logger = logging.Logger("salon.slow_queries")
+        self.logger.addHandler(self.handler)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if context is not None:
+            context.salon_slow_query_started = timer.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = getattr(context, "salon_slow_query_started", None)
+        if started is None:
+            return
+        elapsed_ms = (timer.perf_counter() - started) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        explain_parameters = parameters[0] if executemany and parameters else parameters
+        plan, plan_error = self.explain(conn, statement, explain_parameters)
+        entry = {"timestamp": timer.time(), "duration_ms": round(elapsed_ms, 3), "statement": statement,
+                 "parameters": _redacted_parameters(statement, parameters, context), "executemany": executemany, "method": _calling_method(),
+                 "stack": _project_stack(), "plan": plan}
+        if plan_error:
+            entry["plan_error"] = plan_error
+        self.logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def explain(self, conn, statement: str, parameters: Any) -> Tuple[Any, Optional[str]]:
+        """
+        Получает план запроса через DBAPI-соединение, минуя события движка
+
+        ANALYZE выполняет запрос повторно, поэтому применяется только к SELECT.
+        В PostgreSQL внутри транзакции план строится в точке сохранения: ошибка EXPLAIN
+        не прерывает транзакцию. Метод не бросает исключений - ошибка возвращается текстом.
+
+        Args:
+            conn: Соединение, на котором выполнялся запрос
+            statement: Текст запроса
+            parameters: Параметры запроса
+
+        Returns:
+            Tuple[Any, Optional[str]]: План (None, если не получен) и текст ошибки
+        """
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if keyword not in EXPLAINABLE_PREFIXES:
+            return None, None
+
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        elif dialect == "postgresql":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " if self.analyze and keyword == "SELECT" else "EXPLAIN (FORMAT JSON) "
+        else:
+            prefix = "EXPLAIN ANALYZE " if self.analyze and keyword == "SELECT" else "EXPLAIN "
+
+        # точка сохранения нужна только внутри транзакции: в autocommit SAVEPOINT сам вызовет ошибку
+        savepoint = (dialect == "postgresql" and conn.in_transaction()
+                     and not getattr(conn.connection.dbapi_connection, "autocommit", False))
+        cursor = None
+        try:
+            cursor = conn.connection.cursor()
+            if savepoint:
+                cursor.execute("SAVEPOINT salon_explain")
+            try:
+                cursor.execute(prefix + statement, parameters or ())
+                rows = cursor.fetchall()
+            except Exception as e:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT salon_explain")
+                return None, str(e)
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT salon_explain")
+
+            if dialect == "sqlite":
+                # (id, parent, notused, detail) -> строки плана
+                return [row[-1] for row in rows], None
+            if dialect == "postgresql":
+                return rows[0][0], None
+            return [" ".join(str(value) for value in row) for row in rows], None
+        except Exception as e:
+            # журнал не должен ломать запрос приложения: любая ошибка плана только записывается
+            return None, str(e)
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def close(self) -> None:
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+
+# как в management/caches.py: журнал исчезает вместе с движком
+_recorders: "WeakKeyDictionary[Engine, SlowQueryLog]" = WeakKeyDictionary()
+
+
+def enable_slow_query_log(engine: Engine, path: str = SLOW_QUERY_LOG_FILE, threshold_ms: float = 200,
+                          analyze: bool = False, max_bytes: int = SLOW_QUERY_LOG_MAX_BYTES,
+                          backup_count: int = SLOW_QUERY_LOG_BACKUP_COUNT) -> SlowQueryLog:
+    """
+    Включает журнал медленных запросов для движка
+
+    Повторный вызов заменяет журнал движка новым с указанными настройками.
+
+    Args:
+        engine: Движок SQLAlchemy
+        path: Файл журнала (JSON lines, с ротацией)
+        threshold_ms: Порог длительности запроса, мс
+        analyze: Строить план с ANALYZE (только SELECT; запрос выполняется еще раз)
+        max_bytes: Размер файла, после которого он ротируется
+        backup_count: Сколько старых файлов хранить
+
+    Returns:
+        SlowQueryLog: Журнал движка
+    """
+    disable_slow_query_log(engine)
+    recorder = SlowQueryLog(path, threshold_ms, analyze, max_bytes, backup_count)
+    event.listen(engine, "before_cursor_execute", recorder.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", recorder.after_cursor_execute)
+    _recorders[engine] = recorder
+    return recorder
+
+
+def disable_slow_query_log(engine: Engine) -> None:
+    """Выключает журнал медленных запросов движка и закрывает файл"""
+    recorder = _recorders.pop(engine, None)
+    if recorder is None:
+        return
+    event.remove(engine, "before_cursor_execute", recorder.before_cursor_execute)
+    event.remove(engine, "after_cursor_execute", recorder.after_cursor_execute)
+    recorder.close()
@@ -0,0 +1,450 @@
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload, raiseload
+from typing import List, Optional
+from datetime import datetime, date, time
+from models.clients import Client, SalonCard, DiscountLevel
+from models.masters import Master
+from models.services import Service, ServiceCategory
+from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
+from management.caches import catalog_cache, capability_index, report_cache
+from management.statistics_management import record_status_change
+from management.schedule_management import schedule_slots, occupancy_slots, BOOKING_ATTEMPTS
+from management.occupancy import initial_occupancy, mark_busy, record_occupancy_change
+from management.validation import (normalize_contacts, normalize_category_name, check_missing_categories, check_service_duration, check_break,
+                                   check_booking, check_client_cancel, check_admin_cancel)
+from auth.authentification import simple_hash
+from exceptions import ClientError, MasterError, ServiceError, ScheduleError
+
+# Async-варианты сервисов management для AsyncSession (asyncpg, aiosqlite).
+# Правила проверок общие с синхронными сервисами (management/validation.py),
+# кэши каталога и сводка daily_stats используются через AsyncSession.run_sync.
+# Ленивой загрузки нет: каждый метод явно загружает перечисленные в описании связи,
+# а обращение к остальным связям сразу вызывает ошибку (raiseload).
+# Сессии лучше создавать с expire_on_commit=False, чтобы объекты читались и после commit.
+
+
+# для управления клиентами (AsyncSession)
+class AsyncClientService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_client(self, first_name: str, last_name: str, phone: str, email: str, password: str) -> Client:
+        """
+        Создает нового клиента вместе с картой лояльности
+
+        Returns:
+            Client: Созданный клиент с загруженной salon_card
+
+        Raises:
+            ClientError: Если клиент с таким телефоном или email уже существует
+        """
+        normalized_phone, normalized_email = normalize_contacts(phone, email)
+
+        if await self.session.scalar(select(Client.client_id).where(Client.phone == normalized_phone)):
+            raise ClientError(f"Клиент с телефоном {phone} уже существует")
+        if normalized_email and await self.session.scalar(select(Client.client_id).where(Client.email == normalized_email)):
+            raise ClientError(f"Клиент с email {email} уже существует")
+
+        try:
+            new_client = Client(first_name=first_name, last_name=last_name, phone=normalized_phone, email=normalized_email,
+                                password_hash=simple_hash(password))
+            new_client.salon_card = SalonCard(discount_level=DiscountLevel.STANDARD, total_spent=0.0)
+            self.session.add(new_client)
+            await self.session.flush()
+            client_id = new_client.client_id
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            raise ClientError(f"Ошибка при создании клиента: {e}")
+        return await self.get_client_by_id(client_id) #type:ignore
+
+    async def get_client_by_id(self, client_id: int) -> Optional[Client]:
+        """Клиент по ID с загруженной salon_card"""
+        return await self.session.scalar(
+            select(Client).options(joinedload(Client.salon_card), raiseload("*")).where(Client.client_id == client_id)
+            .execution_options(populate_existing=True))
+
+    async def get_client_by_phone(self, phone: str) -> Optional[Client]:
+        """Клиент по телефону с загруженной salon_card"""
+        normalized_phone, _ = normalize_contacts(phone, None)
+        if not normalized_phone:
+            return None
+        return await self.session.scalar(
+            select(Client).options(joinedload(Client.salon_card), raiseload("*")).where(Client.phone == normalized_phone))
+
+    async def get_clients_page(self, limit: int = 20, after_id: Optional[int] = None) -> List[Client]:
+        """Страница клиентов по возрастанию ID (keyset-пагинация) с загруженными картами"""
+        query = select(Client).options(joinedload(Client.salon_card), raiseload("*"))
+        if after_id is not None:
+            query = query.where(Client.client_id > after_id) #type:ignore
+        return list(await self.session.scalars(query.order_by(Client.client_id).limit(limit)))
+
+    async def authenticate(self, phone: str, password: str) -> Optional[Client]:
+        """Клиент по телефону и паролю или None"""
+        client = await self.get_client_by_phone(phone)
+        if client and client.password_hash == simple_hash(password): #type:ignore
+            return client
+        return None
+
+
+# для управления мастерами (AsyncSession)
+class AsyncMasterService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_master(self, first_name: str, last_name: str, phone: str, email: str, specialty: str,
+                            category_ids: Optional[List[int]] = None) -> Master:
+        """
+        Создает нового мастера
+
+        Returns:
+            Master: Созданный мастер с загруженными service_categories
+
+        Raises:
+            MasterError: Если мастер с таким телефоном или email уже существует
+            ValueError: Если каких-то категорий нет
+        """
+        normalized_phone, normalized_email = normalize_contacts(phone, email)
+        if await self.session.scalar(select(Master.master_id).where(Master.phone == normalized_phone)):
+            raise MasterError(f"Мастер с телефоном {normalized_phone} уже существует")
+        if normalized_email and await self.session.scalar(select(Master.master_id).where(Master.email == normalized_email)):
+            raise MasterError(f"Мастер с email {normalized_email} уже существует")
+
+        categories = await self._load_categories(category_ids or [])
+        new_master = Master(first_name=first_name, last_name=last_name, phone=normalized_phone, email=normalized_email,
+                            specialty=specialty, service_categories=categories)
+        self.session.add(new_master)
+        await self.session.flush()
+        master_id = new_master.master_id
+        await self.session.commit()
+        await self.session.run_sync(lambda session: capability_index(session).add(master_id, category_ids or [])) #type:ignore
+        return await self.get_master_by_id(master_id) #type:ignore
+
+    async def add_categories_to_master(self, master_id: int, category_ids: List[int]) -> None:
+        """
+        Добавляет категории услуг мастеру
+
+        Raises:
+            ValueError: Если мастер или какие-то категории не найдены
+        """
+        master = await self.get_master_by_id(master_id)
+        if not master:
+            raise ValueError(f"Мастер с ID {master_id} не найден")
+
+        for category in await self._load_categories(category_ids):
+            if category not in master.service_categories:
+                master.service_categories.append(category)
+        await self.session.commit()
+        await self.session.run_sync(lambda session: capability_index(session).add(master_id, category_ids))
+
+    async def get_master_by_id(self, master_id: int) -> Optional[Master]:
+        """Мастер по ID с загруженными service_categories"""
+        return await self.session.scalar(
+            select(Master).options(selectinload(Master.service_categories), raiseload("*")).where(Master.master_id == master_id)
+            .execution_options(populate_existing=True))
+
+    async def get_masters_page(self, limit: int = 20, after_id: Optional[int] = None) -> List[Master]:
+        """Страница мастеров по возрастанию ID (keyset-пагинация) с загруженными service_categories"""
+        query = select(Master).options(selectinload(Master.service_categories), raiseload("*"))
+        if after_id is not None:
+            query = query.where(Master.master_id > after_id) #type:ignore
+        return list(await self.session.scalars(query.order_by(Master.master_id).limit(limit)))
+
+    async def _load_categories(self, category_ids: List[int]) -> List[ServiceCategory]:
+        if not category_ids:
+            return []
+        categories = list(await self.session.scalars(
+            select(ServiceCategory).options(raiseload("*")).where(ServiceCategory.category_id.in_(category_ids))))
+        check_missing_categories(category_ids, [category.category_id for category in categories]) #type:ignore
+        return categories
+
+
+# для управления услугами (AsyncSession)
+class AsyncServiceService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_service(self, service_name: str, duration_minutes: int, price: int, category_id: int) -> Service:
+        """
+        Создает новую услугу
+
+        Raises:
+            ServiceError: Если категория не найдена или длительность не кратна 30 минутам
+        """
+        if not await self.session.scalar(select(ServiceCategory.category_id).where(ServiceCategory.category_id == category_id)):
+            raise ServiceError(f"Категория с ID {category_id} не найдена")
+        check_service_duration(duration_minutes)
+
+        try:
+            new_service = Service(service_name=service_name, duration_minutes=duration_minutes, price=price, category_id=category_id)
+            self.session.add(new_service)
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            raise ServiceError(f"Ошибка при создании услуги: {e}")
+        await self.session.run_sync(lambda session: catalog_cache(session).invalidate())
+        await self.session.refresh(new_service)
+        return new_service
+
+    async def get_service_by_id(self, service_id: int) -> Optional[Service]:
+        """Услуга по ID из кэша каталога (отсоединенная копия)"""
+        return await self.session.run_sync(lambda session: catalog_cache(session).get_service(session, service_id))
+
+    async def get_all_services(self) -> List[Service]:
+        """Все услуги из кэша каталога (отсоединенные копии)"""
+        return await self.session.run_sync(lambda session: catalog_cache(session).get_all_services(session))
+
+    async def get_services_by_category(self, category_id: int) -> List[Service]:
+        """Услуги категории из кэша каталога (отсоединенные копии)"""
+        return await self.session.run_sync(lambda session: catalog_cache(session).get_services_by_category(session, category_id))
+
+    async def get_all_categories(self) -> List[ServiceCategory]:
+        """Все категории из кэша каталога (отсоединенные копии)"""
+        return await self.session.run_sync(lambda session: catalog_cache(session).get_all_categories(session))
+
+    async def create_category(self, category_name: str) -> ServiceCategory:
+        """
+        Создает категорию услуг
+
+        Raises:
+            ServiceError: Если категория с таким названием уже существует
+        """
+        normalized_name = normalize_category_name(category_name)
+        if await self.session.scalar(select(ServiceCategory.category_id).where(ServiceCategory.category_name == normalized_name)):
+            raise ServiceError(f"Категория '{category_name}' уже существует")
+        category = ServiceCategory(category_name=normalized_name)
+        self.session.add(category)
+        await self.session.commit()
+        await self.session.run_sync(lambda session: catalog_cache(session).invalidate())
+        await self.session.refresh(category)
+        return category
+
+
+# для управления расписанием (AsyncSession)
+class AsyncScheduleService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add_work_day(self, master_id: int, work_date: date, start_time: time, end_time: time) -> MasterSchedule:
+        """
+        Добавляет рабочий день для мастера
+
+        Raises:
+            ScheduleError: Если мастер не найден или день уже добавлен
+        """
+        if not await self.session.scalar(select(Master.master_id).where(Master.master_id == master_id)):
+            raise ScheduleError(f"Мастер с ID {master_id} не найден")
+        if await self.session.scalar(select(MasterSchedule.schedule_id).where(MasterSchedule.master_id == master_id,
+                                                                              MasterSchedule.work_date == work_date)):
+            raise ScheduleError(f"Расписание на {work_date} уже добавлено")
+
+        schedule = MasterSchedule(master_id=master_id, work_date=work_date, start_time=start_time, end_time=end_time, is_day_off=False,
+                                  occupancy_mask=initial_occupancy(start_time, end_time))
+        self.session.add(schedule)
+        await self.session.commit()
+        await self.session.refresh(schedule)
+        return schedule
+
+    async def add_break(self, schedule_id: int, break_start: time, break_end: time, reason: str = "") -> MasterBreak:
+        """
+        Добавляет перерыв в расписание мастера
+
+        Raises:
+            ScheduleError: Если расписание не найдено или перерыв нельзя добавить
+        """
+        schedule = await self.session.get(MasterSchedule, schedule_id)
+        if not schedule:
+            raise ScheduleError(f"Расписание с ID {schedule_id} не найдено")
+        check_break(schedule, break_start, break_end)
+
+        master_break = MasterBreak(schedule_id=schedule_id, break_start=break_start, break_end=break_end, reason=reason)
+        self.session.add(master_break)
+        await self.session.run_sync(mark_busy, schedule_id, break_start, break_end)
+        await self.session.commit()
+        await self.session.refresh(master_break)
+        return master_break
+
+    async def get_master_schedule(self, master_id: int, start_date: date, end_date: date) -> List[MasterSchedule]:
+        """Расписание мастера на период с загруженными breaks"""
+        return list(await self.session.scalars(
+            select(MasterSchedule).options(selectinload(MasterSchedule.breaks), raiseload("*")).where(
+                MasterSchedule.master_id == master_id, MasterSchedule.work_date >= start_date, MasterSchedule.work_date <= end_date #type:ignore
+            ).order_by(MasterSchedule.work_date)))
+
+    async def get_available_time_slots(self, schedule_id: int, service_duration: int) -> List[datetime]:
+        """
+        Свободные слоты рабочего дня - те же правила, что в ScheduleService.get_available_time_slots
+
+        Returns:
+            List[datetime]: Список доступных времен начала
+        """
+        # маска меняется UPDATE-ом в обход сессии, поэтому читаются столбцы, а не объект из identity map
+        schedule = (await self.session.execute(select( #type:ignore
+            MasterSchedule.work_date, MasterSchedule.start_time, MasterSchedule.end_time, MasterSchedule.is_day_off,
+            MasterSchedule.occupancy_mask).where(MasterSchedule.schedule_id == schedule_id))).first()
+        if not schedule or schedule.is_day_off: #type:ignore
+            return []
+        slots = occupancy_slots(schedule, service_duration) #type:ignore
+        if slots is not None:
+            return slots
+
+        appointments = (await self.session.execute(select(Appointment.start_datetime, Appointment.end_datetime).where( #type:ignore
+            Appointment.schedule_id == schedule_id, Appointment.status == AppointmentStatus.SCHEDULED))).all()
+        breaks = (await self.session.execute(select(MasterBreak.break_start, MasterBreak.break_end).where( #type:ignore
+            MasterBreak.schedule_id == schedule_id))).all()
+        return schedule_slots(schedule, breaks, [(start, end) for start, end in appointments], service_duration) #type:ignore
+
+
+# для управления записями (AsyncSession)
+class AsyncAppointmentService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create_appointment(self, client_id: int, service_id: int, schedule_id: int, start_datetime: datetime,
+                                 notes: str = "") -> Appointment:
+        """
+        Создает новую запись - так же, как AppointmentService.create_appointment
+
+        Строка расписания блокируется (SELECT ... FOR UPDATE), после вставки пересечения
+        проверяются еще раз, при неудачной блокировке попытка повторяется.
+
+        Returns:
+            Appointment: Созданная запись с загруженными master, client и service
+
+        Raises:
+            ScheduleError: Если записаться нельзя
+        """
+        for attempt in range(1, BOOKING_ATTEMPTS + 1):
+            try:
+                appointment_id = await self._book_appointment(client_id, service_id, schedule_id, start_datetime, notes)
+                await self.session.commit()
+                await self.session.run_sync(lambda session: report_cache(session).invalidate_day(start_datetime.date()))
+                return await self.get_appointment(appointment_id) #type:ignore
+            except ScheduleError:
+                await self.session.rollback()
+                raise
+            except OperationalError:
+                await self.session.rollback()
+                if attempt == BOOKING_ATTEMPTS:
+                    raise ScheduleError("Не удалось создать запись из-за одновременной записи, попробуйте еще раз")
+        raise ScheduleError("Не удалось создать запись")
+
+    async def _book_appointment(self, client_id: int, service_id: int, schedule_id: int, start_datetime: datetime, notes: str) -> int:
+        """Проверяет слот и добавляет запись в текущую транзакцию (без commit), возвращает ее ID"""
+        if not await self.session.scalar(select(Client.client_id).where(Client.client_id == client_id)):
+            raise ScheduleError(f"Клиент с ID {client_id} не найден")
+
+        service = await self.session.run_sync(lambda session: catalog_cache(session).get_service(session, service_id))
+        if not service:
+            raise ScheduleError(f"Услуга с ID {service_id} не найдена")
+
+        schedule = await self.session.scalar(select(MasterSchedule).options(
+            joinedload(MasterSchedule.master), selectinload(MasterSchedule.breaks), raiseload("*")
+        ).where(MasterSchedule.schedule_id == schedule_id).with_for_update(of=MasterSchedule))
+        if not schedule:
+            raise ScheduleError(f"Расписание с ID {schedule_id} не найдено")
+
+        master = schedule.master
+        if not master:
+            raise ScheduleError(f"Мастер с ID {schedule.master_id} не найден (в расписании {schedule_id})")
+        can_perform = await self.session.run_sync(
+            lambda session: capability_index(session).can_perform(session, schedule.master_id, service.category_id)) #type:ignore
+        if not can_perform:
+            raise ScheduleError(f"Мастер {master.full_name} не может выполнять услугу '{service.service_name}'")
+
+        end_datetime = check_booking(schedule, [(b.break_start, b.break_end) for b in schedule.breaks], service, start_datetime) #type:ignore
+
+        if await self._count_overlapping(schedule_id, start_datetime, end_datetime) > 0:
+            raise ScheduleError("Время уже занято другой записью")
+
+        appointment = Appointment(master_id=schedule.master_id, client_id=client_id, service_id=service_id, schedule_id=schedule_id,
+                                  start_datetime=start_datetime, end_datetime=end_datetime, status=AppointmentStatus.SCHEDULED, notes=notes)
+        self.session.add(appointment)
+        await self.session.flush()
+
+        # повторная проверка уже под блокировкой записи в базу
+        if await self._count_overlapping(schedule_id, start_datetime, end_datetime, exclude_id=appointment.appointment_id) > 0: #type:ignore
+            raise ScheduleError("Время уже занято другой записью")
+
+        await self.session.run_sync(record_status_change, appointment, None, AppointmentStatus.SCHEDULED)
+        await self.session.run_sync(record_occupancy_change, appointment, None, AppointmentStatus.SCHEDULED)
+        return appointment.appointment_id #type:ignore
+
+    async def _count_overlapping(self, schedule_id: int, start_datetime: datetime, end_datetime: datetime,
+                                 exclude_id: Optional[int] = None) -> int:
+        """Считает запланированные записи расписания, пересекающиеся с интервалом"""
+        query = select(func.count()).select_from(Appointment).where(
+            Appointment.schedule_id == schedule_id, Appointment.start_datetime < end_datetime, #type:ignore
+            Appointment.end_datetime > start_datetime, Appointment.status == AppointmentStatus.SCHEDULED) #type:ignore
+        if exclude_id is not None:
+            query = query.where(Appointment.appointment_id != exclude_id)
+        return await self.session.scalar(query) or 0
+
+    async def get_appointment(self, appointment_id: int) -> Optional[Appointment]:
+        """Запись по ID с загруженными master, client и service"""
+        return await self.session.scalar(self._list_query().where(Appointment.appointment_id == appointment_id)
+                                         .execution_options(populate_existing=True))
+
+    async def get_client_appointments(self, client_id: int, status: Optional[AppointmentStatus] = None) -> List[Appointment]:
+        """Записи клиента по времени начала с загруженными master, client и service"""
+        query = self._list_query().where(Appointment.client_id == client_id)
+        if status:
+            query = query.where(Appointment.status == status)
+        return list(await self.session.scalars(query.order_by(Appointment.start_datetime)))
+
+    async def update_appointment_status(self, appointment_id: int, new_status: AppointmentStatus) -> bool:
+        """
+        Обновляет статус записи
+
+        Returns:
+            bool: True если статус обновлен, False если запись не найдена
+        """
+        appointment = await self.session.get(Appointment, appointment_id)
+        if not appointment:
+            return False
+        await self._set_status(appointment, new_status)
+        return True
+
+    async def client_cancel_appointment(self, appointment_id: int, client_id: int) -> bool:
+        """
+        Клиент отменяет свою запись
+
+        Raises:
+            ScheduleError: Запись не найдена, чужая или уже закрыта
+        """
+        appointment = await self.session.get(Appointment, appointment_id)
+        if not appointment:
+            raise ScheduleError(f"Запись с ID {appointment_id} не найдена")
+        check_client_cancel(appointment, client_id)
+        await self._set_status(appointment, AppointmentStatus.CANCELLED)
+        return True
+
+    async def admin_cancel_appointment(self, appointment_id: int) -> bool:
+        """
+        Администратор отменяет любую запись
+
+        Raises:
+            ScheduleError: Запись не найдена или уже отменена
+        """
+        appointment = await self.session.get(Appointment, appointment_id)
+        if not appointment:
+            raise ScheduleError(f"Запись с ID {appointment_id} не найдена")
+        check_admin_cancel(appointment)
+        await self._set_status(appointment, AppointmentStatus.CANCELLED)
+        return True
+
+    async def _set_status(self, appointment: Appointment, new_status: AppointmentStatus) -> None:
+        # сводка daily_stats обновляется в той же транзакции, что и запись
+        await self.session.run_sync(record_status_change, appointment, appointment.status, new_status) #type:ignore
+        await self.session.run_sync(record_occupancy_change, appointment, appointment.status, new_status) #type:ignore
+        appointment.status = new_status #type:ignore
+        day = appointment.start_datetime.date()
+        await self.session.commit()
+        await self.session.run_sync(lambda session: report_cache(session).invalidate_day(day))
+
+    @staticmethod
+    def _list_query():
+        return select(Appointment).options(joinedload(Appointment.master), joinedload(Appointment.client),
+                                           joinedload(Appointment.service), raiseload("*"))
@@ -0,0 +1,151 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, date, time, timedelta
+from models.schedule import MasterSchedule
+from management.slot_engine import CELLS_PER_DAY, SLOT_STEP_MINUTES
+
+# Сетка свободного времени салона: free[мастер, день, ячейка] - получасовая ячейка дня
+# рабочая и не занята перерывом или запланированной записью. Запросы по свободному времени
+# считаются над всей сеткой сразу операциями NumPy, без перебора мастеров и дней.
+#
+# Сетка считает по целым ячейкам: время не на границе получаса занимает ячейку целиком,
+# а рабочими считаются только ячейки, целиком лежащие в рабочих часах.
+
+_CELLS = np.arange(CELLS_PER_DAY)
+
+
+def _cell_floor(value: time) -> int:
+    return (value.hour * 60 + value.minute) // SLOT_STEP_MINUTES
+
+
+def _cell_ceil(value: time) -> int:
+    minutes = value.hour * 60 + value.minute + (1 if value.second or value.microsecond else 0)
+    return -(-minutes // SLOT_STEP_MINUTES)
+
+
+def busy_cells_mask(busy: Sequence[Tuple[time, time]]) -> int:
+    """Маска ячеек, которых касаются интервалы (начало, конец) - для дней без occupancy_mask"""
+    mask = 0
+    for start, end in busy:
+        first_cell, last_cell = _cell_floor(start), _cell_ceil(end)
+        if last_cell > first_cell:
+            mask |= ((1 << (last_cell - first_cell)) - 1) << first_cell
+    return mask
+
+
+# сетка свободного времени мастеров за период
+class AvailabilityGrid:
+    def __init__(self, master_ids: List[int], master_names: List[str], dates: List[date], work: np.ndarray, free: np.ndarray,
+                 schedule_ids: np.ndarray):
+        self.master_ids = master_ids
+        self.master_names = master_names
+        self.dates = dates
+        # bool [мастер, день, ячейка]: рабочие ячейки и свободные из них
+        self.work = work
+        self.free = free
+        # int [мастер, день], 0 - у мастера нет рабочего дня
+        self.schedule_ids = schedule_ids
+        self._master_index = {master_id: i for i, master_id in enumerate(master_ids)}
+        self._date_index = {day: i for i, day in enumerate(dates)}
+
+    def __repr__(self) -> str:
+        return f"AvailabilityGrid(masters={len(self.master_ids)}, days={len(self.dates)})"
+
+    def fits(self, duration_minutes: int) -> np.ndarray:
+        """
+        Ячейки, с которых помещается услуга
+
+        Args:
+            duration_minutes: Длительность услуги в минутах
+
+        Returns:
+            np.ndarray: bool [мастер, день, ячейка] - с ячейки подряд свободно duration_minutes
+        """
+        cells = -(-duration_minutes // SLOT_STEP_MINUTES)
+        result = np.zeros(self.free.shape, dtype=bool)
+        if cells <= 0 or cells > CELLS_PER_DAY:
+            return result
+        # сумма свободных ячеек в окне [s, s + cells) через накопленную сумму
+        counts = np.concatenate([np.zeros(self.free.shape[:2] + (1,), dtype=np.int16), np.cumsum(self.free, axis=2, dtype=np.int16)], axis=2)
+        result[:, :, :CELLS_PER_DAY - cells + 1] = counts[:, :, cells:] - counts[:, :, :-cells] == cells
+        return result
+
+    def masters_with_room(self, duration_minutes: int, work_date: date, from_time: time = time(0, 0),
+                          until_time: Optional[time] = None) -> List[int]:
+        """
+        Мастера, у которых услуга помещается в дату и в окно времени
+
+        Например, кто может взять 90 минут во вторник после обеда:
+        grid.masters_with_room(90, tuesday, time(12, 0), time(18, 0)).
+
+        Args:
+            duration_minutes: Длительность услуги в минутах
+            work_date: Дата
+            from_time: Не раньше этого времени
+            until_time: Закончить не позже этого времени. None = до конца дня
+
+        Returns:
+            List[int]: ID мастеров
+        """
+        day = self._date_index.get(work_date)
+        if day is None:
+            return []
+        cells = -(-duration_minutes // SLOT_STEP_MINUTES)
+        last_cell = CELLS_PER_DAY if until_time is None else _cell_floor(until_time)
+        window = (_CELLS >= _cell_ceil(from_time)) & (_CELLS + cells <= last_cell)
+        room = (self.fits(duration_minutes)[:, day, :] & window).any(axis=1)
+        return [self.master_ids[i] for i in np.flatnonzero(room)]
+
+    def free_minutes(self) -> np.ndarray:
+        """Свободные минуты: int [мастер, день]"""
+        return self.free.sum(axis=2) * SLOT_STEP_MINUTES
+
+    def slots(self, master_id: int, work_date: date, duration_minutes: int) -> List[datetime]:
+        """Времена начала, с которых помещается услуга, у мастера в дату"""
+        master, day = self._master_index.get(master_id), self._date_index.get(work_date)
+        if master is None or day is None:
+            return []
+        midnight = datetime.combine(work_date, time(0, 0))
+        return [midnight + timedelta(minutes=int(cell) * SLOT_STEP_MINUTES)
+                for cell in np.flatnonzero(self.fits(duration_minutes)[master, day])]
+
+
+def build_availability_grid(start_date: date, end_date: date, schedules: List[MasterSchedule],
+                            busy_masks: Dict[int, int]) -> AvailabilityGrid:
+    """
+    Строит сетку по загруженным расписаниям
+
+    Args:
+        start_date: Первая дата
+        end_date: Последняя дата
+        schedules: Расписания периода (с загруженным master)
+        busy_masks: ID расписания -> маска занятых ячеек для дней без occupancy_mask
+
+    Returns:
+        AvailabilityGrid: Сетка мастеров, у которых есть расписание в периоде
+    """
+    dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    names = {schedule.master_id: schedule.master.full_name for schedule in schedules}
+    master_ids = sorted(names)
+    master_index = {master_id: i for i, master_id in enumerate(master_ids)}
+    date_index = {day: i for i, day in enumerate(dates)}
+
+    shape = (len(master_ids), len(dates))
+    schedule_ids = np.zeros(shape, dtype=np.int64)
+    masks = np.zeros(shape, dtype=np.uint64)
+    first_cells = np.zeros(shape, dtype=np.int64)
+    last_cells = np.zeros(shape, dtype=np.int64)
+    for schedule in schedules:
+        if schedule.is_day_off or schedule.work_date not in date_index: #type:ignore
+            continue
+        position = (master_index[schedule.master_id], date_index[schedule.work_date]) #type:ignore
+        schedule_ids[position] = schedule.schedule_id
+        mask = schedule.occupancy_mask if schedule.occupancy_mask is not None else busy_masks.get(schedule.schedule_id, 0) #type:ignore
+        masks[position] = mask
+        first_cells[position] = _cell_ceil(schedule.start_time) #type:ignore
+        last_cells[position] = _cell_floor(schedule.end_time) #type:ignore
+
+    busy = (masks[:, :, None] >> _CELLS.astype(np.uint64)) & np.uint64(1)
+    work = (_CELLS >= first_cells[:, :, None]) & (_CELLS < last_cells[:, :, None]) & (schedule_ids > 0)[:, :, None]
+    return AvailabilityGrid(master_ids, [names[master_id] for master_id in master_ids], dates, work, work & (busy == 0), #type:ignore
+                            schedule_ids)
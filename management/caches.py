@@ -0,0 +1,274 @@
+import threading
+import time as timer
+from typing import Dict, List, Optional, Set, FrozenSet, Iterable, Tuple, Any
+from datetime import date
+from weakref import WeakKeyDictionary
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from models.services import Service, ServiceCategory
+from models.base import master_service_category
+
+# через сколько секунд перечитывать каталог, даже если его не меняли в этом процессе
+CATALOG_TTL_SECONDS = 300.0
+
+# через сколько секунд пересчитывать отчет за закрытый период
+REPORT_TTL_SECONDS = 300.0
+
+
+# кэш каталога услуг и категорий в памяти процесса
+#
+# В кэше лежат значения столбцов, а не объекты: каждый вызов получает свои отсоединенные
+# копии Service и ServiceCategory, так что изменение копии не видно другим читателям.
+# У копий загружены только столбцы и service.category; остальные связи (service.appointments,
+# category.services, category.masters) не загружены, и обращение к ним вызывает
+# DetachedInstanceError. Для связей и изменений загружайте объект своей сессией.
+class CatalogCache:
+    def __init__(self, ttl_seconds: float = CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._services: Dict[int, Dict[str, Any]] = {}
+        self._categories: Dict[int, Dict[str, Any]] = {}
+
+    def invalidate(self) -> None:
+        """Сбрасывает кэш: следующее чтение загрузит каталог заново"""
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def get_service(self, session: Session, service_id: int) -> Optional[Service]:
+        services, categories = self._ensure_loaded(session)
+        values = services.get(service_id)
+        return self._service(values, categories, {}) if values is not None else None
+
+    def get_all_services(self, session: Session) -> List[Service]:
+        services, categories = self._ensure_loaded(session)
+        copies: Dict[int, ServiceCategory] = {}
+        return [self._service(values, categories, copies) for values in services.values()]
+
+    def get_services_by_category(self, session: Session, category_id: int) -> List[Service]:
+        services, categories = self._ensure_loaded(session)
+        copies: Dict[int, ServiceCategory] = {}
+        return [self._service(values, categories, copies) for values in services.values() if values["category_id"] == category_id]
+
+    def get_category(self, session: Session, category_id: int) -> Optional[ServiceCategory]:
+        values = self._ensure_loaded(session)[1].get(category_id)
+        return self._detached(ServiceCategory, values) if values is not None else None
+
+    def get_all_categories(self, session: Session) -> List[ServiceCategory]:
+        return [self._detached(ServiceCategory, values) for values in self._ensure_loaded(session)[1].values()]
+
+    @staticmethod
+    def _detached(model, values: Dict[str, Any]):
+        obj = model(**values)
+        make_transient_to_detached(obj)
+        return obj
+
+    def _service(self, values: Dict[str, Any], categories: Dict[int, Dict[str, Any]], copies: Dict[int, ServiceCategory]) -> Service:
+        """Копия услуги с копией ее категории (одна копия категории на вызов)"""
+        service = self._detached(Service, values)
+        category_id = values["category_id"]
+        if category_id not in copies and category_id in categories:
+            copies[category_id] = self._detached(ServiceCategory, categories[category_id])
+        # без backref: category.services копии остается незагруженной, а не списком из одной услуги
+        set_committed_value(service, "category", copies.get(category_id))
+        return service
+
+    def _ensure_loaded(self, session: Session):
+        with self._lock:
+            if self._loaded_at is not None and timer.monotonic() - self._loaded_at <= self.ttl_seconds:
+                return self._services, self._categories
+            generation = self._generation
+
+        # запрос выполняется без блокировки: в AsyncSession.run_sync ожидание ответа бд
+        # переключает задачи в том же потоке, и вторая задача не должна ждать threading.Lock
+        services, categories = self._load(session)
+        with self._lock:
+            # если кэш сбросили во время загрузки, результат мог устареть - не сохраняем его
+            if self._generation == generation:
+                self._services, self._categories = services, categories
+                self._loaded_at = timer.monotonic()
+        return services, categories
+
+    @staticmethod
+    def _load(session: Session):
+        """
+        Читает каталог двумя запросами в словари значений столбцов
+
+        Строки читаются через Core, поэтому identity map сессии вызывающего не меняется.
+        """
+        categories = {row.category_id: dict(row._mapping) for row in session.execute(
+            select(ServiceCategory.__table__).order_by(ServiceCategory.category_id))}
+        services = {row.service_id: dict(row._mapping) for row in session.execute(
+            select(Service.__table__).order_by(Service.service_id))}
+        return services, categories
+
+
+# индекс "категория услуг -> мастера, которые ее выполняют"
+class CapabilityIndex:
+    def __init__(self, ttl_seconds: float = CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._masters_by_category: Dict[int, Set[int]] = {}
+
+    def invalidate(self) -> None:
+        """Сбрасывает индекс: следующее чтение построит его заново"""
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def masters_for_category(self, session: Session, category_id: int) -> FrozenSet[int]:
+        """
+        Возвращает ID мастеров, которые выполняют услуги категории
+
+        Args:
+            session: Сессия для построения индекса, если он еще не загружен
+            category_id: ID категории
+
+        Returns:
+            FrozenSet[int]: ID мастеров
+        """
+        masters_by_category = self._ensure_loaded(session)
+        with self._lock:
+            return frozenset(masters_by_category.get(category_id, ()))
+
+    def can_perform(self, session: Session, master_id: int, category_id: int) -> bool:
+        masters_by_category = self._ensure_loaded(session)
+        with self._lock:
+            return master_id in masters_by_category.get(category_id, ())
+
+    def add(self, master_id: int, category_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._loaded_at is not None:
+                for category_id in category_ids:
+                    self._masters_by_category.setdefault(category_id, set()).add(master_id)
+
+    def remove(self, master_id: int, category_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._loaded_at is not None:
+                self._masters_by_category.get(category_id, set()).discard(master_id)
+
+    def remove_master(self, master_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._loaded_at is not None:
+                for master_ids in self._masters_by_category.values():
+                    master_ids.discard(master_id)
+
+    def _ensure_loaded(self, session: Session) -> Dict[int, Set[int]]:
+        with self._lock:
+            if self._loaded_at is not None and timer.monotonic() - self._loaded_at <= self.ttl_seconds:
+                return self._masters_by_category
+            generation = self._generation
+
+        # как в CatalogCache: запрос без блокировки, устаревший результат не сохраняется
+        masters_by_category: Dict[int, Set[int]] = {}
+        for row in session.execute(select(master_service_category.c.category_id, master_service_category.c.master_id)):
+            masters_by_category.setdefault(row.category_id, set()).add(row.master_id)
+        with self._lock:
+            if self._generation == generation:
+                self._masters_by_category = masters_by_category
+                self._loaded_at = timer.monotonic()
+        return masters_by_category
+
+
+# кэш отчетов за закрытые периоды: (начало, конец) -> результат
+#
+# Сброс по дням виден только в этом процессе: изменения из другого процесса (служебные
+# команды, API) кэш замечает не позже чем через ttl_seconds.
+class ReportCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = REPORT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._reports: Dict[Tuple[date, date], Tuple[float, Any]] = {}
+
+    def get(self, start_date: date, end_date: date) -> Optional[Any]:
+        with self._lock:
+            entry = self._reports.get((start_date, end_date))
+            if entry is None:
+                return None
+            if timer.monotonic() - entry[0] > self.ttl_seconds:
+                del self._reports[(start_date, end_date)]
+                return None
+            return entry[1]
+
+    def put(self, start_date: date, end_date: date, report: Any) -> None:
+        with self._lock:
+            if len(self._reports) >= self.max_entries:
+                self._reports.pop(next(iter(self._reports)))
+            self._reports[(start_date, end_date)] = (timer.monotonic(), report)
+
+    def invalidate_day(self, day: date) -> None:
+        """Удаляет отчеты, в период которых входит день (запись задним числом изменила прошлое)"""
+        with self._lock:
+            for start_date, end_date in list(self._reports):
+                if start_date <= day <= end_date:
+                    del self._reports[(start_date, end_date)]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._reports.clear()
+
+
+_catalog_caches: "WeakKeyDictionary[Engine, CatalogCache]" = WeakKeyDictionary()
+_capability_indexes: "WeakKeyDictionary[Engine, CapabilityIndex]" = WeakKeyDictionary()
+_report_caches: "WeakKeyDictionary[Engine, ReportCache]" = WeakKeyDictionary()
+_registry_lock = threading.Lock()
+
+
+def _for_engine(registry: WeakKeyDictionary, session: Session, factory):
+    engine = session.get_bind().engine
+    with _registry_lock:
+        value = registry.get(engine)
+        if value is None:
+            value = registry[engine] = factory()
+        return value
+
+
+def catalog_cache(session: Session) -> CatalogCache:
+    """
+    Возвращает кэш каталога для базы, к которой привязана сессия
+
+    Кэш общий для всех сессий одного движка и исчезает вместе с движком.
+
+    Args:
+        session: Сессия SQLAlchemy
+
+    Returns:
+        CatalogCache: Кэш каталога
+    """
+    return _for_engine(_catalog_caches, session, CatalogCache)
+
+
+def capability_index(session: Session) -> CapabilityIndex:
+    """
+    Возвращает индекс возможностей мастеров для базы, к которой привязана сессия
+
+    Args:
+        session: Сессия SQLAlchemy
+
+    Returns:
+        CapabilityIndex: Индекс категория -> мастера
+    """
+    return _for_engine(_capability_indexes, session, CapabilityIndex)
+
+
+def report_cache(session: Session) -> ReportCache:
+    """
+    Возвращает кэш отчетов статистики для базы, к которой привязана сессия
+
+    Args:
+        session: Сессия SQLAlchemy
+
+    Returns:
+        ReportCache: Кэш отчетов за закрытые периоды
+    """
+    return _for_engine(_report_caches, session, ReportCache)
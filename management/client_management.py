@@ -1,7 +1,17 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import insert, select, update, bindparam, func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Optional, Tuple, Dict, Iterator, Any, IO
+import csv
+import json
 from models.clients import Client, SalonCard, DiscountLevel
+from models.schedule import Appointment, AppointmentStatus
+from models.services import Service
 from auth.authentification import normalize_phone, simple_hash
+from management.validation import normalize_contacts
+from management.occupancy import verify_occupancy
+from management.statistics_management import record_appointments_deleted
+from management.caches import report_cache
 from exceptions import ClientError
 
 # для управления клиентами в бд
@@ -27,8 +37,7 @@ class ClientService:
         Raises:
             ClientError: Если клиент с таким телефоном или email уже существует
         """
-        normalized_phone = normalize_phone(phone)
-        normalized_email = email.lower().strip() if email else None
+        normalized_phone, normalized_email = normalize_contacts(phone, email)
         
         # Проверка уникальности телефона
         existing_phone = self.session.query(Client).filter_by(phone=normalized_phone).first()
@@ -40,8 +49,6 @@ class ClientService:
             existing_email = self.session.query(Client).filter_by(email=normalized_email).first()
             if existing_email:
                 raise ClientError(f"Клиент с email {email} уже существует")
-        else:
-            normalized_email = None
         
         try:
             # Создаем клиента
@@ -108,6 +115,22 @@ class ClientService:
             List[Client]: Список всех клиентов
         """
         return self.session.query(Client).all()
+
+    def get_clients_page(self, limit: int = 20, after_id: Optional[int] = None) -> List[Client]:
+        """
+        Возвращает страницу клиентов по возрастанию ID (keyset-пагинация)
+
+        Args:
+            limit: Размер страницы
+            after_id: ID последнего клиента предыдущей страницы. None = первая страница
+
+        Returns:
+            List[Client]: Не более limit клиентов с загруженными картами
+        """
+        query = self.session.query(Client).options(joinedload(Client.salon_card))
+        if after_id is not None:
+            query = query.filter(Client.client_id > after_id) #type:ignore
+        return query.order_by(Client.client_id).limit(limit).all()
     
     def update_client(self, client_id: int, field: str, value: str) -> Client:
         """
@@ -215,8 +238,17 @@ class ClientService:
         if not client:
             return False
         
+        # запланированные записи удаляются вместе с клиентом: их ячейки освобождаются в той же транзакции
+        scheduled = self.session.query(Appointment.schedule_id).filter(
+            Appointment.client_id == client_id, Appointment.status == AppointmentStatus.SCHEDULED).distinct() #type:ignore
+        schedule_ids = [row.schedule_id for row in scheduled]
+        days = record_appointments_deleted(self.session, Appointment.client_id == client_id)
         self.session.delete(client)
+        self.session.flush()
+        verify_occupancy(self.session, schedule_ids, rebuild=True)
         self.session.commit()
+        for day in days:
+            report_cache(self.session).invalidate_day(day)
         return True
 
 # для управления покупками (для карты салона) в бд
@@ -239,18 +271,344 @@ class PurchaseService:
         Raises:
             ClientError: Если клиент не найден или сумма некорректна
         """
+        discounted_amount, _, old_level, new_level = self.post_purchase(client_id, amount)
+        
+        client = self.session.get(Client, client_id)
+        if client.salon_card is not None: #type: ignore
+            self.session.refresh(client.salon_card) #type: ignore
+        return client, discounted_amount, old_level, new_level #type: ignore
+    
+    def post_purchase(self, client_id: int, amount: float) -> Tuple[float, float, DiscountLevel, DiscountLevel]:
+        """
+        Атомарно проводит покупку по карте лояльности
+        
+        Сумма со скидкой прибавляется в бд одним UPDATE ... RETURNING, поэтому одновременные
+        покупки одного клиента не теряют друг друга. Уровень пересчитывается вторым UPDATE
+        по тем же порогам (SalonCard.level_expression) только если он меняется.
+        
+        Args:
+            client_id: ID клиента
+            amount: Сумма покупки
+            
+        Returns:
+            Tuple[float, float, DiscountLevel, DiscountLevel]:
+                (сумма с учетом скидки, новая сумма покупок, старый уровень, новый уровень)
+            
+        Raises:
+            ClientError: Если сумма некорректна или у клиента нет карты лояльности
+        """
         if amount <= 0:
             raise ClientError("Сумма покупки должна быть положительной")
         
-        client = self.session.query(Client).filter(Client.client_id == client_id).first()
-        if not client or not client.salon_card:
+        cards = SalonCard.__table__
+        # discount_level здесь не меняется, поэтому RETURNING отдает уровень, по которому считалась скидка
+        row = self.session.execute(
+            update(cards).where(cards.c.client_id == client_id).values(
+                total_spent=cards.c.total_spent + amount * (1 - SalonCard.discount_rate_expression())
+            ).returning(cards.c.total_spent, cards.c.discount_level)
+        ).first()
+        if row is None:
+            self.session.rollback()
             raise ClientError(f"Клиент с ID {client_id} не найден или у него нет карты лояльности")
         
-        discounted_amount = client.salon_card.apply_discount(amount)
-        old_level = client.salon_card.discount_level
-        client.salon_card.total_spent += discounted_amount
-        client.salon_card.upgrade_level()
-        new_level = client.salon_card.discount_level
+        total_spent, old_level = row
+        discounted_amount = amount * (1 - SalonCard.DISCOUNT_RATES[old_level])
+        new_level = old_level
+        for threshold, level in SalonCard.LEVEL_THRESHOLDS:
+            if total_spent >= threshold:
+                new_level = level
+                break
+        
+        if new_level != old_level:
+            self.session.execute(update(cards).where(cards.c.client_id == client_id).values(
+                discount_level=SalonCard.level_expression(cards.c.total_spent)))
         self.session.commit()
+        return discounted_amount, total_spent, old_level, new_level
+    
+    def post_purchases(self, purchases: List[Tuple[int, float]], commit: bool = True) -> int:
+        """
+        Проводит пачку покупок (например, при закрытии дня) двумя запросами
+        
+        Суммы прибавляются одним пакетным UPDATE (executemany), затем уровни всех
+        затронутых карт пересчитываются одним UPDATE. Покупки одного клиента
+        в пачке применяются по очереди, скидка каждой считается по текущему уровню.
+        
+        Args:
+            purchases: Список (ID клиента, сумма покупки); клиенты без карты пропускаются
+            commit: Зафиксировать транзакцию (False - оставить вызывающему)
             
-        return client, discounted_amount, old_level, new_level
+        Returns:
+            int: Число проведенных покупок
+        """
+        purchases = [(client_id, amount) for client_id, amount in purchases if amount > 0]
+        if not purchases:
+            return 0
+        
+        cards = SalonCard.__table__
+        result = self.session.execute(
+            update(cards).where(cards.c.client_id == bindparam("purchase_client_id")).values(
+                total_spent=cards.c.total_spent + bindparam("purchase_amount") * (1 - SalonCard.discount_rate_expression())),
+            [{"purchase_client_id": client_id, "purchase_amount": amount} for client_id, amount in purchases]
+        )
+        client_ids = sorted({client_id for client_id, _ in purchases})
+        self.session.execute(update(cards).where(cards.c.client_id.in_(client_ids)).values(
+            discount_level=SalonCard.level_expression(cards.c.total_spent)))
+        if commit:
+            self.session.commit()
+        return result.rowcount #type: ignore
+    
+    def recompute_loyalty_tiers(self, recompute_totals: bool = True, dry_run: bool = False) -> Tuple[int, int]:
+        """
+        Пересчитывает карты лояльности всех клиентов несколькими запросами
+        
+        С recompute_totals сумма покупок карт клиентов с выполненными записями заново
+        считается одним UPDATE ... FROM с агрегирующим подзапросом - по суммам, фактически
+        списанным при выполнении (со скидкой); для записей, выполненных до появления этих
+        столбцов, - по текущей цене и уровню карты, как в rebuild_daily_stats. Карты без
+        выполненных записей не трогаются: их сумма набрана покупками, внесенными вручную.
+        Уровень выставляется строго по порогам SalonCard.LEVEL_THRESHOLDS (ниже младшего -
+        STANDARD), то есть может и понизиться.
+        Без recompute_totals заново применяются только пороги к текущим суммам.
+        
+        Args:
+            recompute_totals: Пересчитать суммы покупок по выполненным записям
+            dry_run: Только посчитать изменения и откатить транзакцию
+            
+        Returns:
+            Tuple[int, int]: (число карт с измененной суммой или уровнем, число карт со сменой уровня)
+        """
+        cards = SalonCard.__table__
+        
+        if not recompute_totals:
+            new_level = SalonCard.level_expression(cards.c.total_spent, DiscountLevel.STANDARD)
+            result = self.session.execute(update(cards).where(cards.c.discount_level != new_level).values(discount_level=new_level))
+            updated = tier_changes = result.rowcount #type: ignore
+        else:
+            # уровень карты внутри подзапроса берется из псевдонима, чтобы не смешивать его с обновляемой таблицей
+            card = aliased(SalonCard)
+            rate = SalonCard.discount_rate_expression(card.discount_level)
+            charged = func.sum(func.coalesce(Appointment.completed_discounted_price, Service.price * (1 - rate))).label("total") #type: ignore
+            totals = select(Appointment.client_id, charged).join(
+                Service, Service.service_id == Appointment.service_id).outerjoin(
+                card, card.client_id == Appointment.client_id).where(
+                Appointment.status == AppointmentStatus.COMPLETED #type: ignore
+            ).group_by(Appointment.client_id).subquery()
+            new_level = SalonCard.level_expression(totals.c.total, DiscountLevel.STANDARD)
+            
+            tier_changes = self.session.execute(
+                select(func.count()).select_from(cards.join(totals, totals.c.client_id == cards.c.client_id)).where(
+                    cards.c.discount_level != new_level)
+            ).scalar_one()
+            
+            # только карты с выполненными записями: UPDATE ... FROM (агрегат)
+            with_purchases = update(cards).where(cards.c.client_id == totals.c.client_id, or_(
+                cards.c.total_spent != totals.c.total, cards.c.discount_level != new_level
+            )).values(total_spent=totals.c.total, discount_level=new_level)
+            updated = self.session.execute(with_purchases).rowcount #type: ignore
+        
+        if dry_run:
+            self.session.rollback()
+        else:
+            self.session.commit()
+        return updated, tier_changes
+
+# отчет о массовом импорте клиентов
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def add_error(self, line_number: int, message: str) -> None:
+        self.errors.append((line_number, message))
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    def __repr__(self) -> str:
+        return f"ImportReport(created={self.created}, failed={self.failed})"
+
+# для массового импорта и экспорта клиентов
+class ClientBulkService:
+    EXPORT_FIELDS = ["client_id", "first_name", "last_name", "phone", "email", "discount_level", "total_spent"]
+
+    def __init__(self, session: Session, chunk_size: int = 1000):
+        self.session = session
+        self.chunk_size = chunk_size
+
+    def import_clients(self, source: IO[str], file_format: str = "csv") -> ImportReport:
+        """
+        Потоково импортирует клиентов из CSV или JSONL
+
+        Поля: first_name, last_name, phone, email (необязательно), password или password_hash,
+        total_spent (необязательно). Строки читаются порциями по chunk_size: дубликаты
+        ищутся в памяти и одним запросом к бд на порцию, клиенты и карты вставляются
+        пакетно, на порцию приходится один commit.
+
+        Args:
+            source: Открытый текстовый файл
+            file_format: "csv" или "jsonl"
+
+        Returns:
+            ImportReport: Число созданных клиентов и ошибки по номерам строк
+        """
+        report = ImportReport()
+        seen_phones: set = set()
+        seen_emails: set = set()
+
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        for line_number, row in self._read_rows(source, file_format, report):
+            prepared = self._prepare_row(row)
+            if isinstance(prepared, str):
+                report.add_error(line_number, prepared)
+                continue
+
+            if prepared["phone"] in seen_phones:
+                report.add_error(line_number, f"Телефон {prepared['phone']} повторяется в файле")
+                continue
+            if prepared["email"] and prepared["email"] in seen_emails:
+                report.add_error(line_number, f"Email {prepared['email']} повторяется в файле")
+                continue
+            seen_phones.add(prepared["phone"])
+            if prepared["email"]:
+                seen_emails.add(prepared["email"])
+
+            chunk.append((line_number, prepared))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk, report)
+                chunk = []
+
+        if chunk:
+            self._import_chunk(chunk, report)
+        report.errors.sort()
+        return report
+
+    def import_file(self, path: str) -> ImportReport:
+        """Импортирует клиентов из файла .csv или .jsonl"""
+        file_format = "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+        with open(path, encoding="utf-8", newline="") as source:
+            return self.import_clients(source, file_format)
+
+    def export_clients(self, target: IO[str], file_format: str = "csv") -> int:
+        """
+        Потоково выгружает клиентов с картами лояльности в CSV или JSONL
+
+        Строки читаются порциями через серверный курсор (yield_per), поэтому
+        память не растет с размером таблицы. Хэши паролей не выгружаются.
+
+        Args:
+            target: Открытый на запись текстовый файл
+            file_format: "csv" или "jsonl"
+
+        Returns:
+            int: Число выгруженных клиентов
+        """
+        query = select(Client.client_id, Client.first_name, Client.last_name, Client.phone, Client.email,
+                       SalonCard.discount_level, SalonCard.total_spent).outerjoin(
+            SalonCard, SalonCard.client_id == Client.client_id).order_by(Client.client_id).execution_options(yield_per=self.chunk_size) #type:ignore
+
+        writer = None
+        if file_format == "csv":
+            writer = csv.writer(target)
+            writer.writerow(self.EXPORT_FIELDS)
+
+        count = 0
+        for row in self.session.execute(query):
+            values = list(row)
+            values[5] = row.discount_level.value if row.discount_level else None
+            if writer:
+                writer.writerow(values)
+            else:
+                target.write(json.dumps(dict(zip(self.EXPORT_FIELDS, values)), ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def _read_rows(self, source: IO[str], file_format: str, report: ImportReport) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        if file_format == "csv":
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+        elif file_format == "jsonl":
+            for line_number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    report.add_error(line_number, f"Некорректный JSON: {e}")
+                    continue
+                if not isinstance(row, dict):
+                    report.add_error(line_number, "Строка должна быть JSON-объектом")
+                    continue
+                yield line_number, row
+        else:
+            raise ClientError(f"Неизвестный формат импорта: {file_format}")
+
+    def _prepare_row(self, row: Dict[str, Any]):
+        """Нормализует строку импорта; возвращает словарь полей или текст ошибки"""
+        first_name = str(row.get("first_name") or "").strip()
+        last_name = str(row.get("last_name") or "").strip()
+        if not first_name or not last_name:
+            return "Не указаны имя или фамилия"
+
+        phone = normalize_phone(str(row.get("phone") or ""))
+        if len(phone) < 2 or len(phone) > 20:
+            return f"Некорректный телефон: {row.get('phone')}"
+
+        email = str(row.get("email") or "").lower().strip() or None
+
+        if row.get("password_hash"):
+            password_hash = str(row["password_hash"])
+        elif row.get("password"):
+            password_hash = simple_hash(str(row["password"]))
+        else:
+            return "Не указан пароль"
+
+        try:
+            total_spent = float(row.get("total_spent") or 0.0)
+        except ValueError:
+            return f"Некорректная сумма покупок: {row.get('total_spent')}"
+        if total_spent < 0:
+            return "Сумма покупок не может быть отрицательной"
+
+        return {"first_name": first_name, "last_name": last_name, "phone": phone, "email": email,
+                "password_hash": password_hash, "total_spent": total_spent}
+
+    def _import_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> None:
+        phones = [row["phone"] for _, row in chunk]
+        emails = [row["email"] for _, row in chunk if row["email"]]
+
+        taken_phones = {phone for (phone,) in self.session.query(Client.phone).filter(Client.phone.in_(phones)).all()} #type:ignore
+        taken_emails = set()
+        if emails:
+            taken_emails = {email for (email,) in self.session.query(Client.email).filter(Client.email.in_(emails)).all()} #type:ignore
+
+        rows = []
+        for line_number, row in chunk:
+            if row["phone"] in taken_phones:
+                report.add_error(line_number, f"Клиент с телефоном {row['phone']} уже существует")
+            elif row["email"] and row["email"] in taken_emails:
+                report.add_error(line_number, f"Клиент с email {row['email']} уже существует")
+            else:
+                rows.append((line_number, row))
+        if not rows:
+            return
+
+        try:
+            client_rows = [{key: row[key] for key in ("first_name", "last_name", "phone", "email", "password_hash")} for _, row in rows]
+            created = self.session.execute(insert(Client).returning(Client.client_id, Client.phone), client_rows).all() #type:ignore
+            client_ids = {phone: client_id for client_id, phone in created}
+
+            cards = []
+            for _, row in rows:
+                card = SalonCard(total_spent=row["total_spent"], discount_level=DiscountLevel.STANDARD)
+                card.upgrade_level()
+                cards.append({"client_id": client_ids[row["phone"]], "total_spent": row["total_spent"],
+                              "discount_level": card.discount_level})
+            self.session.execute(insert(SalonCard), cards)
+            self.session.commit()
+            report.created += len(rows)
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            for line_number, _ in rows:
+                report.add_error(line_number, f"Ошибка при сохранении порции: {e.__class__.__name__}")
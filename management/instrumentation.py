@@ -0,0 +1,246 @@
+import functools
+import inspect
+import json
+import threading
+import time as timer
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from management.client_management import ClientService, PurchaseService, ClientBulkService
+from management.master_management import MasterService, SpecialtyService
+from management.service_management import ServiceService, CategoryService
+from management.schedule_management import ScheduleService, AppointmentService
+from management.statistics_management import StatisticsService
+
+# Замеры публичных методов сервисов management: число запросов, полученные строки,
+# время в бд и общее время вызова. По умолчанию выключены и ничего не стоят:
+# методы подменяются и события движка подключаются только в enable_instrumentation.
+# Строки считаются курсором по мере чтения (вызовам, активным при выполнении запроса),
+# поэтому результаты запросов не буферизуются и не копируются.
+
+# переменная окружения: путь к файлу, куда main.py допишет метрики (JSON lines) при выходе
+METRICS_FILE_ENV = "SALON_METRICS_FILE"
+
+# сервисы, публичные методы которых замеряются
+INSTRUMENTED_CLASSES = [ClientService, PurchaseService, ClientBulkService, MasterService, SpecialtyService,
+                        ServiceService, CategoryService, ScheduleService, AppointmentService, StatisticsService]
+
+# метрики и их описания для текстового формата Prometheus
+PROMETHEUS_METRICS = [
+    ("calls", "salon_method_calls_total", "counter", "Число вызовов метода"),
+    ("queries", "salon_method_queries_total", "counter", "Запросов к бд за все вызовы"),
+    ("rows", "salon_method_rows_total", "counter", "Строк получено из бд за все вызовы"),
+    ("db_seconds", "salon_method_db_seconds_total", "counter", "Время выполнения запросов, с"),
+    ("total_seconds", "salon_method_seconds_total", "counter", "Общее время вызовов, с"),
+    ("max_seconds", "salon_method_seconds_max", "gauge", "Самый долгий вызов, с"),
+]
+
+
+# накопленные показатели одного метода
+class MethodMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "queries": self.queries, "rows": self.rows, "db_seconds": self.db_seconds,
+                "total_seconds": self.total_seconds, "max_seconds": self.max_seconds}
+
+    def __repr__(self) -> str:
+        return f"MethodMetrics(calls={self.calls}, queries={self.queries}, total_seconds={self.total_seconds:.4f})"
+
+
+# реестр метрик процесса: "Класс.метод" -> MethodMetrics
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods: Dict[str, MethodMetrics] = {}
+
+    def record(self, method: str, queries: int, rows: int, db_seconds: float, total_seconds: float) -> None:
+        with self._lock:
+            metrics = self._methods.get(method)
+            if metrics is None:
+                metrics = self._methods[method] = MethodMetrics()
+            metrics.calls += 1
+            metrics.queries += queries
+            metrics.rows += rows
+            metrics.db_seconds += db_seconds
+            metrics.total_seconds += total_seconds
+            metrics.max_seconds = max(metrics.max_seconds, total_seconds)
+
+    def get(self, method: str) -> Optional[MethodMetrics]:
+        with self._lock:
+            return self._methods.get(method)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Копия всех показателей: "Класс.метод" -> словарь показателей"""
+        with self._lock:
+            return {method: metrics.as_dict() for method, metrics in sorted(self._methods.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._methods.clear()
+
+    def to_prometheus(self) -> str:
+        """Показатели в текстовом формате Prometheus"""
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        for key, name, metric_type, description in PROMETHEUS_METRICS:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for method, values in snapshot.items():
+                lines.append(f'{name}{{method="{method}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """Показатели в формате JSON lines: строка на метод с отметкой времени"""
+        timestamp = timer.time()
+        return "".join(json.dumps({"timestamp": timestamp, "method": method, **values}, ensure_ascii=False) + "\n"
+                       for method, values in self.snapshot().items())
+
+    def write_json_lines(self, path: str) -> None:
+        """Дописывает текущие показатели в файл JSON lines"""
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(self.to_json_lines())
+
+
+metrics = MetricsRegistry()
+
+
+# показатели одного выполняющегося вызова
+class _CallFrame:
+    __slots__ = ("queries", "rows", "db_seconds", "started")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.started = timer.perf_counter()
+
+
+# стек вызовов замеряемых методов в текущем потоке; запрос засчитывается всем вызовам стека
+_local = threading.local()
+_originals: Dict[type, Dict[str, Callable]] = {}
+_engines: List[Engine] = []
+
+
+def _frames() -> List[_CallFrame]:
+    frames = getattr(_local, "frames", None)
+    if frames is None:
+        frames = _local.frames = []
+    return frames
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and getattr(_local, "frames", None):
+        context.salon_query_started = timer.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "salon_query_started", None)
+    if started is None:
+        return
+    elapsed = timer.perf_counter() - started
+    frames = _frames()
+    for frame in frames:
+        frame.queries += 1
+        frame.db_seconds += elapsed
+    if cursor.description is not None:
+        # результат строится по context.cursor уже после этого события (это проверяет tests/tests_instrumentation.py)
+        context.cursor = _RowCountingCursor(cursor, list(frames))
+
+
+# курсор DBAPI, который засчитывает строки вызовам по мере чтения: результат не буферизуется и не копируется
+class _RowCountingCursor:
+    __slots__ = ("_cursor", "_frames")
+
+    def __init__(self, cursor: Any, frames: List[_CallFrame]):
+        self._cursor = cursor
+        self._frames = frames
+
+    def _add(self, rows: int) -> None:
+        for frame in self._frames:
+            frame.rows += rows
+
+    def fetchone(self) -> Any:
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._add(1)
+        return row
+
+    def fetchmany(self, *args) -> Any:
+        rows = self._cursor.fetchmany(*args)
+        self._add(len(rows))
+        return rows
+
+    def fetchall(self) -> Any:
+        rows = self._cursor.fetchall()
+        self._add(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+def _instrumented(name: str, method: Callable) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        frames = _frames()
+        frame = _CallFrame()
+        frames.append(frame)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            frames.pop()
+            metrics.record(name, frame.queries, frame.rows, frame.db_seconds, timer.perf_counter() - frame.started)
+    return wrapper
+
+
+def enable_instrumentation(engine: Engine, classes: Optional[List[type]] = None) -> None:
+    """
+    Включает замеры: подключает события движка и оборачивает публичные методы сервисов
+
+    Повторный вызов для того же движка ничего не меняет, для другого - добавляет его события.
+
+    Args:
+        engine: Движок, запросы которого считать
+        classes: Классы сервисов. None = INSTRUMENTED_CLASSES
+    """
+    if engine not in _engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        _engines.append(engine)
+
+    for cls in classes or INSTRUMENTED_CLASSES:
+        if cls in _originals:
+            continue
+        _originals[cls] = {}
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(method):
+                continue
+            _originals[cls][name] = method
+            setattr(cls, name, _instrumented(f"{cls.__name__}.{name}", method))
+
+
+def disable_instrumentation() -> None:
+    """Выключает замеры: возвращает исходные методы и отключает события. Реестр metrics не очищается"""
+    for cls, methods in _originals.items():
+        for name, method in methods.items():
+            setattr(cls, name, method)
+    _originals.clear()
+
+    for engine in _engines:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+    _engines.clear()
+
+
+def is_instrumentation_enabled() -> bool:
+    return bool(_originals)
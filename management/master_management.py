@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from models.masters import Master
+from models.schedule import Appointment
+from management.caches import capability_index, report_cache
+from management.statistics_management import record_appointments_deleted
 from exceptions import MasterError
 from auth.authentification import normalize_phone
+from management.validation import check_missing_categories
 
 # для управления мастерами в бд
 class MasterService:    
@@ -25,10 +29,7 @@ class MasterService:
         
         categories = self.session.query(ServiceCategory).filter(ServiceCategory.category_id.in_(category_ids)).all()
         
-        if len(categories) != len(category_ids):
-            found_ids = [c.category_id for c in categories]
-            missing = [c_id for c_id in category_ids if c_id not in found_ids]
-            raise ValueError(f"Категории с ID {missing} не найдены")
+        check_missing_categories(category_ids, [c.category_id for c in categories]) #type:ignore
         
         try:
             for category in categories:
@@ -36,6 +37,7 @@ class MasterService:
                     master.service_categories.append(category)
             
             self.session.commit()
+            capability_index(self.session).add(master_id, category_ids)
             
         except Exception as e:
             self.session.rollback()
@@ -101,6 +103,22 @@ class MasterService:
             List[Master]: Список всех мастеров
         """
         return self.session.query(Master).all()
+
+    def get_masters_page(self, limit: int = 20, after_id: Optional[int] = None) -> List[Master]:
+        """
+        Возвращает страницу мастеров по возрастанию ID (keyset-пагинация)
+
+        Args:
+            limit: Размер страницы
+            after_id: ID последнего мастера предыдущей страницы. None = первая страница
+
+        Returns:
+            List[Master]: Не более limit мастеров
+        """
+        query = self.session.query(Master)
+        if after_id is not None:
+            query = query.filter(Master.master_id > after_id) #type:ignore
+        return query.order_by(Master.master_id).limit(limit).all()
     
     def get_masters_by_specialty(self, specialty: str) -> List[Master]:
         """
@@ -158,8 +176,12 @@ class MasterService:
         master = self.get_master_by_id(master_id)
         if master:
             try:
+                days = record_appointments_deleted(self.session, Appointment.master_id == master_id)
                 self.session.delete(master)
                 self.session.commit()
+                capability_index(self.session).remove_master(master_id)
+                for day in days:
+                    report_cache(self.session).invalidate_day(day)
                 return True
             except Exception as e:
                 self.session.rollback()
@@ -190,6 +212,7 @@ class MasterService:
         if category in master.service_categories:
             master.service_categories.remove(category)
             self.session.commit()
+            capability_index(self.session).remove(master_id, category_id)
             return True
         
         return False
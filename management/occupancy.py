@@ -0,0 +1,174 @@
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import time
+from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
+from management.slot_engine import time_cell, interval_mask, FULL_DAY_MASK
+
+# Маска занятости дня (MasterSchedule.occupancy_mask): бит i установлен, если получасовая
+# ячейка i занята перерывом или запланированной записью. Маска меняется в той же транзакции,
+# что и записи с перерывами, атомарным UPDATE (mask | биты, mask & ~биты), поэтому свободные
+# слоты считаются по одной строке расписания. Если время дня не ложится на границы ячеек,
+# маска становится NULL и слоты считаются прежним способом - по записям и перерывам.
+#
+# UPDATE выполняются без синхронизации сессии: загруженные объекты расписания не
+# помечаются устаревшими (это важно для AsyncSession), а commit все равно их сбрасывает.
+
+
+def initial_occupancy(start_time: time, end_time: time) -> Optional[int]:
+    """Маска нового рабочего дня: 0, если часы работы на границах ячеек, иначе None (маска не ведется)"""
+    if time_cell(start_time) is None or time_cell(end_time) is None:
+        return None
+    return 0
+
+
+def _set_mask(session: Session, schedule_id: int, value: Any) -> None:
+    session.execute(update(MasterSchedule).where(MasterSchedule.schedule_id == schedule_id).values(occupancy_mask=value)
+                    .execution_options(synchronize_session=False))
+
+
+def mark_busy(session: Session, schedule_id: int, start: time, end: time) -> None:
+    """
+    Помечает интервал дня занятым (новая запись или перерыв), без commit
+
+    Args:
+        session: Сессия
+        schedule_id: ID расписания
+        start: Начало интервала
+        end: Конец интервала
+    """
+    bits = interval_mask(start, end)
+    if bits is None:
+        _set_mask(session, schedule_id, None)
+    elif bits:
+        _set_mask(session, schedule_id, MasterSchedule.occupancy_mask.op("|")(bits))
+
+
+def mark_free(session: Session, schedule_id: int, start: time, end: time, exclude_appointment_id: Optional[int] = None) -> None:
+    """
+    Освобождает интервал дня (отмена или закрытие записи, удаление перерыва), без commit
+
+    Ячейки, которые остаются занятыми другими перерывами или записями (перерыв можно
+    поставить поверх записи), снова помечаются занятыми: для этого читаются только
+    перерывы и запланированные записи того же дня. Удаляемый перерыв к этому моменту
+    уже должен быть удален из бд (flush), а освобождающая запись передается в exclude_appointment_id.
+
+    Args:
+        session: Сессия
+        schedule_id: ID расписания
+        start: Начало освобождаемого интервала
+        end: Конец освобождаемого интервала
+        exclude_appointment_id: Запись, которая освобождает интервал (ее статус мог еще не попасть в бд)
+    """
+    bits = interval_mask(start, end)
+    if not bits:
+        # невыровненный интервал мог попасть только в день, где маска уже NULL
+        return
+
+    still_busy: List[Tuple[time, time]] = [(break_start, break_end) for break_start, break_end in session.query( #type:ignore
+        MasterBreak.break_start, MasterBreak.break_end).filter(
+        MasterBreak.schedule_id == schedule_id, MasterBreak.break_start < end, MasterBreak.break_end > start).all()] #type:ignore
+    appointments = session.query(Appointment.start_datetime, Appointment.end_datetime).filter(
+        Appointment.schedule_id == schedule_id, Appointment.status == AppointmentStatus.SCHEDULED) #type:ignore
+    if exclude_appointment_id is not None:
+        appointments = appointments.filter(Appointment.appointment_id != exclude_appointment_id)
+    still_busy.extend((appointment_start.time(), appointment_end.time()) for appointment_start, appointment_end in appointments.all()
+                      if appointment_start.time() < end and appointment_end.time() > start)
+
+    keep = 0
+    for busy_start, busy_end in still_busy:
+        busy_bits = interval_mask(busy_start, busy_end)
+        if busy_bits is None:
+            _set_mask(session, schedule_id, None)
+            return
+        keep |= busy_bits & bits
+    _set_mask(session, schedule_id, MasterSchedule.occupancy_mask.op("&")(FULL_DAY_MASK ^ bits).op("|")(keep))
+
+
+def record_occupancy_change(session: Session, appointment: Any, old_status: Optional[AppointmentStatus],
+                            new_status: AppointmentStatus) -> None:
+    """
+    Обновляет маску дня при смене статуса записи (None -> SCHEDULED для новой записи), без commit
+
+    Занимают ячейки только запланированные записи, поэтому маска меняется лишь
+    при переходе в SCHEDULED или из него.
+
+    Args:
+        session: Сессия
+        appointment: Запись (нужны appointment_id, schedule_id, start_datetime, end_datetime)
+        old_status: Прежний статус, None для новой записи
+        new_status: Новый статус
+    """
+    if old_status == new_status:
+        return
+    if new_status == AppointmentStatus.SCHEDULED:
+        mark_busy(session, appointment.schedule_id, appointment.start_datetime.time(), appointment.end_datetime.time())
+    elif old_status == AppointmentStatus.SCHEDULED:
+        mark_free(session, appointment.schedule_id, appointment.start_datetime.time(), appointment.end_datetime.time(),
+                  exclude_appointment_id=appointment.appointment_id)
+
+
+def compute_occupancy_masks(session: Session, schedule_ids: Optional[List[int]] = None) -> Dict[int, Optional[int]]:
+    """
+    Считает маски занятости заново по перерывам и запланированным записям
+
+    Args:
+        session: Сессия
+        schedule_ids: Какие расписания считать. None = все
+
+    Returns:
+        Dict[int, Optional[int]]: ID расписания -> маска (None, если время дня не на границах ячеек)
+    """
+    return _computed_and_stored_masks(session, schedule_ids)[0]
+
+
+def verify_occupancy(session: Session, schedule_ids: Optional[List[int]] = None, rebuild: bool = False) -> List[int]:
+    """
+    Сверяет сохраненные маски с пересчитанными по перерывам и записям
+
+    Args:
+        session: Сессия
+        schedule_ids: Какие расписания проверить. None = все
+        rebuild: Записать пересчитанные маски вместо расходящихся (без commit)
+
+    Returns:
+        List[int]: ID расписаний, маски которых расходились
+    """
+    masks, stored = _computed_and_stored_masks(session, schedule_ids)
+    mismatched = sorted(schedule_id for schedule_id, mask in stored.items() if masks[schedule_id] != mask)
+    if rebuild and mismatched:
+        session.execute(update(MasterSchedule).execution_options(synchronize_session=False),
+                        [{"schedule_id": schedule_id, "occupancy_mask": masks[schedule_id]} for schedule_id in mismatched])
+    return mismatched
+
+
+def _computed_and_stored_masks(session: Session, schedule_ids: Optional[List[int]]) -> Tuple[Dict[int, Optional[int]], Dict[int, Optional[int]]]:
+    """Пересчитанные и сохраненные маски расписаний: три запроса (расписания, перерывы, записи)"""
+    if schedule_ids is not None and not schedule_ids:
+        return {}, {}
+    schedules = session.query(MasterSchedule.schedule_id, MasterSchedule.start_time, MasterSchedule.end_time, MasterSchedule.occupancy_mask) #type:ignore
+    breaks = session.query(MasterBreak.schedule_id, MasterBreak.break_start, MasterBreak.break_end) #type:ignore
+    appointments = session.query(Appointment.schedule_id, Appointment.start_datetime, Appointment.end_datetime).filter(
+        Appointment.status == AppointmentStatus.SCHEDULED) #type:ignore
+    if schedule_ids is not None:
+        schedules = schedules.filter(MasterSchedule.schedule_id.in_(schedule_ids))
+        breaks = breaks.filter(MasterBreak.schedule_id.in_(schedule_ids))
+        appointments = appointments.filter(Appointment.schedule_id.in_(schedule_ids))
+
+    masks: Dict[int, Optional[int]] = {}
+    stored: Dict[int, Optional[int]] = {}
+    for schedule_id, start_time, end_time, occupancy_mask in schedules.all():
+        masks[schedule_id] = initial_occupancy(start_time, end_time)
+        stored[schedule_id] = occupancy_mask
+
+    def add(schedule_id: int, start: time, end: time) -> None:
+        if masks.get(schedule_id) is None:
+            return
+        bits = interval_mask(start, end)
+        masks[schedule_id] = None if bits is None else masks[schedule_id] | bits #type:ignore
+
+    for schedule_id, break_start, break_end in breaks.all():
+        add(schedule_id, break_start, break_end)
+    for schedule_id, start_datetime, end_datetime in appointments.all():
+        add(schedule_id, start_datetime.time(), end_datetime.time())
+    return masks, stored
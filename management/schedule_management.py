@@ -1,12 +1,112 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import insert, select, update, or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError, IntegrityError
+from typing import List, Optional, Dict, Tuple, Iterator
+from itertools import islice
+from enum import Enum
+import heapq
 from datetime import datetime, date, time, timedelta
 from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
 from models.masters import Master
+from models.base import master_service_category
 from models.services import Service
 from models.clients import Client
+from management.slot_engine import find_free_slots, free_start_cells, time_cell, SLOT_STEP_MINUTES
+from management.caches import catalog_cache, capability_index, report_cache
+from management.statistics_management import record_status_change, record_status_changes
+from management.client_management import PurchaseService
+from management.occupancy import initial_occupancy, mark_busy, mark_free, record_occupancy_change, verify_occupancy
+from management.validation import check_break, check_booking, check_client_cancel, check_admin_cancel
 from exceptions import ScheduleError
 
+# сколько раз повторять запись, если блокировку расписания не удалось получить
+BOOKING_ATTEMPTS = 3
+
+# статус, в который закрытие дня переводит прошедшие запланированные записи
+CLOSE_DAY_DEFAULT_STATUS = AppointmentStatus.COMPLETED
+
+
+# какие связи записи загружать вместе со списком записей
+class AppointmentLoadProfile(Enum):
+    LAZY = "lazy"      # только записи, связи подгружаются при обращении
+    LIST = "list"      # мастер, клиент и услуга (для списков записей)
+    DETAIL = "detail"  # плюс карта клиента, категория услуги и день расписания с перерывами
+
+
+def with_load_profile(query, profile: AppointmentLoadProfile):
+    """
+    Добавляет к запросу записей загрузку связей по профилю
+
+    Связи многие-к-одному подтягиваются JOIN-ом в том же запросе, перерывы дня -
+    одним дополнительным SELECT ... IN, так что число запросов не зависит от числа записей.
+
+    Args:
+        query: Запрос по Appointment
+        profile: Профиль загрузки
+
+    Returns:
+        Запрос с опциями загрузки
+    """
+    if profile == AppointmentLoadProfile.LAZY:
+        return query
+
+    query = query.options(joinedload(Appointment.master), joinedload(Appointment.client), joinedload(Appointment.service))
+    if profile == AppointmentLoadProfile.DETAIL:
+        query = query.options(joinedload(Appointment.client).joinedload(Client.salon_card),
+                              joinedload(Appointment.service).joinedload(Service.category),
+                              joinedload(Appointment.schedule_day).selectinload(MasterSchedule.breaks))
+    return query
+
+def schedule_slots(schedule: MasterSchedule, breaks: List[Tuple[time, time]], appointments: List[Tuple[datetime, datetime]],
+                   service_duration: int) -> List[datetime]:
+    """
+    Считает свободные слоты одного рабочего дня по уже загруженным перерывам и записям
+    
+    Args:
+        schedule: Расписание мастера на день
+        breaks: Перерывы (начало, конец)
+        appointments: Запланированные записи (начало, конец)
+        service_duration: Длительность услуги в минутах
+        
+    Returns:
+        List[datetime]: Список доступных времен начала
+    """
+    if schedule.is_day_off: #type:ignore
+        return []
+    
+    busy = [(datetime.combine(schedule.work_date, break_start), datetime.combine(schedule.work_date, break_end)) #type:ignore
+            for break_start, break_end in breaks]
+    busy.extend(appointments)
+    
+    day_start = datetime.combine(schedule.work_date, schedule.start_time)#type:ignore
+    day_end = datetime.combine(schedule.work_date, schedule.end_time)#type:ignore
+    return find_free_slots(day_start, day_end, busy, service_duration)
+
+def occupancy_slots(schedule: MasterSchedule, service_duration: int) -> Optional[List[datetime]]:
+    """
+    Считает свободные слоты дня по маске занятости, без запросов к записям и перерывам
+    
+    Args:
+        schedule: Расписание мастера на день
+        service_duration: Длительность услуги в минутах
+        
+    Returns:
+        Optional[List[datetime]]: Список доступных времен начала или None, если маска
+            не ведется или длительность не кратна ячейке (тогда нужен schedule_slots)
+    """
+    if schedule.is_day_off: #type:ignore
+        return []
+    if schedule.occupancy_mask is None or service_duration % SLOT_STEP_MINUTES:
+        return None
+    first_cell, last_cell = time_cell(schedule.start_time), time_cell(schedule.end_time) #type:ignore
+    if first_cell is None or last_cell is None:
+        return None
+    
+    day = datetime.combine(schedule.work_date, time(0, 0)) #type:ignore
+    return [day + timedelta(minutes=cell * SLOT_STEP_MINUTES)
+            for cell in free_start_cells(schedule.occupancy_mask, first_cell, last_cell, service_duration // SLOT_STEP_MINUTES)] #type:ignore
+
 # для управления расписанием в бд
 class ScheduleService:
     def __init__(self, session: Session):
@@ -35,7 +135,8 @@ class ScheduleService:
         if existing:
             raise ScheduleError(f"Расписание на {work_date} уже добавлено")
         
-        schedule = MasterSchedule(master_id=master_id, work_date=work_date, start_time=start_time, end_time=end_time, is_day_off=False)
+        schedule = MasterSchedule(master_id=master_id, work_date=work_date, start_time=start_time, end_time=end_time, is_day_off=False,
+                                  occupancy_mask=initial_occupancy(start_time, end_time))
             
         self.session.add(schedule)
         self.session.commit()
@@ -58,14 +159,11 @@ class ScheduleService:
         if not schedule:
             raise ScheduleError(f"Расписание с ID {schedule_id} не найдено")
         
-        if schedule.is_day_off: #type:ignore
-            raise ScheduleError("Нельзя добавить перерыв в выходной день")
-        
-        if break_start < schedule.start_time or break_end > schedule.end_time: #type:ignore
-            raise ScheduleError("Перерыв должен быть в пределах рабочего времени")
+        check_break(schedule, break_start, break_end)
         
         master_break = MasterBreak(schedule_id=schedule_id, break_start=break_start, break_end=break_end, reason=reason)
         self.session.add(master_break)
+        mark_busy(self.session, schedule_id, break_start, break_end)
         self.session.commit()
         return master_break
 
@@ -114,48 +212,136 @@ class ScheduleService:
         if not schedule or schedule.is_day_off:#type:ignore
             return []
         
-        breaks = schedule.breaks
+        slots = occupancy_slots(schedule, service_duration)
+        if slots is not None:
+            return slots
         
-        appointments = self.session.query(Appointment).filter(Appointment.schedule_id == schedule_id, Appointment.status == AppointmentStatus.SCHEDULED
-                                                              ).order_by(Appointment.start_datetime).all()
+        breaks = [(master_break.break_start, master_break.break_end) for master_break in schedule.breaks]
         
-        available_slots = []
-        slot_duration = timedelta(minutes=service_duration)
+        appointments = self.session.query(Appointment.start_datetime, Appointment.end_datetime).filter(
+            Appointment.schedule_id == schedule_id, Appointment.status == AppointmentStatus.SCHEDULED).all() #type:ignore
         
-        current_time = datetime.combine(schedule.work_date, schedule.start_time)#type:ignore
-        end_time = datetime.combine(schedule.work_date, schedule.end_time)#type:ignore
-        step = timedelta(minutes=30) 
+        return schedule_slots(schedule, breaks, [(start, end) for start, end in appointments], service_duration) #type:ignore
+    
+    def get_day_availability(self, work_date: date, service_duration: int,
+                             category_id: Optional[int] = None) -> Dict[int, Tuple[MasterSchedule, List[datetime]]]:
+        """
+        Считает свободные слоты всех мастеров на дату за фиксированное число запросов
         
-        while current_time + slot_duration <= end_time:#type:ignore
-            slot_end = current_time + slot_duration
+        Расписания (вместе с мастерами), перерывы и запланированные записи загружаются
+        тремя запросами, а слоты для каждого мастера считаются в памяти.
+        
+        Args:
+            work_date: Дата записи
+            service_duration: Длительность услуги в минутах
+            category_id: Только мастера, умеющие услуги этой категории. None = все мастера
             
-            in_break = False
-            for master_break in breaks:
-                break_start = datetime.combine(schedule.work_date, master_break.break_start)#type:ignore
-                break_end = datetime.combine(schedule.work_date, master_break.break_end)#type:ignore
-                
-                if current_time < break_end and slot_end > break_start:#type:ignore
-                    in_break = True
-                    current_time = break_end
-                    break
+        Returns:
+            Dict[int, Tuple[MasterSchedule, List[datetime]]]: ID мастера -> (расписание, слоты),
+                только мастера, у которых есть хотя бы один свободный слот
+        """
+        query = self.session.query(MasterSchedule).options(joinedload(MasterSchedule.master)).filter(
+            MasterSchedule.work_date == work_date, MasterSchedule.is_day_off == False) #type:ignore
+        
+        if category_id is not None:
+            query = query.join(master_service_category, master_service_category.c.master_id == MasterSchedule.master_id).filter(
+                master_service_category.c.category_id == category_id)
+        
+        schedules = query.order_by(MasterSchedule.master_id).all()
+        slots_by_schedule = self.get_slots_for_schedules(schedules, service_duration)
+        
+        availability = {}
+        for schedule in schedules:
+            slots = slots_by_schedule[schedule.schedule_id] #type:ignore
+            if slots:
+                availability[schedule.master_id] = (schedule, slots)
+        return availability #type:ignore
+    
+    def get_slots_for_schedules(self, schedules: List[MasterSchedule], service_duration: int) -> Dict[int, List[datetime]]:
+        """
+        Считает свободные слоты для набора расписаний
+        
+        Дни с маской занятости считаются без запросов, для остальных перерывы и записи
+        загружаются двумя запросами.
+        
+        Args:
+            schedules: Уже загруженные расписания
+            service_duration: Длительность услуги в минутах
             
-            if not in_break:
-                slot_available = True
-                for appointment in appointments:
-                    if current_time < appointment.end_datetime and slot_end > appointment.start_datetime:#type:ignore
-                        slot_available = False
-                        current_time = appointment.end_datetime#type:ignore
-                        break
-                
-                if slot_available:
-                    available_slots.append(current_time)
-                    current_time += step
-                else:
-                    continue
+        Returns:
+            Dict[int, List[datetime]]: ID расписания -> список доступных времен начала
+        """
+        slots_by_schedule: Dict[int, List[datetime]] = {}
+        unmasked = []
+        for schedule in schedules:
+            slots = occupancy_slots(schedule, service_duration)
+            if slots is None:
+                unmasked.append(schedule)
             else:
-                continue
+                slots_by_schedule[schedule.schedule_id] = slots #type:ignore
+        if not unmasked:
+            return slots_by_schedule
+        
+        schedules = unmasked
+        schedule_ids = [schedule.schedule_id for schedule in schedules]
+        breaks: Dict[int, List[Tuple[time, time]]] = {schedule_id: [] for schedule_id in schedule_ids} #type:ignore
+        appointments: Dict[int, List[Tuple[datetime, datetime]]] = {schedule_id: [] for schedule_id in schedule_ids} #type:ignore
+        
+        break_rows = self.session.query(MasterBreak.schedule_id, MasterBreak.break_start, MasterBreak.break_end).filter(
+            MasterBreak.schedule_id.in_(schedule_ids)).all() #type:ignore
+        for break_row in break_rows:
+            breaks[break_row.schedule_id].append((break_row.break_start, break_row.break_end))
+        
+        appointment_rows = self.session.query(Appointment.schedule_id, Appointment.start_datetime, Appointment.end_datetime).filter(
+            Appointment.schedule_id.in_(schedule_ids), Appointment.status == AppointmentStatus.SCHEDULED).all() #type:ignore
+        for appointment_row in appointment_rows:
+            appointments[appointment_row.schedule_id].append((appointment_row.start_datetime, appointment_row.end_datetime))
+        
+        for schedule in schedules:
+            slots_by_schedule[schedule.schedule_id] = schedule_slots(schedule, breaks[schedule.schedule_id], #type:ignore
+                                                                     appointments[schedule.schedule_id], service_duration) #type:ignore
+        return slots_by_schedule
+    
+    def get_availability_grid(self, start_date: date, end_date: date, category_id: Optional[int] = None):
+        """
+        Загружает свободное время всех мастеров за период в сетку NumPy (мастер x день x получас)
+        
+        Расписания загружаются одним запросом; перерывы и записи читаются (двумя запросами)
+        только для дней без маски занятости. Нужен numpy: модуль сетки импортируется здесь,
+        чтобы остальные сервисы работали и без него.
         
-        return available_slots
+        Args:
+            start_date: Начальная дата
+            end_date: Конечная дата
+            category_id: Только мастера, умеющие услуги этой категории. None = все мастера
+            
+        Returns:
+            AvailabilityGrid: Сетка свободного времени
+        """
+        from management.availability_grid import build_availability_grid, busy_cells_mask
+        
+        if start_date > end_date:
+            raise ScheduleError("Начальная дата должна быть раньше конечной")
+        
+        query = self.session.query(MasterSchedule).options(joinedload(MasterSchedule.master)).filter(
+            MasterSchedule.work_date >= start_date, MasterSchedule.work_date <= end_date, MasterSchedule.is_day_off == False) #type:ignore
+        if category_id is not None:
+            query = query.join(master_service_category, master_service_category.c.master_id == MasterSchedule.master_id).filter(
+                master_service_category.c.category_id == category_id)
+        schedules = query.order_by(MasterSchedule.master_id, MasterSchedule.work_date).all()
+        
+        unmasked = [schedule.schedule_id for schedule in schedules if schedule.occupancy_mask is None]
+        busy: Dict[int, List[Tuple[time, time]]] = {schedule_id: [] for schedule_id in unmasked} #type:ignore
+        if unmasked:
+            for schedule_id, break_start, break_end in self.session.query(MasterBreak.schedule_id, MasterBreak.break_start, #type:ignore
+                                                                          MasterBreak.break_end).filter(MasterBreak.schedule_id.in_(unmasked)).all():
+                busy[schedule_id].append((break_start, break_end))
+            for schedule_id, start_datetime, end_datetime in self.session.query(Appointment.schedule_id, Appointment.start_datetime, #type:ignore
+                    Appointment.end_datetime).filter(Appointment.schedule_id.in_(unmasked), Appointment.status == AppointmentStatus.SCHEDULED).all(): #type:ignore
+                busy[schedule_id].append((start_datetime.time(), end_datetime.time()))
+        
+        return build_availability_grid(start_date, end_date, schedules, {schedule_id: busy_cells_mask(intervals) #type:ignore
+                                                                         for schedule_id, intervals in busy.items()})
     
     def remove_break(self, break_id: int) -> bool:
         """
@@ -171,7 +357,10 @@ class ScheduleService:
         if not master_break:
             return False
         
+        schedule_id, break_start, break_end = master_break.schedule_id, master_break.break_start, master_break.break_end
         self.session.delete(master_break)
+        self.session.flush()
+        mark_free(self.session, schedule_id, break_start, break_end) #type:ignore
         self.session.commit()
         return True
     
@@ -179,6 +368,22 @@ class ScheduleService:
         """Получает перерыв по ID"""
         return self.session.query(MasterBreak).filter_by(break_id=break_id).first()
     
+    def check_occupancy(self, rebuild: bool = False) -> List[int]:
+        """
+        Сверяет маски занятости всех дней с перерывами и запланированными записями
+        
+        Args:
+            rebuild: Исправить расходящиеся маски (например, после добавления столбца
+                occupancy_mask в старую базу или правки строк в обход сервисов)
+            
+        Returns:
+            List[int]: ID расписаний, маски которых расходились
+        """
+        mismatched = verify_occupancy(self.session, rebuild=rebuild)
+        if rebuild:
+            self.session.commit()
+        return mismatched
+    
     def bulk_add_schedule(self, master_id: int, start_date: date, end_date: date, start_time: time, end_time: time, 
                          weekdays: Optional[List[int]] = None) -> List[MasterSchedule]:
         """
@@ -195,9 +400,38 @@ class ScheduleService:
         Returns:
             List[MasterSchedule]: Список созданных расписаний
         """
-        master = self.session.query(Master).filter_by(master_id=master_id).first()
-        if not master:
-            raise ScheduleError(f"Мастер с ID {master_id} не найден")
+        schedule_ids = self.bulk_add_schedules([master_id], start_date, end_date, start_time, end_time, weekdays)
+        if not schedule_ids:
+            return []
+        return self.session.query(MasterSchedule).filter(MasterSchedule.schedule_id.in_(schedule_ids)).order_by(MasterSchedule.work_date).all()
+    
+    def bulk_add_schedules(self, master_ids: List[int], start_date: date, end_date: date, start_time: time, end_time: time,
+                           weekdays: Optional[List[int]] = None) -> List[int]:
+        """
+        Массовое добавление расписания на период сразу для нескольких мастеров
+        
+        Уже существующие дни загружаются одним запросом, недостающие вставляются одной
+        пакетной вставкой (на PostgreSQL и SQLite - с ON CONFLICT DO NOTHING, чтобы
+        параллельное добавление того же дня не ломало всю пачку).
+        
+        Args:
+            master_ids: ID мастеров
+            start_date: Начальная дата
+            end_date: Конечная дата
+            start_time: Время начала работы
+            end_time: Время окончания работы
+            weekdays: Список дней недели (0-пн, 1-вт, ... 6-вс). None = все дни
+            
+        Returns:
+            List[int]: ID созданных расписаний
+        """
+        master_ids = list(dict.fromkeys(master_ids))
+        found_ids = {master_id for (master_id,) in self.session.query(Master.master_id).filter(Master.master_id.in_(master_ids)).all()} #type:ignore
+        missing = [master_id for master_id in master_ids if master_id not in found_ids]
+        if len(missing) == 1:
+            raise ScheduleError(f"Мастер с ID {missing[0]} не найден")
+        if missing:
+            raise ScheduleError(f"Мастера с ID {missing} не найдены")
         
         if start_date > end_date:
             raise ScheduleError("Начальная дата должна быть раньше конечной")
@@ -205,22 +439,36 @@ class ScheduleService:
         if start_time >= end_time:
             raise ScheduleError("Время начала должно быть раньше времени окончания")
         
-        created_schedules = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            if weekdays is None or current_date.weekday() in weekdays:
-                existing = self.session.query(MasterSchedule).filter_by(master_id=master_id, work_date=current_date).first()
-                if not existing:
-                    schedule = MasterSchedule(master_id=master_id, work_date=current_date, start_time=start_time, end_time=end_time, is_day_off=False)
-                    
-                    self.session.add(schedule)
-                    created_schedules.append(schedule)
-            
-            current_date += timedelta(days=1)
+        work_dates = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        if weekdays is not None:
+            work_dates = [work_date for work_date in work_dates if work_date.weekday() in weekdays]
         
-        self.session.commit()
-        return created_schedules
+        existing = set(self.session.query(MasterSchedule.master_id, MasterSchedule.work_date).filter(
+            MasterSchedule.master_id.in_(master_ids), MasterSchedule.work_date >= start_date, MasterSchedule.work_date <= end_date).all()) #type:ignore
+        
+        occupancy_mask = initial_occupancy(start_time, end_time)
+        rows = [{"master_id": master_id, "work_date": work_date, "start_time": start_time, "end_time": end_time, "is_day_off": False,
+                 "occupancy_mask": occupancy_mask}
+                for master_id in master_ids for work_date in work_dates if (master_id, work_date) not in existing]
+        if not rows:
+            return []
+        
+        try:
+            schedule_ids = list(self.session.execute(self._schedule_insert().returning(MasterSchedule.schedule_id), rows).scalars())
+            self.session.commit()
+        except IntegrityError as e:
+            self.session.rollback()
+            raise ScheduleError(f"Ошибка при добавлении расписания: {e}")
+        return schedule_ids
+    
+    def _schedule_insert(self):
+        """INSERT в master_schedule, пропускающий уже существующие дни мастера, если база это умеет"""
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(MasterSchedule).on_conflict_do_nothing(index_elements=["master_id", "work_date"])
+        if dialect == "sqlite":
+            return sqlite.insert(MasterSchedule).on_conflict_do_nothing(index_elements=["master_id", "work_date"])
+        return insert(MasterSchedule)
 
 # для управления записями в бд
 class AppointmentService:
@@ -231,6 +479,11 @@ class AppointmentService:
         """
         Создает новую запись
         
+        Строка расписания блокируется (SELECT ... FOR UPDATE), поэтому одновременные записи
+        к одному мастеру на один день выполняются по очереди, а к разным - параллельно.
+        После вставки пересечения проверяются еще раз: это защищает базы без построчных
+        блокировок (SQLite). Если блокировку не удалось получить, попытка повторяется.
+        
         Args:
             client_id: ID клиента
             service_id: ID услуги
@@ -240,17 +493,36 @@ class AppointmentService:
             
         Returns:
             Appointment: Созданная запись
+            
+        Raises:
+            ScheduleError: Если слот недоступен или запись не удалось создать за BOOKING_ATTEMPTS попыток
         """
-
+        for attempt in range(1, BOOKING_ATTEMPTS + 1):
+            try:
+                appointment = self._book_appointment(client_id, service_id, schedule_id, start_datetime, notes)
+                self.session.commit()
+                report_cache(self.session).invalidate_day(start_datetime.date())
+                return appointment
+            except ScheduleError:
+                self.session.rollback()
+                raise
+            except OperationalError:
+                self.session.rollback()
+                if attempt == BOOKING_ATTEMPTS:
+                    raise ScheduleError("Не удалось создать запись из-за одновременной записи, попробуйте еще раз")
+        raise ScheduleError("Не удалось создать запись")
+    
+    def _book_appointment(self, client_id: int, service_id: int, schedule_id: int, start_datetime: datetime, notes: str) -> Appointment:
+        """Проверяет слот и добавляет запись в текущую транзакцию (без commit)"""
         client = self.session.query(Client).filter_by(client_id=client_id).first()
         if not client:
             raise ScheduleError(f"Клиент с ID {client_id} не найден")
         
-        service = self.session.query(Service).filter_by(service_id=service_id).first()
+        service = catalog_cache(self.session).get_service(self.session, service_id)
         if not service:
             raise ScheduleError(f"Услуга с ID {service_id} не найдена")
         
-        schedule = self.session.query(MasterSchedule).filter_by(schedule_id=schedule_id).first()
+        schedule = self.session.query(MasterSchedule).filter_by(schedule_id=schedule_id).with_for_update().first()
         if not schedule:
             raise ScheduleError(f"Расписание с ID {schedule_id} не найдено")
         
@@ -259,41 +531,37 @@ class AppointmentService:
         master = self.session.query(Master).filter_by(master_id=master_id).first()
         if not master:
             raise ScheduleError(f"Мастер с ID {master_id} не найден (в расписании {schedule_id})")
-        if not any(cat.category_id == service.category_id for cat in master.service_categories):
+        if not capability_index(self.session).can_perform(self.session, master_id, service.category_id): #type:ignore
             raise ScheduleError(f"Мастер {master.full_name} не может выполнять услугу '{service.service_name}'")
 
         
-        if schedule.is_day_off:#type:ignore
-            raise ScheduleError("Нельзя записаться на выходной день")
-        
-        end_datetime = start_datetime + timedelta(minutes=service.duration_minutes)#type:ignore
-        
-        work_start = datetime.combine(schedule.work_date, schedule.start_time)#type:ignore
-        work_end = datetime.combine(schedule.work_date, schedule.end_time)#type:ignore
-        
-        if start_datetime < work_start or end_datetime > work_end:
-            raise ScheduleError("Запись должна быть в пределах рабочего времени")
+        end_datetime = check_booking(schedule, [(b.break_start, b.break_end) for b in schedule.breaks], service, start_datetime) #type:ignore
         
-        for master_break in schedule.breaks:
-            break_start = datetime.combine(schedule.work_date, master_break.break_start)#type:ignore
-            break_end = datetime.combine(schedule.work_date, master_break.break_end)#type:ignore
-            
-            if (start_datetime < break_end and end_datetime > break_start):
-                raise ScheduleError(f"Запись пересекается с перерывом ({master_break.break_start}-{master_break.break_end})")
-        
-        conflicting_appointments = self.session.query(Appointment).filter(Appointment.schedule_id == schedule_id, Appointment.start_datetime < end_datetime,
-            Appointment.end_datetime > start_datetime, Appointment.status == AppointmentStatus.SCHEDULED).all()
-        
-        if conflicting_appointments:
+        if self._count_overlapping(schedule_id, start_datetime, end_datetime) > 0:
             raise ScheduleError("Время уже занято другой записью")
         
         appointment = Appointment( master_id=master_id, client_id=client_id, service_id=service_id, schedule_id=schedule_id, start_datetime=start_datetime,
                                   end_datetime=end_datetime, status=AppointmentStatus.SCHEDULED, notes=notes)
             
         self.session.add(appointment)
-        self.session.commit()
+        self.session.flush()
+        
+        # повторная проверка уже под блокировкой записи в базу
+        if self._count_overlapping(schedule_id, start_datetime, end_datetime, exclude_id=appointment.appointment_id) > 0: #type:ignore
+            raise ScheduleError("Время уже занято другой записью")
+        
+        record_status_change(self.session, appointment, None, AppointmentStatus.SCHEDULED)
+        record_occupancy_change(self.session, appointment, None, AppointmentStatus.SCHEDULED)
         return appointment
     
+    def _count_overlapping(self, schedule_id: int, start_datetime: datetime, end_datetime: datetime, exclude_id: Optional[int] = None) -> int:
+        """Считает запланированные записи расписания, пересекающиеся с интервалом"""
+        query = self.session.query(Appointment).filter(Appointment.schedule_id == schedule_id, Appointment.start_datetime < end_datetime,
+            Appointment.end_datetime > start_datetime, Appointment.status == AppointmentStatus.SCHEDULED) #type:ignore
+        if exclude_id is not None:
+            query = query.filter(Appointment.appointment_id != exclude_id)
+        return query.count()
+    
     def update_appointment_status(self, appointment_id: int, new_status: AppointmentStatus) -> bool:
         """
         Обновляет статус записи
@@ -309,10 +577,73 @@ class AppointmentService:
         if not appointment:
             return False
         
+        record_status_change(self.session, appointment, appointment.status, new_status) #type:ignore
+        record_occupancy_change(self.session, appointment, appointment.status, new_status) #type:ignore
         appointment.status = new_status#type:ignore
+        day = appointment.start_datetime.date()
         self.session.commit()
+        report_cache(self.session).invalidate_day(day)
         return True
     
+    def close_day(self, until: Optional[datetime] = None, status: AppointmentStatus = CLOSE_DAY_DEFAULT_STATUS) -> Tuple[int, int]:
+        """
+        Закрывает все прошедшие запланированные записи одной транзакцией
+        
+        Записи SCHEDULED, закончившиеся не позже until, переводятся в status одним UPDATE.
+        Для выполненных записей покупки по картам клиентов проводятся одной пачкой
+        (PurchaseService.post_purchases), дневная сводка обновляется тоже пачкой.
+        Повторный запуск ничего не меняет: закрытые записи уже не SCHEDULED.
+        
+        Args:
+            until: Граница "прошедших" записей. None = текущее время
+            status: Итоговый статус - COMPLETED или NO_SHOW
+            
+        Returns:
+            Tuple[int, int]: (число закрытых записей, число проведенных покупок)
+        
+        Raises:
+            ScheduleError: Если статус не подходит для закрытия или у выполняемой записи не найдена услуга
+                (транзакция откатывается целиком)
+        """
+        if status not in (AppointmentStatus.COMPLETED, AppointmentStatus.NO_SHOW):
+            raise ScheduleError(f"Закрыть день можно только статусом COMPLETED или NO_SHOW, а не {status.value}")
+        until = until or datetime.now()
+        
+        # цена услуги читается в том же запросе, что и закрытые записи, - как в record_status_changes, из бд
+        price = select(Service.price).where(Service.service_id == Appointment.service_id).scalar_subquery().label("price")
+        columns = (Appointment.appointment_id, Appointment.client_id, Appointment.master_id, Appointment.service_id,
+                   Appointment.schedule_id, Appointment.start_datetime, Appointment.end_datetime, price)
+        past = and_(Appointment.status == AppointmentStatus.SCHEDULED, Appointment.end_datetime <= until) #type:ignore
+        try:
+            if self.session.get_bind().dialect.update_returning:
+                closed = self.session.execute(update(Appointment).where(past).values(status=status).returning(*columns)).all() #type:ignore
+            else:
+                closed = self.session.execute(select(*columns).where(past).with_for_update()).all()
+                self.session.execute(update(Appointment).where(
+                    Appointment.appointment_id.in_([row.appointment_id for row in closed])).values(status=status))
+            if status == AppointmentStatus.COMPLETED:
+                missing = [row.appointment_id for row in closed if row.price is None]
+                if missing:
+                    raise ScheduleError(f"Не найдены услуги записей {missing[:20]}, покупки провести нельзя")
+            
+            # сводка считается по уровню карты до проведения покупок, как при ручной смене статуса
+            record_status_changes(self.session, closed, AppointmentStatus.SCHEDULED, status)
+            # освободившиеся ячейки: маски затронутых дней пересчитываются пачкой
+            verify_occupancy(self.session, sorted({row.schedule_id for row in closed}), rebuild=True)
+            
+            purchases = [(row.client_id, float(row.price)) for row in closed] if status == AppointmentStatus.COMPLETED else []
+            posted = PurchaseService(self.session).post_purchases(purchases, commit=False)
+            
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        
+        self.session.expire_all()
+        for day in {row.start_datetime.date() for row in closed}:
+            report_cache(self.session).invalidate_day(day)
+        return len(closed), posted
+    
     # в классе AppointmentService добавляем метод:
 
     def add_note_to_appointment(self, appointment_id: int, note: str) -> bool:
@@ -350,14 +681,14 @@ class AppointmentService:
         if not appointment:
             raise ScheduleError(f"Запись с ID {appointment_id} не найдена")
         
-        if appointment.client_id != client_id:#type:ignore
-            raise ScheduleError("Вы можете отменять только свои записи")
-        
-        if appointment.status in [AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED, AppointmentStatus.NO_SHOW]:
-            raise ScheduleError(f"Запись уже имеет статус {appointment.status.value}")
+        check_client_cancel(appointment, client_id)
         
+        record_status_change(self.session, appointment, appointment.status, AppointmentStatus.CANCELLED) #type:ignore
+        record_occupancy_change(self.session, appointment, appointment.status, AppointmentStatus.CANCELLED) #type:ignore
         appointment.status = AppointmentStatus.CANCELLED#type:ignore
+        day = appointment.start_datetime.date()
         self.session.commit()
+        report_cache(self.session).invalidate_day(day)
         return True
     
     def admin_cancel_appointment(self, appointment_id: int) -> bool:
@@ -374,43 +705,50 @@ class AppointmentService:
         if not appointment:
             raise ScheduleError(f"Запись с ID {appointment_id} не найдена")
         
-        if appointment.status in [AppointmentStatus.CANCELLED]:
-            raise ScheduleError(f"Запись уже отменена")
+        check_admin_cancel(appointment)
         
+        record_status_change(self.session, appointment, appointment.status, AppointmentStatus.CANCELLED) #type:ignore
+        record_occupancy_change(self.session, appointment, appointment.status, AppointmentStatus.CANCELLED) #type:ignore
         appointment.status = AppointmentStatus.CANCELLED#type:ignore
+        day = appointment.start_datetime.date()
         self.session.commit()
+        report_cache(self.session).invalidate_day(day)
         return True
 
-    def get_client_appointments(self, client_id: int, status: Optional[AppointmentStatus] = None) -> List[Appointment]:
+    def get_client_appointments(self, client_id: int, status: Optional[AppointmentStatus] = None,
+                                profile: AppointmentLoadProfile = AppointmentLoadProfile.LIST) -> List[Appointment]:
         """
         Получает записи клиента
         
         Args:
             client_id: ID клиента
             status: Фильтр по статусу
+            profile: Какие связи загрузить вместе с записями
             
         Returns:
             List[Appointment]: Список записей клиента
         """
-        client_appointments = self.session.query(Appointment).filter_by(client_id=client_id)
+        client_appointments = with_load_profile(self.session.query(Appointment), profile).filter_by(client_id=client_id)
         
         if status:
             client_appointments = client_appointments.filter_by(status=status)
         
         return client_appointments.order_by(Appointment.start_datetime).all()
     
-    def get_master_appointments(self, master_id: int, target_date: Optional[date]) -> List[Appointment]:
+    def get_master_appointments(self, master_id: int, target_date: Optional[date],
+                                profile: AppointmentLoadProfile = AppointmentLoadProfile.LIST) -> List[Appointment]:
         """
         Получает записи мастера
         
         Args:
             master_id: ID мастера
             target_date: Фильтр по дате
+            profile: Какие связи загрузить вместе с записями
             
         Returns:
             List[Appointment]: Список записей мастера
         """
-        master_appointments = self.session.query(Appointment).filter_by(master_id=master_id)
+        master_appointments = with_load_profile(self.session.query(Appointment), profile).filter_by(master_id=master_id)
         
         if target_date:
             master_appointments = master_appointments.filter(
@@ -430,30 +768,92 @@ class AppointmentService:
         Returns:
             List[Master]: Список доступных мастеров
         """
-        service = self.session.query(Service).filter_by(service_id=service_id).first()
+        availability = self.get_service_availability(service_id, target_date)
+        return [schedule.master for schedule, _ in availability.values()]
+    
+    def get_service_availability(self, service_id: int, target_date: date) -> Dict[int, Tuple[MasterSchedule, List[datetime]]]:
+        """
+        Строит карту доступности мастеров для услуги на дату
+        
+        Args:
+            service_id: ID услуги
+            target_date: Дата записи
+            
+        Returns:
+            Dict[int, Tuple[MasterSchedule, List[datetime]]]: ID мастера -> (расписание, свободные слоты)
+        """
+        service = catalog_cache(self.session).get_service(self.session, service_id)
         if not service:
             raise ScheduleError(f"Услуга с ID {service_id} не найдена")
         
-        masters = self.session.query(Master).filter(Master.service_categories.any(category_id=service.category_id)).all()
-        available_masters = []
+        return ScheduleService(self.session).get_day_availability(work_date=target_date, service_duration=service.duration_minutes,#type:ignore
+                                                                  category_id=service.category_id)#type:ignore
+    
+    def find_next_available_slots(self, service_id: int, count: int = 5, horizon_days: int = 30,
+                                  start_from: Optional[datetime] = None) -> List[Tuple[Master, datetime, int]]:
+        """
+        Ищет ближайшие свободные времена для услуги у всех подходящих мастеров
+        
+        Слоты каждого мастера перебираются по дням в хронологическом порядке и сливаются
+        через очередь с приоритетом, поэтому поиск останавливается, как только найдено
+        count вариантов. Перерывы и записи загружаются пачкой на день и только для тех
+        дней, до которых дошел перебор.
         
-        for master in masters:
-            schedule = self.session.query(MasterSchedule).filter_by(master_id=master.master_id, work_date=target_date, is_day_off=False).first()
-            
-            if not schedule:
-                continue
-            
-            schedule_service = ScheduleService(self.session)
-            time_slots = schedule_service.get_available_time_slots(schedule_id=schedule.schedule_id, service_duration=service.duration_minutes)#type:ignore
+        Args:
+            service_id: ID услуги
+            count: Сколько вариантов вернуть
+            horizon_days: На сколько дней вперед искать
+            start_from: Не раньше этого момента. None = текущее время
             
-            if not time_slots:
-                continue       
-
-            available_masters.append(master)
-        return available_masters
+        Returns:
+            List[Tuple[Master, datetime, int]]: (мастер, время начала, ID расписания) по возрастанию времени
+        """
+        service = catalog_cache(self.session).get_service(self.session, service_id)
+        if not service:
+            raise ScheduleError(f"Услуга с ID {service_id} не найдена")
+        
+        if count <= 0 or horizon_days <= 0:
+            return []
+        
+        if start_from is None:
+            start_from = datetime.now()
+        first_date = start_from.date()
+        last_date = first_date + timedelta(days=horizon_days - 1)
+        
+        schedules = self.session.query(MasterSchedule).options(joinedload(MasterSchedule.master)).join(
+            master_service_category, master_service_category.c.master_id == MasterSchedule.master_id).filter(
+            master_service_category.c.category_id == service.category_id, MasterSchedule.is_day_off == False, #type:ignore
+            MasterSchedule.work_date >= first_date, MasterSchedule.work_date <= last_date #type:ignore
+            ).order_by(MasterSchedule.work_date, MasterSchedule.master_id).all()
+        
+        schedules_by_date: Dict[date, List[MasterSchedule]] = {}
+        schedules_by_master: Dict[int, List[MasterSchedule]] = {}
+        for schedule in schedules:
+            schedules_by_date.setdefault(schedule.work_date, []).append(schedule) #type:ignore
+            schedules_by_master.setdefault(schedule.master_id, []).append(schedule) #type:ignore
+        
+        schedule_service = ScheduleService(self.session)
+        day_slots: Dict[date, Dict[int, List[datetime]]] = {}
+        
+        def slots_of(schedule: MasterSchedule) -> List[datetime]:
+            # слоты считаются сразу для всех мастеров этого дня
+            if schedule.work_date not in day_slots:
+                day_slots[schedule.work_date] = schedule_service.get_slots_for_schedules( #type:ignore
+                    schedules_by_date[schedule.work_date], service.duration_minutes) #type:ignore
+            return day_slots[schedule.work_date][schedule.schedule_id] #type:ignore
+        
+        def master_slots(master_schedules: List[MasterSchedule]) -> Iterator[Tuple[datetime, int, MasterSchedule]]:
+            for schedule in master_schedules:
+                for slot in slots_of(schedule):
+                    if slot >= start_from: #type:ignore
+                        yield slot, schedule.master_id, schedule #type:ignore
+        
+        merged = heapq.merge(*(master_slots(master_schedules) for master_schedules in schedules_by_master.values()))
+        return [(schedule.master, slot, schedule.schedule_id) for slot, _, schedule in islice(merged, count)] #type:ignore
     
     def get_all_appointments(self, status: Optional[AppointmentStatus] = None, start_date: Optional[date] = None, 
-                             end_date: Optional[date] = None) -> List[Appointment]:
+                             end_date: Optional[date] = None,
+                             profile: AppointmentLoadProfile = AppointmentLoadProfile.LIST) -> List[Appointment]:
         """
         Получает все записи с фильтрами
         
@@ -461,11 +861,12 @@ class AppointmentService:
             status: Фильтр по статусу
             start_date: Начальная дата
             end_date: Конечная дата
+            profile: Какие связи загрузить вместе с записями
             
         Returns:
             List[Appointment]: Список записей
         """
-        query = self.session.query(Appointment)
+        query = with_load_profile(self.session.query(Appointment), profile)
         
         if status:
             query = query.filter_by(status=status)
@@ -479,4 +880,43 @@ class AppointmentService:
             query = query.filter(Appointment.start_datetime <= end_datetime)
         
         return query.order_by(Appointment.start_datetime).all()
+
+    def get_appointments_page(self, limit: int = 20, after: Optional[Tuple[datetime, int]] = None,
+                              status: Optional[AppointmentStatus] = None, start_date: Optional[date] = None,
+                              end_date: Optional[date] = None,
+                              profile: AppointmentLoadProfile = AppointmentLoadProfile.LIST) -> List[Appointment]:
+        """
+        Возвращает страницу записей по (start_datetime, appointment_id) с фильтрами
+
+        Страница продолжается с ключа последней записи предыдущей страницы, поэтому
+        запрос не пропускает OFFSET строк и не зависит от вставок в начало списка.
+
+        Args:
+            limit: Размер страницы
+            after: (start_datetime, appointment_id) последней записи предыдущей страницы. None = первая страница
+            status: Фильтр по статусу
+            start_date: Начальная дата
+            end_date: Конечная дата
+            profile: Какие связи загрузить вместе с записями
+
+        Returns:
+            List[Appointment]: Не более limit записей
+        """
+        query = with_load_profile(self.session.query(Appointment), profile)
+
+        if status:
+            query = query.filter_by(status=status)
+
+        if start_date:
+            query = query.filter(Appointment.start_datetime >= datetime.combine(start_date, time(0, 0))) #type:ignore
+
+        if end_date:
+            query = query.filter(Appointment.start_datetime < datetime.combine(end_date + timedelta(days=1), time(0, 0))) #type:ignore
+
+        if after is not None:
+            after_start, after_id = after
+            query = query.filter(or_(Appointment.start_datetime > after_start, #type:ignore
+                                     and_(Appointment.start_datetime == after_start, Appointment.appointment_id > after_id))) #type:ignore
+
+        return query.order_by(Appointment.start_datetime, Appointment.appointment_id).limit(limit).all()
     
\ No newline at end of file
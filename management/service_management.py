@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional, Any
 from models.services import Service, ServiceCategory
+from models.schedule import Appointment, AppointmentStatus
+from management.caches import catalog_cache, capability_index, report_cache
+from management.validation import check_service_duration, normalize_category_name
+from management.occupancy import verify_occupancy
+from management.statistics_management import record_appointments_deleted
 from exceptions import ServiceError
 
 # для управления услугами в бд
@@ -29,8 +34,7 @@ class ServiceService:
         if not category:
             raise ServiceError(f"Категория с ID {category_id} не найдена")
         
-        if duration_minutes % 30 != 0:
-            raise ServiceError(f"Длительность услуги должна быть кратной 30 минутам.")
+        check_service_duration(duration_minutes)
         
         try:
             new_service = Service(
@@ -42,6 +46,7 @@ class ServiceService:
             
             self.session.add(new_service)
             self.session.commit()
+            catalog_cache(self.session).invalidate()
             return new_service
             
         except Exception as e:
@@ -58,7 +63,7 @@ class ServiceService:
         Returns:
             Optional[Service]: Найденная услуга или None
         """
-        return self.session.query(Service).filter(Service.service_id == service_id).first()
+        return catalog_cache(self.session).get_service(self.session, service_id)
     
     def get_all_services(self) -> List[Service]:
         """
@@ -67,7 +72,23 @@ class ServiceService:
         Returns:
             List[Service]: Список всех услуг
         """
-        return self.session.query(Service).all()
+        return catalog_cache(self.session).get_all_services(self.session)
+
+    def get_services_page(self, limit: int = 20, after_id: Optional[int] = None) -> List[Service]:
+        """
+        Возвращает страницу услуг по возрастанию ID (keyset-пагинация)
+
+        Args:
+            limit: Размер страницы
+            after_id: ID последней услуги предыдущей страницы. None = первая страница
+
+        Returns:
+            List[Service]: Не более limit услуг с загруженными категориями
+        """
+        query = self.session.query(Service).options(joinedload(Service.category))
+        if after_id is not None:
+            query = query.filter(Service.service_id > after_id) #type:ignore
+        return query.order_by(Service.service_id).limit(limit).all()
     
     def get_services_by_category(self, category_id: int) -> List[Service]:
         """
@@ -79,7 +100,7 @@ class ServiceService:
         Returns:
             List[Service]: Список услуг с указанной категорией
         """
-        return self.session.query(Service).filter(Service.category_id == category_id).all()
+        return catalog_cache(self.session).get_services_by_category(self.session, category_id)
     
     def update_service(self, service_id: int, field: str, value: str) -> Optional[Service]:
         """
@@ -96,7 +117,7 @@ class ServiceService:
         Raises:
         ServiceError: Если услуга не найдена или ошибка обновления
         """
-        service = self.get_service_by_id(service_id)
+        service = self.session.query(Service).filter(Service.service_id == service_id).first()
         if not service:
             raise ServiceError(f"Услуга с ID {service_id} не найдена")
     
@@ -147,6 +168,7 @@ class ServiceService:
         try:
             setattr(service, field, n_value)
             self.session.commit()
+            catalog_cache(self.session).invalidate()
             return service
         except Exception as e:
             self.session.rollback()
@@ -165,11 +187,21 @@ class ServiceService:
         Raises:
             ServiceError: Если ошибка при удалении
         """
-        service = self.get_service_by_id(service_id)
+        service = self.session.query(Service).filter(Service.service_id == service_id).first()
         if service:
             try:
+                # запланированные записи удаляются вместе с услугой: их ячейки освобождаются в той же транзакции
+                scheduled = self.session.query(Appointment.schedule_id).filter(
+                    Appointment.service_id == service_id, Appointment.status == AppointmentStatus.SCHEDULED).distinct() #type:ignore
+                schedule_ids = [row.schedule_id for row in scheduled]
+                days = record_appointments_deleted(self.session, Appointment.service_id == service_id)
                 self.session.delete(service)
+                self.session.flush()
+                verify_occupancy(self.session, schedule_ids, rebuild=True)
                 self.session.commit()
+                catalog_cache(self.session).invalidate()
+                for day in days:
+                    report_cache(self.session).invalidate_day(day)
                 return True
             except Exception as e:
                 self.session.rollback()
@@ -194,14 +226,15 @@ class CategoryService:
         Raises:
             ServiceError: Если категория уже существует или ошибка создания
         """
-        existing_category = self.session.query(ServiceCategory).filter_by(category_name=category_name.lower().strip()).first()
+        existing_category = self.session.query(ServiceCategory).filter_by(category_name=normalize_category_name(category_name)).first()
         if existing_category:
             raise ServiceError(f"Категория '{category_name}' уже существует")
         
         try:
-            new_category = ServiceCategory(category_name=category_name.lower().strip())
+            new_category = ServiceCategory(category_name=normalize_category_name(category_name))
             self.session.add(new_category)
             self.session.commit()
+            catalog_cache(self.session).invalidate()
             return new_category
         except Exception as e:
             self.session.rollback()
@@ -217,7 +250,7 @@ class CategoryService:
         Returns:
             Optional[ServiceCategory]: Найденная категория или None
         """
-        return self.session.query(ServiceCategory).filter_by(category_id=category_id).first()
+        return catalog_cache(self.session).get_category(self.session, category_id)
     
     def get_all_categories(self) -> List[ServiceCategory]:
         """
@@ -226,7 +259,7 @@ class CategoryService:
         Returns:
             List[ServiceCategory]: Список всех категорий
         """
-        return self.session.query(ServiceCategory).all()
+        return catalog_cache(self.session).get_all_categories(self.session)
     
     def delete_category(self, category_id: int) -> bool:
         """
@@ -241,7 +274,7 @@ class CategoryService:
         Raises:
             ServiceError: Если в категории есть услуги или ошибка удаления
         """
-        category = self.get_category_by_id(category_id)
+        category = self.session.query(ServiceCategory).filter_by(category_id=category_id).first()
         if not category:
             return False
         
@@ -253,6 +286,8 @@ class CategoryService:
         try:
             self.session.delete(category)
             self.session.commit()
+            catalog_cache(self.session).invalidate()
+            capability_index(self.session).invalidate()
             return True
         except Exception as e:
             self.session.rollback()
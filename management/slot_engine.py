@@ -0,0 +1,176 @@
+from typing import List, Tuple, Iterable, Optional
+from datetime import datetime, time, timedelta
+
+# интервал занятости: (начало, конец)
+BusyInterval = Tuple[datetime, datetime]
+
+SLOT_STEP_MINUTES = 30
+
+
+def merge_busy_intervals(busy: Iterable[BusyInterval], service_duration: int) -> List[BusyInterval]:
+    """
+    Превращает перерывы и записи в отсортированный список запрещенных зон для начала слота
+
+    Слот [t, t + duration) пересекается с интервалом [start, end) тогда и только тогда,
+    когда t лежит в открытом интервале (start - duration, end). Такие зоны сортируются
+    и склеиваются один раз, после чего свободные времена ищутся одним проходом.
+
+    Args:
+        busy: Интервалы занятости (перерывы и записи)
+        service_duration: Длительность услуги в минутах
+
+    Returns:
+        List[BusyInterval]: Непересекающиеся открытые интервалы, отсортированные по началу
+    """
+    slot_duration = timedelta(minutes=service_duration)
+    zones = sorted((start - slot_duration, end) for start, end in busy if start - slot_duration < end)
+
+    merged: List[BusyInterval] = []
+    for zone_start, zone_end in zones:
+        # открытые интервалы, касающиеся концами, не склеиваются: точка касания свободна
+        if merged and zone_start < merged[-1][1]:
+            if zone_end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], zone_end)
+        else:
+            merged.append((zone_start, zone_end))
+    return merged
+
+
+def find_free_slots(day_start: datetime, day_end: datetime, busy: Iterable[BusyInterval], service_duration: int,
+                    step_minutes: int = SLOT_STEP_MINUTES) -> List[datetime]:
+    """
+    Находит все времена начала, в которые помещается услуга
+
+    Повторяет поведение пошагового перебора: после свободного слота время сдвигается на шаг,
+    а если слот занят, поиск продолжается с конца мешающего интервала.
+
+    Args:
+        day_start: Начало рабочего дня
+        day_end: Конец рабочего дня
+        busy: Интервалы занятости (перерывы и записи)
+        service_duration: Длительность услуги в минутах
+        step_minutes: Шаг между слотами в минутах
+
+    Returns:
+        List[datetime]: Список доступных времен начала
+    """
+    zones = merge_busy_intervals(busy, service_duration)
+    slot_duration = timedelta(minutes=service_duration)
+    step = timedelta(minutes=step_minutes)
+
+    available_slots = []
+    current_time = day_start
+    i = 0
+
+    while current_time + slot_duration <= day_end:
+        while i < len(zones) and zones[i][1] <= current_time:
+            i += 1
+
+        if i < len(zones) and zones[i][0] < current_time:
+            current_time = zones[i][1]
+            continue
+
+        available_slots.append(current_time)
+        current_time += step
+
+    return available_slots
+
+
+def naive_free_slots(day_start: datetime, day_end: datetime, breaks: List[BusyInterval], appointments: List[BusyInterval],
+                     service_duration: int, step_minutes: int = SLOT_STEP_MINUTES) -> List[datetime]:
+    """
+    Эталонный пошаговый перебор (прежняя реализация get_available_time_slots)
+
+    Используется в тестах и бенчмарках для сравнения с find_free_slots.
+    """
+    available_slots = []
+    slot_duration = timedelta(minutes=service_duration)
+    step = timedelta(minutes=step_minutes)
+    current_time = day_start
+
+    while current_time + slot_duration <= day_end:
+        slot_end = current_time + slot_duration
+
+        in_break = False
+        for break_start, break_end in breaks:
+            if current_time < break_end and slot_end > break_start:
+                in_break = True
+                current_time = break_end
+                break
+
+        if not in_break:
+            slot_available = True
+            for appointment_start, appointment_end in appointments:
+                if current_time < appointment_end and slot_end > appointment_start:
+                    slot_available = False
+                    current_time = appointment_end
+                    break
+
+            if slot_available:
+                available_slots.append(current_time)
+                current_time += step
+
+    return available_slots
+
+
+# ячейки занятости дня для MasterSchedule.occupancy_mask: бит i - интервал [i*30 мин, (i+1)*30 мин)
+CELLS_PER_DAY = 24 * 60 // SLOT_STEP_MINUTES
+FULL_DAY_MASK = (1 << CELLS_PER_DAY) - 1
+
+
+def time_cell(value: time) -> Optional[int]:
+    """Номер ячейки, с которой начинается время, или None, если время не на границе ячейки"""
+    minutes = value.hour * 60 + value.minute
+    if value.second or value.microsecond or minutes % SLOT_STEP_MINUTES:
+        return None
+    return minutes // SLOT_STEP_MINUTES
+
+
+def interval_mask(start: time, end: time) -> Optional[int]:
+    """
+    Маска ячеек интервала [start, end)
+
+    Args:
+        start: Начало интервала
+        end: Конец интервала
+
+    Returns:
+        Optional[int]: Маска или None, если границы не на границах ячеек (такой интервал маской не описать)
+    """
+    first_cell, last_cell = time_cell(start), time_cell(end)
+    if first_cell is None or last_cell is None:
+        return None
+    if last_cell <= first_cell:
+        return 0
+    return ((1 << (last_cell - first_cell)) - 1) << first_cell
+
+
+def free_start_cells(occupancy_mask: int, first_cell: int, last_cell: int, cells: int) -> List[int]:
+    """
+    Находит ячейки, с которых помещаются cells свободных ячеек подряд
+
+    Для выровненных по ячейкам перерывов и записей результат совпадает с find_free_slots:
+    бит s в fits установлен, только если свободны все ячейки s .. s + cells - 1.
+
+    Args:
+        occupancy_mask: Занятые ячейки дня
+        first_cell: Первая ячейка рабочего времени
+        last_cell: Ячейка окончания рабочего времени (не входит)
+        cells: Длительность услуги в ячейках
+
+    Returns:
+        List[int]: Номера начальных ячеек по возрастанию
+    """
+    if cells <= 0 or last_cell <= first_cell:
+        return []
+    free = ~occupancy_mask & ((1 << last_cell) - (1 << first_cell))
+    fits = free
+    for shift in range(1, cells):
+        fits &= free >> shift
+
+    starts = []
+    while fits:
+        lowest = fits & -fits
+        starts.append(lowest.bit_length() - 1)
+        fits ^= lowest
+    return starts
@@ -0,0 +1,417 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func, case, or_, and_, cast, insert, delete, Date, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import List, Dict, Optional, Iterable, Tuple, Any
+from datetime import datetime, date, time, timedelta
+from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
+from models.masters import Master
+from models.services import Service
+from models.clients import SalonCard, DiscountLevel
+from models.statistics import DailyStats
+from management.caches import report_cache
+from exceptions import ScheduleError
+
+# столбец сводки со счетчиком для каждого статуса записи
+STATUS_COUNT_COLUMNS = {
+    AppointmentStatus.SCHEDULED: "scheduled_count",
+    AppointmentStatus.COMPLETED: "completed_count",
+    AppointmentStatus.CANCELLED: "cancelled_count",
+    AppointmentStatus.NO_SHOW: "no_show_count",
+}
+
+# статусы, время которых считается занятым
+BOOKED_STATUSES = (AppointmentStatus.SCHEDULED, AppointmentStatus.COMPLETED)
+
+# сколько дней записей пересчитывать одним запросом при перестроении сводки
+REBUILD_CHUNK_DAYS = 31
+
+
+def record_status_change(session: Session, appointment: Appointment, old_status: Optional[AppointmentStatus],
+                         new_status: Optional[AppointmentStatus]) -> None:
+    """
+    Переносит запись в дневной сводке из старого статуса в новый (без commit)
+
+    Вызывается в той же транзакции, что и изменение записи: при создании old_status=None.
+    Строка сводки обновляется одним UPSERT с приращениями, поэтому одновременные
+    изменения разных записей одного дня не теряются.
+
+    Args:
+        session: Сессия текущей транзакции
+        appointment: Запись
+        old_status: Прежний статус (None - запись новая)
+        new_status: Новый статус (None - запись удаляется)
+    """
+    record_status_changes(session, [appointment], old_status, new_status)
+
+
+def record_status_changes(session: Session, appointments: Iterable[Any], old_status: Optional[AppointmentStatus],
+                          new_status: Optional[AppointmentStatus]) -> None:
+    """
+    Переносит несколько записей в дневной сводке из одного статуса в другой (без commit)
+
+    Приращения складываются по строкам сводки (день, мастер, услуга) и записываются
+    одним UPSERT на пачку. Цены услуг и карты клиентов для выручки читаются одним запросом.
+    При переходе в COMPLETED учтенная выручка сохраняется в записи (completed_price,
+    completed_discounted_price), и переход из COMPLETED вычитает именно ее, а не выручку
+    по текущей цене услуги и текущему уровню карты: после проведения покупки уровень
+    мог вырасти.
+
+    Args:
+        session: Сессия текущей транзакции
+        appointments: Записи или строки с полями appointment_id, client_id, master_id,
+            service_id, start_datetime, end_datetime
+        old_status: Прежний статус (None - записи новые)
+        new_status: Новый статус (None - записи удаляются)
+
+    Raises:
+        ScheduleError: Если для выполненной записи не найдена услуга
+    """
+    appointments = list(appointments)
+    if old_status == new_status or not appointments:
+        return
+
+    # цена услуги, уровень карты и сохраненная выручка - одним запросом по самим записям
+    with_revenue = AppointmentStatus.COMPLETED in (old_status, new_status)
+    revenues: Dict[int, Any] = {}
+    if with_revenue:
+        revenues = {row.appointment_id: row for row in session.execute(select( #type:ignore
+            Appointment.appointment_id, Service.price, SalonCard.discount_level,
+            Appointment.completed_price, Appointment.completed_discounted_price).join(
+            Service, Service.service_id == Appointment.service_id).outerjoin(
+            SalonCard, SalonCard.client_id == Appointment.client_id).where(
+            Appointment.appointment_id.in_([appointment.appointment_id for appointment in appointments])))}
+
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    completed: List[Dict[str, Any]] = []
+    for appointment in appointments:
+        minutes = int((appointment.end_datetime - appointment.start_datetime).total_seconds() // 60)
+        revenue: Dict[Optional[AppointmentStatus], Tuple[float, float]] = {}
+        if with_revenue:
+            found = revenues.get(appointment.appointment_id)
+            if found is None:
+                raise ScheduleError(f"Услуга записи {appointment.appointment_id} не найдена, выручку учесть нельзя")
+            price = float(found.price)
+            discounted_price = price * (1 - SalonCard.DISCOUNT_RATES.get(found.discount_level, 0.0)) #type:ignore
+            # выручка, учтенная при выполнении; для записей, выполненных до появления столбцов, - по текущим данным
+            revenue = {old_status: (price if found.completed_price is None else found.completed_price,
+                                    discounted_price if found.completed_discounted_price is None else found.completed_discounted_price),
+                       new_status: (price, discounted_price)}
+            if new_status == AppointmentStatus.COMPLETED:
+                completed.append({"appointment_id": appointment.appointment_id, "completed_price": price,
+                                  "completed_discounted_price": discounted_price})
+
+        key = (appointment.start_datetime.date(), appointment.master_id, appointment.service_id)
+        if key not in rows:
+            rows[key] = {"stat_date": key[0], "master_id": key[1], "service_id": key[2],
+                         **{column: 0 for column in STATUS_COUNT_COLUMNS.values()},
+                         "booked_minutes": 0, "gross_revenue": 0.0, "discounted_revenue": 0.0}
+        row = rows[key]
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status is None:
+                continue
+            row[STATUS_COUNT_COLUMNS[status]] += sign
+            if status in BOOKED_STATUSES:
+                row["booked_minutes"] += sign * minutes
+            if status == AppointmentStatus.COMPLETED:
+                row["gross_revenue"] += sign * revenue[status][0]
+                row["discounted_revenue"] += sign * revenue[status][1]
+
+    if completed:
+        session.execute(update(Appointment).execution_options(synchronize_session=False), completed)
+
+    key_columns = ["stat_date", "master_id", "service_id"]
+    delta_columns = [column for column in next(iter(rows.values())) if column not in key_columns]
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = dialect_insert(DailyStats)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: getattr(DailyStats, column) + statement.excluded[column] for column in delta_columns})
+        session.execute(statement, list(rows.values()))
+        return
+
+    for row in rows.values():
+        updated = session.execute(DailyStats.__table__.update().where(
+            *(getattr(DailyStats, column) == row[column] for column in key_columns)
+        ).values({column: getattr(DailyStats, column) + row[column] for column in delta_columns}))
+        if updated.rowcount == 0: #type:ignore
+            session.execute(insert(DailyStats).values(**row))
+
+
+def record_appointments_deleted(session: Session, *criteria: Any) -> List[date]:
+    """
+    Вычитает из дневной сводки записи, которые сейчас будут удалены (без commit)
+
+    Вызывается до удаления клиента, услуги или мастера вместе с их записями, в той же
+    транзакции: иначе сводка разойдется с пересчетом rebuild_daily_stats.
+    Кэшированные отчеты за затронутые дни вызывающий сбрасывает после commit.
+
+    Args:
+        session: Сессия текущей транзакции
+        criteria: Условия отбора удаляемых записей (например, Appointment.client_id == 5)
+
+    Returns:
+        List[date]: Дни удаляемых записей
+    """
+    deleted: List[Any] = session.execute(select(
+        Appointment.appointment_id, Appointment.client_id, Appointment.master_id, Appointment.service_id,
+        Appointment.start_datetime, Appointment.end_datetime, Appointment.status).where(*criteria)).all() #type:ignore
+    if not deleted:
+        return []
+    for status in STATUS_COUNT_COLUMNS:
+        record_status_changes(session, [row for row in deleted if row.status == status], status, None)
+
+    # строки сводки, в которых не осталось ни одной записи, пересчет не создает - удаляются и здесь
+    days = sorted({row.start_datetime.date() for row in deleted})
+    session.execute(delete(DailyStats).where(
+        DailyStats.stat_date.in_(days), DailyStats.master_id.in_({row.master_id for row in deleted}),
+        *(getattr(DailyStats, column) == 0 for column in STATUS_COUNT_COLUMNS.values())))
+    return days
+
+
+# показатели одного мастера за период
+class MasterStats:
+    def __init__(self, master_id: int, full_name: str, revenue: float, discounted_revenue: float, booked_minutes: int,
+                 work_minutes: int, completed: int, no_show: int, cancelled: int, revenue_rank: int, revenue_share: float):
+        self.master_id = master_id
+        self.full_name = full_name
+        self.revenue = revenue
+        self.discounted_revenue = discounted_revenue
+        self.booked_minutes = booked_minutes
+        self.work_minutes = work_minutes
+        self.completed = completed
+        self.no_show = no_show
+        self.cancelled = cancelled
+        self.revenue_rank = revenue_rank
+        self.revenue_share = revenue_share
+
+    @property
+    def utilisation(self) -> float:
+        # доля рабочего времени (без перерывов), занятая записями
+        if self.work_minutes <= 0:
+            return 0.0
+        return self.booked_minutes / self.work_minutes
+
+    def __repr__(self) -> str:
+        return f"MasterStats({self.full_name}, revenue={self.revenue}, utilisation={self.utilisation:.2f})"
+
+
+# сводный отчет салона за период
+class SalonReport:
+    def __init__(self, start_date: date, end_date: date, masters: List[MasterStats],
+                 tier_distribution: Optional[Dict[DiscountLevel, int]] = None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.masters = masters
+        self.tier_distribution: Dict[DiscountLevel, int] = tier_distribution or {}
+
+    @property
+    def revenue(self) -> float:
+        return sum(master.revenue for master in self.masters)
+
+    @property
+    def discounted_revenue(self) -> float:
+        return sum(master.discounted_revenue for master in self.masters)
+
+    @property
+    def booked_hours(self) -> float:
+        return sum(master.booked_minutes for master in self.masters) / 60
+
+    @property
+    def utilisation(self) -> float:
+        work_minutes = sum(master.work_minutes for master in self.masters)
+        if work_minutes <= 0:
+            return 0.0
+        return sum(master.booked_minutes for master in self.masters) / work_minutes
+
+    @property
+    def no_show_rate(self) -> float:
+        # доля неявок среди записей, время которых уже прошло (выполнены или неявка)
+        no_show = sum(master.no_show for master in self.masters)
+        finished = no_show + sum(master.completed for master in self.masters)
+        if finished == 0:
+            return 0.0
+        return no_show / finished
+
+
+# для расчета статистики салона агрегатными запросами
+class StatisticsService:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def get_salon_report(self, start_date: date, end_date: date) -> SalonReport:
+        """
+        Считает выручку, занятые часы, загрузку мастеров, долю неявок и распределение карт
+
+        Показатели записей читаются из дневной сводки daily_stats (не больше строки на мастера,
+        услугу и день), суммы считаются в бд GROUP BY и оконными функциями.
+        Показатели мастеров за закрытые периоды (конец раньше сегодняшнего дня и ни одной
+        записи SCHEDULED) кэшируются не дольше REPORT_TTL_SECONDS и общие для всех потоков,
+        поэтому каждый вызов собирает свой объект отчета; распределение карт по уровням -
+        текущее и всегда читается заново.
+
+        Args:
+            start_date: Первый день периода
+            end_date: Последний день периода (включительно)
+
+        Returns:
+            SalonReport: Отчет за период
+
+        Raises:
+            ScheduleError: Если начало периода позже конца
+        """
+        if start_date > end_date:
+            raise ScheduleError("Начало периода не может быть позже конца")
+
+        is_past = end_date < date.today()
+        masters = report_cache(self.session).get(start_date, end_date) if is_past else None
+        if masters is None:
+            masters = tuple(self.get_master_stats(start_date, end_date))
+            # прошедший период закрыт, только когда в нем не осталось незакрытых записей
+            if is_past and not self._has_scheduled(start_date, end_date):
+                report_cache(self.session).put(start_date, end_date, masters)
+
+        return SalonReport(start_date, end_date, list(masters), self.get_tier_distribution())
+
+    def _has_scheduled(self, start_date: date, end_date: date) -> bool:
+        """Есть ли в периоде записи SCHEDULED (по дневной сводке)"""
+        return self.session.execute(select(DailyStats.stat_date).where(
+            DailyStats.stat_date >= start_date, DailyStats.stat_date <= end_date, #type:ignore
+            DailyStats.scheduled_count > 0).limit(1)).first() is not None #type:ignore
+
+    def get_master_stats(self, start_date: date, end_date: date) -> List[MasterStats]:
+        """
+        Показатели мастеров за период одним запросом по сводке и расписанию
+
+        Args:
+            start_date: Первый день периода
+            end_date: Последний день периода (включительно)
+
+        Returns:
+            List[MasterStats]: Мастера с записями или рабочими днями в периоде, по убыванию выручки
+        """
+        appointments = select(
+            DailyStats.master_id,
+            func.sum(DailyStats.gross_revenue).label("revenue"),
+            func.sum(DailyStats.discounted_revenue).label("discounted_revenue"),
+            func.sum(DailyStats.booked_minutes).label("booked_minutes"),
+            func.sum(DailyStats.completed_count).label("completed"),
+            func.sum(DailyStats.no_show_count).label("no_show"),
+            func.sum(DailyStats.cancelled_count).label("cancelled"),
+        ).where(DailyStats.stat_date >= start_date, DailyStats.stat_date <= end_date #type:ignore
+        ).group_by(DailyStats.master_id).subquery()
+
+        work_days = and_(MasterSchedule.work_date >= start_date, MasterSchedule.work_date <= end_date, #type:ignore
+                         MasterSchedule.is_day_off == False) #type:ignore
+        work = select(
+            MasterSchedule.master_id,
+            func.sum(self._minutes_between(MasterSchedule.start_time, MasterSchedule.end_time)).label("work_minutes"),
+        ).where(work_days).group_by(MasterSchedule.master_id).subquery()
+
+        breaks = select(
+            MasterSchedule.master_id,
+            func.sum(self._minutes_between(MasterBreak.break_start, MasterBreak.break_end)).label("break_minutes"),
+        ).join(MasterBreak, MasterBreak.schedule_id == MasterSchedule.schedule_id).where(work_days).group_by(
+            MasterSchedule.master_id).subquery()
+
+        revenue = func.coalesce(appointments.c.revenue, 0)
+        query = select(
+            Master.master_id, Master.first_name, Master.last_name,
+            revenue.label("revenue"),
+            func.coalesce(appointments.c.discounted_revenue, 0).label("discounted_revenue"),
+            func.coalesce(appointments.c.booked_minutes, 0).label("booked_minutes"),
+            (func.coalesce(work.c.work_minutes, 0) - func.coalesce(breaks.c.break_minutes, 0)).label("work_minutes"),
+            func.coalesce(appointments.c.completed, 0).label("completed"),
+            func.coalesce(appointments.c.no_show, 0).label("no_show"),
+            func.coalesce(appointments.c.cancelled, 0).label("cancelled"),
+            func.rank().over(order_by=revenue.desc()).label("revenue_rank"),
+            func.sum(revenue).over().label("total_revenue"),
+        ).outerjoin(appointments, appointments.c.master_id == Master.master_id).outerjoin(
+            work, work.c.master_id == Master.master_id).outerjoin(
+            breaks, breaks.c.master_id == Master.master_id).where(
+            or_(appointments.c.master_id.isnot(None), work.c.master_id.isnot(None))
+        ).order_by(revenue.desc(), Master.master_id)
+
+        stats = []
+        for row in self.session.execute(query):
+            total_revenue = float(row.total_revenue or 0)
+            stats.append(MasterStats(
+                master_id=row.master_id, full_name=f"{row.first_name} {row.last_name}",
+                revenue=float(row.revenue), discounted_revenue=float(row.discounted_revenue), booked_minutes=int(round(row.booked_minutes)),
+                work_minutes=int(round(row.work_minutes)), completed=int(row.completed), no_show=int(row.no_show),
+                cancelled=int(row.cancelled), revenue_rank=int(row.revenue_rank),
+                revenue_share=float(row.revenue) / total_revenue if total_revenue else 0.0))
+        return stats
+
+    def get_tier_distribution(self) -> Dict[DiscountLevel, int]:
+        """
+        Число клиентов на каждом уровне карты лояльности
+
+        Returns:
+            Dict[DiscountLevel, int]: Уровень -> число карт (все уровни, в том числе пустые)
+        """
+        distribution = {level: 0 for level in DiscountLevel}
+        rows = self.session.execute(select(SalonCard.discount_level, func.count()).group_by(SalonCard.discount_level)).all() #type:ignore
+        for level, count in rows:
+            distribution[level] = count
+        return distribution
+
+    def rebuild_daily_stats(self, chunk_days: int = REBUILD_CHUNK_DAYS) -> int:
+        """
+        Пересчитывает дневную сводку с нуля по таблице записей
+
+        Удаление старой сводки и вставка новой идут одной транзакцией, так что отчеты
+        видят либо прежнюю сводку, либо новую целиком. Записи вставляются кусками по
+        chunk_days дней: каждый кусок - один INSERT ... SELECT с GROUP BY.
+        Выручка выполненных записей берется сохраненной при выполнении; для записей,
+        выполненных до появления этих столбцов, - по текущей цене и уровню карты клиента.
+
+        Args:
+            chunk_days: Сколько дней записей обрабатывать одним INSERT ... SELECT
+
+        Returns:
+            int: Число строк сводки
+        """
+        try:
+            self.session.execute(delete(DailyStats))
+            first, last = self.session.query(func.min(Appointment.start_datetime), func.max(Appointment.start_datetime)).one() #type:ignore
+
+            day = func.date(Appointment.start_datetime) if self.session.get_bind().dialect.name == "sqlite" else cast(Appointment.start_datetime, Date)
+            completed = Appointment.status == AppointmentStatus.COMPLETED #type:ignore
+            rate = SalonCard.discount_rate_expression()
+            counts = [func.sum(case((Appointment.status == status, 1), else_=0)) for status in STATUS_COUNT_COLUMNS]
+            minutes = cast(self._minutes_between(Appointment.start_datetime, Appointment.end_datetime), Integer)
+            columns = ["stat_date", "master_id", "service_id", *STATUS_COUNT_COLUMNS.values(),
+                       "booked_minutes", "gross_revenue", "discounted_revenue"]
+
+            chunk_start = first.date() if first is not None else None
+            while chunk_start is not None and chunk_start <= last.date():
+                chunk_end = chunk_start + timedelta(days=chunk_days)
+                rows = select(
+                    day, Appointment.master_id, Appointment.service_id, *counts,
+                    func.sum(case((Appointment.status.in_(BOOKED_STATUSES), minutes), else_=0)),
+                    func.sum(case((completed, func.coalesce(Appointment.completed_price, Service.price)), else_=0)),
+                    func.sum(case((completed, func.coalesce(Appointment.completed_discounted_price, Service.price * (1 - rate))), else_=0)),
+                ).join(Service, Service.service_id == Appointment.service_id).outerjoin(
+                    SalonCard, SalonCard.client_id == Appointment.client_id).where(
+                    Appointment.start_datetime >= datetime.combine(chunk_start, time(0, 0)), #type:ignore
+                    Appointment.start_datetime < datetime.combine(chunk_end, time(0, 0)) #type:ignore
+                ).group_by(day, Appointment.master_id, Appointment.service_id)
+                self.session.execute(insert(DailyStats).from_select(columns, rows))
+                chunk_start = chunk_end
+
+            count = self.session.query(DailyStats).count()
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        report_cache(self.session).invalidate()
+        return count
+
+    def _minutes_between(self, start, end):
+        """Разница двух столбцов даты/времени в минутах на диалекте текущей бд"""
+        if self.session.get_bind().dialect.name == "sqlite":
+            return func.round((func.julianday(end) - func.julianday(start)) * 1440)
+        return func.extract("epoch", end - start) / 60
@@ -0,0 +1,125 @@
+from datetime import datetime, time, timedelta
+from typing import List, Optional, Tuple
+from models.schedule import MasterSchedule, Appointment, AppointmentStatus
+from models.services import Service
+from auth.authentification import normalize_phone
+from exceptions import ServiceError, ScheduleError
+
+# Проверки без обращения к бд: общие для синхронных сервисов и их async-вариантов
+# (management/async_management.py). Данные загружает сервис, здесь только правила.
+
+# статусы, из которых запись уже нельзя отменить клиенту
+FINAL_STATUSES = (AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED, AppointmentStatus.NO_SHOW)
+
+
+def normalize_contacts(phone: str, email: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Приводит телефон и email к виду, в котором они хранятся в бд
+
+    Returns:
+        Tuple[str, Optional[str]]: (телефон, email или None для пустого)
+    """
+    normalized_email = email.lower().strip() if email else None
+    return normalize_phone(phone), normalized_email or None
+
+
+def check_missing_categories(category_ids: List[int], found_ids: List[int]) -> None:
+    """
+    Проверяет, что все запрошенные категории найдены
+
+    Raises:
+        ValueError: Если каких-то категорий нет
+    """
+    missing = [category_id for category_id in category_ids if category_id not in found_ids]
+    if missing:
+        raise ValueError(f"Категории с ID {missing} не найдены")
+
+
+def normalize_category_name(category_name: str) -> str:
+    """Название категории в том виде, в котором оно хранится в бд"""
+    return category_name.lower().strip()
+
+
+def check_service_duration(duration_minutes: int) -> None:
+    """
+    Raises:
+        ServiceError: Если длительность не кратна 30 минутам
+    """
+    if duration_minutes % 30 != 0:
+        raise ServiceError(f"Длительность услуги должна быть кратной 30 минутам.")
+
+
+def check_break(schedule: MasterSchedule, break_start: time, break_end: time) -> None:
+    """
+    Проверяет, что перерыв можно добавить в рабочий день
+
+    Raises:
+        ScheduleError: Выходной день или перерыв вне рабочего времени
+    """
+    if schedule.is_day_off: #type:ignore
+        raise ScheduleError("Нельзя добавить перерыв в выходной день")
+
+    if break_start < schedule.start_time or break_end > schedule.end_time: #type:ignore
+        raise ScheduleError("Перерыв должен быть в пределах рабочего времени")
+
+
+def check_booking(schedule: MasterSchedule, breaks: List[Tuple[time, time]], service: Service, start_datetime: datetime) -> datetime:
+    """
+    Проверяет, что запись на услугу укладывается в рабочий день мастера
+
+    Пересечения с другими записями проверяет сервис: для этого нужен запрос под блокировкой.
+
+    Args:
+        schedule: Расписание мастера на день
+        breaks: Перерывы (начало, конец)
+        service: Услуга
+        start_datetime: Начало записи
+
+    Returns:
+        datetime: Окончание записи
+
+    Raises:
+        ScheduleError: Выходной, запись вне рабочего времени или пересекает перерыв
+    """
+    if schedule.is_day_off:#type:ignore
+        raise ScheduleError("Нельзя записаться на выходной день")
+
+    end_datetime = start_datetime + timedelta(minutes=service.duration_minutes)#type:ignore
+
+    work_start = datetime.combine(schedule.work_date, schedule.start_time)#type:ignore
+    work_end = datetime.combine(schedule.work_date, schedule.end_time)#type:ignore
+
+    if start_datetime < work_start or end_datetime > work_end:
+        raise ScheduleError("Запись должна быть в пределах рабочего времени")
+
+    for break_start, break_end in breaks:
+        break_start_datetime = datetime.combine(schedule.work_date, break_start)#type:ignore
+        break_end_datetime = datetime.combine(schedule.work_date, break_end)#type:ignore
+
+        if (start_datetime < break_end_datetime and end_datetime > break_start_datetime):
+            raise ScheduleError(f"Запись пересекается с перерывом ({break_start}-{break_end})")
+
+    return end_datetime
+
+
+def check_client_cancel(appointment: Appointment, client_id: int) -> None:
+    """
+    Проверяет, что клиент может отменить запись
+
+    Raises:
+        ScheduleError: Чужая запись или запись уже в итоговом статусе
+    """
+    if appointment.client_id != client_id:#type:ignore
+        raise ScheduleError("Вы можете отменять только свои записи")
+
+    if appointment.status in FINAL_STATUSES:
+        raise ScheduleError(f"Запись уже имеет статус {appointment.status.value}")
+
+
+def check_admin_cancel(appointment: Appointment) -> None:
+    """
+    Raises:
+        ScheduleError: Запись уже отменена
+    """
+    if appointment.status == AppointmentStatus.CANCELLED:
+        raise ScheduleError(f"Запись уже отменена")
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, Table, ForeignKey
+from sqlalchemy import Column, Integer, Table, ForeignKey, inspect, text
+from sqlalchemy.engine import Engine
 
 Base = declarative_base()
 
@@ -9,4 +10,26 @@ master_service_category = Table('master_service_category',
     Base.metadata,
     Column('master_id', Integer, ForeignKey('masters.master_id'), primary_key=True),
     Column('category_id', Integer, ForeignKey('service_categories.category_id'), primary_key=True)
-)
\ No newline at end of file
+)
+
+
+def create_schema(engine: Engine) -> None:
+    """
+    Создает таблицы, недостающие столбцы и индексы
+
+    create_all не добавляет новые столбцы и индексы к уже существующим таблицам,
+    поэтому для старых баз они создаются отдельно (если их еще нет). Добавляются
+    только столбцы, допускающие NULL: старые строки получают в них NULL.
+    """
+    Base.metadata.create_all(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
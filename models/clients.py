@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Float, Enum, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, Float, Enum, ForeignKey, Integer, case, literal
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -12,6 +12,21 @@ class DiscountLevel(enum.Enum):
 
 class SalonCard(Base):
     __tablename__ = "salon_cards"
+
+    # доля скидки для каждого уровня карты
+    DISCOUNT_RATES = {
+        DiscountLevel.STANDARD: 0.0,
+        DiscountLevel.SILVER: 0.03,
+        DiscountLevel.GOLD: 0.07,
+        DiscountLevel.PLATINUM: 0.10
+    }
+
+    # пороги суммы покупок для уровней карты, от старшего к младшему
+    LEVEL_THRESHOLDS = [
+        (30000, DiscountLevel.PLATINUM),
+        (15000, DiscountLevel.GOLD),
+        (5000, DiscountLevel.SILVER)
+    ]
     
     client_id = Column(Integer, ForeignKey('clients.client_id'), primary_key=True)
     discount_level: Column[DiscountLevel] = Column(Enum(DiscountLevel), default=DiscountLevel.STANDARD, nullable=False)
@@ -27,12 +42,34 @@ class SalonCard(Base):
         """
         Повышает уровень карты при достижении нужной суммы
         """
-        if self.total_spent >= 30000: #type: ignore
-            self.discount_level = DiscountLevel.PLATINUM# type: ignore
-        elif self.total_spent >= 15000:#type: ignore
-            self.discount_level = DiscountLevel.GOLD #type: ignore
-        elif self.total_spent >= 5000:#type: ignore
-            self.discount_level = DiscountLevel.SILVER #type: ignore
+        for threshold, level in self.LEVEL_THRESHOLDS:
+            if self.total_spent >= threshold: #type: ignore
+                self.discount_level = level #type: ignore
+                break
+
+    @classmethod
+    def level_expression(cls, total_spent, below_thresholds=None):
+        """
+        SQL-выражение уровня карты для суммы total_spent - те же правила, что в upgrade_level
+
+        Args:
+            total_spent: SQL-выражение суммы покупок
+            below_thresholds: Уровень ниже младшего порога. None = оставить текущий discount_level
+        """
+        fallback = cls.discount_level if below_thresholds is None else literal(below_thresholds, cls.discount_level.type)
+        return case(*((total_spent >= threshold, literal(level, cls.discount_level.type)) for threshold, level in cls.LEVEL_THRESHOLDS),
+                    else_=fallback)
+
+    @classmethod
+    def discount_rate_expression(cls, discount_level=None):
+        """
+        SQL-выражение доли скидки для текущего discount_level
+
+        Args:
+            discount_level: Столбец уровня карты (например, из псевдонима таблицы). None = SalonCard.discount_level
+        """
+        discount_level = cls.discount_level if discount_level is None else discount_level
+        return case(*((discount_level == level, rate) for level, rate in cls.DISCOUNT_RATES.items()), else_=0.0)
     
     #применение скидки к сумме
     def apply_discount(self, amount: float) -> float:
@@ -45,14 +82,7 @@ class SalonCard(Base):
         Returns:
             float: Сумма с учетом скидки
         """
-        discount_rates = {
-            DiscountLevel.STANDARD: 0.0,
-            DiscountLevel.SILVER: 0.03,
-            DiscountLevel.GOLD: 0.07,
-            DiscountLevel.PLATINUM: 0.10
-        }
-        
-        discount = amount * discount_rates[self.discount_level] # type: ignore
+        discount = amount * self.DISCOUNT_RATES[self.discount_level] # type: ignore
         return amount - discount
 
 class Client(Base):
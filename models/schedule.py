@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Date, Time, Boolean, Enum
+from sqlalchemy import Column, Integer, BigInteger, Float, String, ForeignKey, DateTime, Date, Time, Boolean, Enum, Index
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -14,6 +14,11 @@ class AppointmentStatus(enum.Enum):
 #класс для работы с расписанием мастеров (на каждый день)
 class MasterSchedule(Base):
     __tablename__ = "master_schedule"
+    __table_args__ = (
+        # у мастера не больше одного расписания на дату, индекс же обслуживает get_schedule_by_date
+        Index("uq_master_schedule_master_date", "master_id", "work_date", unique=True),
+        Index("ix_master_schedule_work_date", "work_date"),
+    )
     
     schedule_id = Column(Integer, primary_key=True)
     master_id = Column(Integer, ForeignKey('masters.master_id'), nullable=False)
@@ -21,6 +26,9 @@ class MasterSchedule(Base):
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
     is_day_off = Column(Boolean, default=False, nullable=False)
+    # занятые получасовые ячейки дня (перерывы и запланированные записи), см. management/occupancy.py;
+    # NULL - маска не ведется (старая строка или время не на границе получаса)
+    occupancy_mask = Column(BigInteger, nullable=True)
     
     master = relationship("Master", back_populates="schedule")
     breaks = relationship("MasterBreak", back_populates="schedule_day", cascade="all, delete-orphan")
@@ -40,6 +48,9 @@ class MasterSchedule(Base):
 #класс для работы с расписанием мастеров (перерывы)
 class MasterBreak(Base):
     __tablename__ = "master_breaks"
+    __table_args__ = (
+        Index("ix_master_breaks_schedule", "schedule_id"),
+    )
     
     break_id = Column(Integer, primary_key=True)
     schedule_id = Column(Integer, ForeignKey('master_schedule.schedule_id'), nullable=False)
@@ -55,6 +66,15 @@ class MasterBreak(Base):
 #класс для работы с записями
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # свободные слоты и проверка пересечений в create_appointment
+        Index("ix_appointments_schedule_status_start", "schedule_id", "status", "start_datetime"),
+        # get_master_appointments / get_client_appointments
+        Index("ix_appointments_master_start", "master_id", "start_datetime"),
+        Index("ix_appointments_client_status_start", "client_id", "status", "start_datetime"),
+        # get_all_appointments с фильтрами по статусу и дате
+        Index("ix_appointments_status_start", "status", "start_datetime"),
+    )
     
     appointment_id = Column(Integer, primary_key=True)
     master_id = Column(Integer, ForeignKey('masters.master_id'), nullable=False)
@@ -66,6 +86,10 @@ class Appointment(Base):
     status: Column[AppointmentStatus] = Column(Enum(AppointmentStatus), default=AppointmentStatus.SCHEDULED, nullable=False)
     created_at = Column(DateTime, default=datetime.now, nullable=False)
     notes = Column(String(500))
+    # выручка, учтенная в дневной сводке при выполнении записи (цена и цена со скидкой карты на тот момент),
+    # см. management/statistics_management.py; NULL - запись не выполнялась или выполнена до появления столбцов
+    completed_price = Column(Float, nullable=True)
+    completed_discounted_price = Column(Float, nullable=True)
     
     master = relationship("Master", back_populates="appointments")
     client = relationship("Client", back_populates="appointments")
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, Date, Float, Index
+from models.base import Base
+
+#класс для дневной сводки по записям (мастер + услуга + день)
+class DailyStats(Base):
+    __tablename__ = "daily_stats"
+    __table_args__ = (
+        # отчеты по мастеру за период
+        Index("ix_daily_stats_master_date", "master_id", "stat_date"),
+    )
+
+    # без внешних ключей: строки удаленных записей сервисы удаления вычитают сами (record_appointments_deleted)
+    stat_date = Column(Date, primary_key=True)
+    master_id = Column(Integer, primary_key=True)
+    service_id = Column(Integer, primary_key=True)
+    scheduled_count = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)
+    cancelled_count = Column(Integer, default=0, nullable=False)
+    no_show_count = Column(Integer, default=0, nullable=False)
+    booked_minutes = Column(Integer, default=0, nullable=False)     # запланированные и выполненные записи
+    gross_revenue = Column(Float, default=0.0, nullable=False)      # цена выполненных услуг
+    discounted_revenue = Column(Float, default=0.0, nullable=False) # с учетом скидки карты клиента
+
+    def __repr__(self) -> str:
+        return f"DailyStats({self.stat_date}, master={self.master_id}, service={self.service_id})"
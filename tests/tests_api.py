@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.http_api import create_app, TOKENS_KEY
+from config.database import DatabaseConfig, create_salon_engine, create_session_factory
+from models.base import create_schema
+from management.master_management import MasterService
+from management.service_management import ServiceService, CategoryService
+from management.client_management import ClientService
+from management.schedule_management import ScheduleService
+from aiohttp.test_utils import TestClient, TestServer
+from datetime import date, time
+import asyncio
+import tempfile
+
+def setup_api():
+    path = os.path.join(tempfile.mkdtemp(), "api.db")
+    engine = create_salon_engine(DatabaseConfig(url=f"sqlite:///{path}"))
+    create_schema(engine)
+    session_factory = create_session_factory(engine)
+
+    session = session_factory()
+    category = CategoryService(session).create_category("маникюр")
+    service = ServiceService(session).create_service("Маникюр", 60, 2000, category.category_id)#type:ignore
+    master = MasterService(session).create_master("Тест", "Мастер", "+79991112233", "m@test.ru", "Маникюр", [category.category_id])#type:ignore
+    ScheduleService(session).add_work_day(master.master_id, date(2030, 1, 15), time(9, 0), time(12, 0))#type:ignore
+    ClientService(session).create_client("Клиент", "Один", "+79990000001", "c1@test.ru", "pass")
+    session_factory.remove()
+    return session_factory
+
+def test_catalog_and_login():
+    session_factory = setup_api()
+
+    async def scenario():
+        async with TestClient(TestServer(create_app(session_factory, max_workers=4))) as client:
+            categories = await (await client.get("/api/categories")).json()
+            assert [category["category_name"] for category in categories] == ["маникюр"]
+
+            services = await (await client.get("/api/services", params={"category_id": categories[0]["category_id"]})).json()
+            assert services[0]["service_name"] == "Маникюр" and services[0]["price"] == 2000
+
+            response = await client.get(f"/api/services/{services[0]['service_id']}/availability", params={"date": "2030-01-15"})
+            availability = await response.json()
+            assert availability[0]["master_name"] == "Тест Мастер"
+            assert availability[0]["slots"][0] == "2030-01-15T09:00:00"
+
+            assert (await client.get("/api/services/1/availability", params={"date": "15.01.2030"})).status == 400
+            assert (await client.post("/api/login", json={"phone": "8 999 000 00 01", "password": "wrong"})).status == 401
+            assert (await client.get("/api/appointments")).status == 401
+
+            response = await client.post("/api/login", json={"phone": "8 999 000 00 01", "password": "pass"})
+            assert response.status == 200
+            login = await response.json()
+            assert login["full_name"] == "Клиент Один" and login["token"]
+
+    asyncio.run(scenario())
+    print("test_catalog_and_login")
+
+def test_concurrent_booking_and_cancel():
+    session_factory = setup_api()
+
+    async def scenario():
+        async with TestClient(TestServer(create_app(session_factory, max_workers=4))) as client:
+            token = (await (await client.post("/api/login", json={"phone": "+79990000001", "password": "pass"})).json())["token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            booking = {"service_id": 1, "schedule_id": 1, "start": "2030-01-15T10:00:00"}
+
+            # 30 одновременных запросов на один слот: записывается ровно один
+            responses = await asyncio.gather(*(client.post("/api/appointments", json=booking, headers=headers) for _ in range(30)))
+            assert sorted(response.status for response in responses) == [201] + [400] * 29
+            created = [await response.json() for response in responses if response.status == 201][0]
+            assert created["status"] == "SCHEDULED" and created["end"] == "2030-01-15T11:00:00"
+
+            appointments = await (await client.get("/api/appointments", headers=headers)).json()
+            assert [appointment["appointment_id"] for appointment in appointments] == [created["appointment_id"]]
+
+            cancel_url = f"/api/appointments/{created['appointment_id']}/cancel"
+            assert (await client.post(cancel_url, headers=headers)).status == 200
+            repeated = await client.post(cancel_url, headers=headers)
+            assert repeated.status == 400 and "CANCELLED" in (await repeated.json())["error"]
+
+            assert (await client.post("/api/logout", headers=headers)).status == 200
+            assert (await client.get("/api/appointments", headers=headers)).status == 401
+
+    asyncio.run(scenario())
+    print("test_concurrent_booking_and_cancel")
+
+def test_request_validation_and_token_pruning():
+    session_factory = setup_api()
+    app = create_app(session_factory, max_workers=4)
+
+    async def scenario():
+        async with TestClient(TestServer(app)) as client:
+            # неверные поля отклоняются с 400 и именем поля
+            response = await client.post("/api/login", json={"phone": "+79990000001"})
+            assert response.status == 400 and "password" in (await response.json())["error"]
+            assert (await client.get("/api/services", params={"category_id": "abc"})).status == 400
+            assert (await client.get("/api/services/abc/availability", params={"date": "2030-01-15"})).status == 400
+            assert (await client.get("/api/services/1/availability")).status == 400
+
+            # при входе истекшие токены удаляются, действующие остаются
+            app[TOKENS_KEY]["expired"] = (1, 0.0)
+            token = (await (await client.post("/api/login", json={"phone": "+79990000001", "password": "pass"})).json())["token"]
+            assert set(app[TOKENS_KEY]) == {token}
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await client.post("/api/appointments", json={"service_id": 1, "schedule_id": 1, "start": 5}, headers=headers)
+            assert response.status == 400 and "start" in (await response.json())["error"]
+
+    asyncio.run(scenario())
+    print("test_request_validation_and_token_pruning")
+
+def run_all_tests():
+    test_catalog_and_login()
+    test_concurrent_booking_and_cancel()
+    test_request_validation_and_token_pruning()
+    print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,121 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from management.async_management import (AsyncClientService, AsyncMasterService, AsyncServiceService,
+                                         AsyncScheduleService, AsyncAppointmentService)
+from models.base import Base
+from models.schedule import AppointmentStatus
+from models.statistics import DailyStats
+from models.clients import DiscountLevel
+from exceptions import ClientError, ServiceError, ScheduleError
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from datetime import datetime, date, time
+import asyncio
+import tempfile
+
+async def setup_async_salon():
+    # файловая база: у одновременных сессий свои соединения
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+def test_async_catalog_and_clients():
+    async def scenario():
+        engine, session_factory = await setup_async_salon()
+        async with session_factory() as session:
+            service_service = AsyncServiceService(session)
+            category = await service_service.create_category("  Маникюр ")
+            assert category.category_name == "маникюр"
+            try:
+                await service_service.create_service("Маникюр", 45, 2000, category.category_id) #type:ignore
+                assert False
+            except ServiceError:
+                pass
+            service = await service_service.create_service("Маникюр", 60, 2000, category.category_id) #type:ignore
+            assert [s.service_id for s in await service_service.get_services_by_category(category.category_id)] == [service.service_id] #type:ignore
+
+            client_service = AsyncClientService(session)
+            client = await client_service.create_client("Анна", "Клиент", "8 999 000 00 01", "Anna@Test.ru ", "pass")
+            assert client.phone == "+79990000001" and client.email == "anna@test.ru"
+            assert client.salon_card.discount_level == DiscountLevel.STANDARD
+            try:
+                await client_service.create_client("Другая", "Анна", "+79990000001", "", "pass")
+                assert False
+            except ClientError:
+                pass
+            assert (await client_service.authenticate("+7 999 000-00-01", "pass")).client_id == client.client_id #type:ignore
+            assert await client_service.authenticate("+79990000001", "wrong") is None
+
+            # связи, не загруженные явно, не подгружаются лениво
+            try:
+                client.appointments
+                assert False
+            except InvalidRequestError:
+                pass
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    print("test_async_catalog_and_clients")
+
+def test_async_booking():
+    async def scenario():
+        engine, session_factory = await setup_async_salon()
+        async with session_factory() as session:
+            category = await AsyncServiceService(session).create_category("маникюр")
+            service = await AsyncServiceService(session).create_service("Маникюр", 60, 2000, category.category_id) #type:ignore
+            master = await AsyncMasterService(session).create_master("Тест", "Мастер", "+79991112233", "m@test.ru", "Маникюр",
+                                                                     [category.category_id]) #type:ignore
+            assert [c.category_name for c in master.service_categories] == ["маникюр"]
+            schedule_service = AsyncScheduleService(session)
+            schedule = await schedule_service.add_work_day(master.master_id, date(2030, 1, 15), time(9, 0), time(13, 0)) #type:ignore
+            await schedule_service.add_break(schedule.schedule_id, time(11, 0), time(12, 0)) #type:ignore
+            client = await AsyncClientService(session).create_client("Анна", "Клиент", "+79990000001", "", "pass")
+            service_id, schedule_id, client_id = service.service_id, schedule.schedule_id, client.client_id
+
+            slots = await schedule_service.get_available_time_slots(schedule_id, 60) #type:ignore
+            assert slots == [datetime(2030, 1, 15, 9, 0), datetime(2030, 1, 15, 9, 30), datetime(2030, 1, 15, 10, 0), datetime(2030, 1, 15, 12, 0)]
+
+        async def book(start: datetime):
+            async with session_factory() as session:
+                try:
+                    return await AsyncAppointmentService(session).create_appointment(client_id, service_id, schedule_id, start) #type:ignore
+                except ScheduleError:
+                    return None
+
+        # одновременные записи на пересекающееся время: проходит ровно одна
+        results = await asyncio.gather(*(book(datetime(2030, 1, 15, 9, 30)) for _ in range(5)), book(datetime(2030, 1, 15, 11, 0)))
+        created = [appointment for appointment in results if appointment]
+        assert len(created) == 1 and created[0].master.full_name == "Тест Мастер"
+
+        async with session_factory() as session:
+            appointment_service = AsyncAppointmentService(session)
+            appointments = await appointment_service.get_client_appointments(client_id) #type:ignore
+            assert [a.appointment_id for a in appointments] == [created[0].appointment_id]
+            assert appointments[0].service.service_name == "Маникюр"
+
+            try:
+                await appointment_service.client_cancel_appointment(created[0].appointment_id, client_id + 1) #type:ignore
+                assert False
+            except ScheduleError:
+                pass
+            assert await appointment_service.client_cancel_appointment(created[0].appointment_id, client_id) #type:ignore
+
+            stats = (await session.execute(select(DailyStats.scheduled_count, DailyStats.cancelled_count))).one()
+            assert tuple(stats) == (0, 1)
+            assert await AsyncScheduleService(session).get_available_time_slots(schedule_id, 60) == slots #type:ignore
+        await engine.dispose()
+
+    asyncio.run(scenario())
+    print("test_async_booking")
+
+def run_all_tests():
+    test_async_catalog_and_clients()
+    test_async_booking()
+    print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
+
+if __name__ == "__main__":
+    run_all_tests()
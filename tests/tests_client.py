@@ -7,10 +7,12 @@ from models.clients import Client, SalonCard, DiscountLevel
 from models.base import Base
 from models.services import ServiceCategory, Service
 from models.masters import Master
-from management.client_management import ClientService, PurchaseService
+from management.client_management import ClientService, PurchaseService, ClientBulkService
 from models.schedule import MasterSchedule, Appointment, MasterBreak 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+import io
+import json
 
 def test_normalize_phone():
     assert normalize_phone("+7-999-123-45-67") == "+79991234567"
@@ -138,6 +140,192 @@ def test_hash_functions():
     assert simple_hash("test1") != simple_hash("test2")
     print("test_auth_functions")
 
+def test_bulk_import_export():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+
+    ClientService(session).create_client("Вера", "Old", "+7-900-000-00-01", "old@test.ru", "pass")
+
+    source = io.StringIO(
+        "first_name,last_name,phone,email,password,total_spent\n"
+        "Анна,Иванова,8-900-000-00-02,ANNA@test.ru,pass1,\n"
+        "Петр,Петров,+7 900 000 00 03,,pass2,16000\n"
+        "Дубль,Файла,89000000002,other@test.ru,pass3,\n"
+        "Дубль,Базы,+79000000001,,pass4,\n"
+        "Без,Пароля,+79000000004,,,\n"
+        "Ольга,Сидорова,+79000000005,olga@test.ru,pass5,5000\n"
+    )
+    report = ClientBulkService(session, chunk_size=2).import_clients(source)
+
+    assert report.created == 3
+    assert [line for line, _ in report.errors] == [4, 5, 6]
+    assert session.query(Client).count() == 4
+
+    petr = ClientService(session).get_client_by_phone("+79000000003")
+    assert petr is not None
+    assert petr.salon_card.total_spent == 16000
+    assert petr.salon_card.discount_level == DiscountLevel.GOLD
+
+    jsonl = io.StringIO('{"first_name": "Иван", "last_name": "Орлов", "phone": "+79000000006", "password_hash": "abc"}\n'
+                        'не json\n')
+    report = ClientBulkService(session).import_clients(jsonl, "jsonl")
+    assert report.created == 1
+    assert report.errors[0][0] == 2
+
+    target = io.StringIO()
+    assert ClientBulkService(session).export_clients(target, "jsonl") == 5
+    rows = [json.loads(line) for line in target.getvalue().splitlines()]
+    assert [row["phone"] for row in rows][-1] == "+79000000006"
+    assert "password_hash" not in rows[0]
+    assert rows[2]["discount_level"] == DiscountLevel.GOLD.value
+
+    session.close()
+    print("test_bulk_import_export")
+
+def test_clients_page():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    client_service = ClientService(session)
+    for i in range(5):
+        client_service.create_client("Клиент", str(i), f"+7911000000{i}", f"c{i}@test.ru", "pass")
+    
+    first = client_service.get_clients_page(limit=2)
+    second = client_service.get_clients_page(limit=2, after_id=first[-1].client_id)#type: ignore
+    last = client_service.get_clients_page(limit=2, after_id=4)
+    assert [client.last_name for client in first + second] == ["0", "1", "2", "3"]
+    assert [client.client_id for client in last] == [5]
+    assert last[0].salon_card is not None
+    
+    session.close()
+    print("test_clients_page")
+
+def test_post_purchase_atomic():
+    import tempfile
+    import threading
+    from config.database import DatabaseConfig, create_salon_engine, create_session_factory
+    from models.base import create_schema
+    
+    path = os.path.join(tempfile.mkdtemp(), "purchases.db")
+    engine = create_salon_engine(DatabaseConfig(url=f"sqlite:///{path}"))
+    create_schema(engine)
+    session_factory = create_session_factory(engine)
+    client_id = ClientService(session_factory()).create_client("Ирина", "Кассова", "+79110000077", "i@test.ru", "pass").client_id
+    session_factory.remove()
+    
+    # 4 потока по 25 покупок на 100 руб.: ни одно обновление не должно потеряться
+    errors = []
+    def worker():
+        purchase_service = PurchaseService(session_factory())
+        try:
+            for _ in range(25):
+                purchase_service.post_purchase(client_id, 100.0)#type: ignore
+        except Exception as e:
+            errors.append(e)
+        session_factory.remove()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    
+    session = session_factory()
+    card = session.get(SalonCard, client_id)
+    # первые 5000 без скидки, остальные 50 покупок со скидкой SILVER 3%
+    assert abs(card.total_spent - (5000 + 50 * 97)) < 1e-6#type: ignore
+    assert card.discount_level == DiscountLevel.SILVER#type: ignore
+    
+    # скидка SILVER 3%, переход в GOLD на 15000
+    discounted, total, old_level, new_level = PurchaseService(session).post_purchase(client_id, 6000.0)#type: ignore
+    assert abs(discounted - 5820) < 1e-6
+    assert abs(total - 15670) < 1e-6
+    assert (old_level, new_level) == (DiscountLevel.SILVER, DiscountLevel.GOLD)
+    session_factory.remove()
+    print("test_post_purchase_atomic")
+
+def test_post_purchases_batch():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    client_service = ClientService(session)
+    first = client_service.create_client("Первый", "Клиент", "+79110000001", "1@test.ru", "pass").client_id
+    second = client_service.create_client("Второй", "Клиент", "+79110000002", "2@test.ru", "pass").client_id
+    
+    posted = PurchaseService(session).post_purchases([(first, 3000.0), (second, 1000.0), (first, 3000.0), (999, 500.0)])
+    assert posted == 3
+    
+    session.expire_all()
+    first_card = session.get(SalonCard, first)
+    # уровень пересчитывается после всей пачки, поэтому обе покупки первого клиента без скидки
+    assert first_card.total_spent == 6000#type: ignore
+    assert first_card.discount_level == DiscountLevel.SILVER#type: ignore
+    assert session.get(SalonCard, second).discount_level == DiscountLevel.STANDARD#type: ignore
+    
+    session.close()
+    print("test_post_purchases_batch")
+
+def test_recompute_loyalty_tiers():
+    from models.schedule import AppointmentStatus
+    from datetime import datetime, date, time, timedelta
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    session.add(ServiceCategory(category_id=1, category_name="стрижки"))
+    session.add(Service(service_id=1, service_name="Окрашивание", duration_minutes=60, price=4000, category_id=1))
+    session.add(Master(master_id=1, first_name="Анна", last_name="Мастер", phone="+79990000001", specialty="Колорист"))
+    session.add(MasterSchedule(schedule_id=1, master_id=1, work_date=date(2024, 3, 4), start_time=time(0, 0), end_time=time(23, 0)))
+    # 1: две выполненные записи со списанными суммами -> SILVER, 2: покупки вручную без записей - не трогается,
+    # 3: четыре выполненные и одна отмененная -> GOLD, 4: карта без записей,
+    # 5: запись выполнена до сохранения сумм - по текущей цене и уровню карты
+    cards = {1: (0, DiscountLevel.STANDARD), 2: (20000, DiscountLevel.GOLD), 3: (0, DiscountLevel.SILVER),
+             4: (0, DiscountLevel.STANDARD), 5: (0, DiscountLevel.STANDARD)}
+    for client_id, (total_spent, level) in cards.items():
+        session.add(Client(client_id=client_id, first_name="Клиент", last_name=str(client_id), phone=f"+7911000000{client_id}", password_hash="x"))
+        session.add(SalonCard(client_id=client_id, total_spent=total_spent, discount_level=level))
+    
+    hour = 0
+    for client_id, appointments in {1: [(AppointmentStatus.COMPLETED, 4000), (AppointmentStatus.COMPLETED, 3880)],
+                                    3: [(AppointmentStatus.COMPLETED, 3880)] * 4 + [(AppointmentStatus.CANCELLED, None)],
+                                    5: [(AppointmentStatus.COMPLETED, None)]}.items():
+        for status, charged in appointments:
+            start = datetime(2024, 3, 4, hour, 0)
+            session.add(Appointment(master_id=1, client_id=client_id, service_id=1, schedule_id=1,
+                                    start_datetime=start, end_datetime=start + timedelta(hours=1), status=status,
+                                    completed_price=4000 if charged else None, completed_discounted_price=charged))
+            hour += 1
+    session.commit()
+    
+    purchase_service = PurchaseService(session)
+    # dry_run считает изменения, но ничего не записывает
+    assert purchase_service.recompute_loyalty_tiers(dry_run=True) == (3, 2)
+    assert session.get(SalonCard, 1).total_spent == 0#type: ignore
+    
+    assert purchase_service.recompute_loyalty_tiers() == (3, 2)
+    
+    session.expire_all()
+    result = {card.client_id: (card.total_spent, card.discount_level) for card in session.query(SalonCard)}
+    assert result == {1: (7880, DiscountLevel.SILVER), 2: (20000, DiscountLevel.GOLD),
+                      3: (15520, DiscountLevel.GOLD), 4: (0, DiscountLevel.STANDARD), 5: (4000, DiscountLevel.STANDARD)}
+    
+    # повторный запуск ничего не меняет
+    assert purchase_service.recompute_loyalty_tiers() == (0, 0)
+    
+    # только пороги: сумма остается, уровень выравнивается по ней
+    session.get(SalonCard, 4).total_spent = 31000#type: ignore
+    session.commit()
+    assert purchase_service.recompute_loyalty_tiers(recompute_totals=False) == (1, 1)
+    session.expire_all()
+    assert session.get(SalonCard, 4).discount_level == DiscountLevel.PLATINUM#type: ignore
+    
+    session.close()
+    print("test_recompute_loyalty_tiers")
+
 def run_all_tests():
     test_normalize_phone()
     test_client_creation() 
@@ -145,6 +333,11 @@ def run_all_tests():
     test_client_service()
     test_purchase_service()
     test_hash_functions()
+    test_bulk_import_export()
+    test_clients_page()
+    test_post_purchase_atomic()
+    test_post_purchases_batch()
+    test_recompute_loyalty_tiers()
     print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
 
 if __name__ == "__main__":
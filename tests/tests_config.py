@@ -0,0 +1,160 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from config.database import (DatabaseConfig, load_database_config, create_salon_engine, create_session_factory,
+                             session_scope, DEFAULT_DATABASE_URL)
+from config.slow_query_log import SlowQueryLog, enable_slow_query_log, disable_slow_query_log
+from management.schedule_management import AppointmentService
+from management.client_management import ClientService
+from auth.authentification import simple_hash
+from models.base import create_schema
+from models.services import ServiceCategory
+from models.clients import Client
+from models.masters import Master
+from models.schedule import MasterSchedule
+
+@contextmanager
+def environment(**values):
+    """Временно подменяет переменные окружения SALON_*"""
+    saved = {name: value for name, value in os.environ.items() if name.startswith("SALON_")}
+    for name in saved:
+        del os.environ[name]
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name in [name for name in os.environ if name.startswith("SALON_")]:
+            del os.environ[name]
+        os.environ.update(saved)
+
+def test_load_database_config_defaults():
+    with environment():
+        config = load_database_config()
+    assert config.url == DEFAULT_DATABASE_URL
+    assert config.pool_size == 5
+    assert config.pool_pre_ping is True
+    
+    print("test_load_database_config_defaults")
+
+def test_load_database_config_file_and_env():
+    path = os.path.join(tempfile.mkdtemp(), "salon.ini")
+    with open(path, "w", encoding="utf-8") as config_file:
+        config_file.write("[database]\nurl = sqlite:///salon.db\npool_size = 20\npool_pre_ping = false\n")
+    
+    with environment(SALON_CONFIG=path, SALON_DB_POOL_SIZE="7"):
+        config = load_database_config()
+    
+    assert config.url == "sqlite:///salon.db"
+    assert config.pool_size == 7
+    assert config.pool_pre_ping is False
+    
+    print("test_load_database_config_file_and_env")
+
+def test_session_scope_commit_and_rollback():
+    engine = create_salon_engine(DatabaseConfig(url="sqlite:///:memory:"))
+    create_schema(engine)
+    session_factory = create_session_factory(engine)
+    
+    with session_scope(session_factory) as session:
+        session.add(ServiceCategory(category_name="маникюр"))
+    
+    try:
+        with session_scope(session_factory) as session:
+            session.add(ServiceCategory(category_name="стрижки"))
+            raise RuntimeError("ошибка в единице работы")
+    except RuntimeError:
+        pass
+    
+    with session_scope(session_factory) as session:
+        names = [category.category_name for category in session.query(ServiceCategory).all()]
+    assert names == ["маникюр"]
+    
+    print("test_session_scope_commit_and_rollback")
+
+def test_scoped_sessions_per_thread():
+    path = os.path.join(tempfile.mkdtemp(), "salon.db")
+    engine = create_salon_engine(DatabaseConfig(url=f"sqlite:///{path}"))
+    create_schema(engine)
+    session_factory = create_session_factory(engine)
+    
+    sessions = []
+    def worker():
+        sessions.append(session_factory())
+        session_factory.remove()
+    
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sessions[0] is not sessions[1]
+    
+    print("test_scoped_sessions_per_thread")
+
+def test_slow_query_log():
+    log_path = os.path.join(tempfile.mkdtemp(), "slow.log")
+    with environment(SALON_SLOW_QUERY_MS="250", SALON_SLOW_QUERY_LOG=log_path):
+        config = load_database_config()
+    assert config.slow_query_ms == 250 and config.slow_query_log == log_path
+    
+    engine = create_salon_engine(DatabaseConfig(url="sqlite:///:memory:"))
+    create_schema(engine)
+    # порог 0: записывается каждый запрос
+    enable_slow_query_log(engine, log_path, threshold_ms=0)
+    session = create_session_factory(engine)()
+    
+    AppointmentService(session).get_master_appointments(7, None)
+    with open(log_path, encoding="utf-8") as log_file:
+        entries = [json.loads(line) for line in log_file]
+    entry = [entry for entry in entries if entry["method"] == "AppointmentService.get_master_appointments"][-1]
+    assert entry["statement"].startswith("SELECT") and entry["parameters"] == [7]
+    assert entry["plan"] and any("appointments" in step for step in entry["plan"])
+    assert any("get_master_appointments" in frame for frame in entry["stack"])
+    
+    # хэш пароля в журнал не попадает, остальные параметры пишутся как есть
+    ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "secret")
+    with open(log_path, encoding="utf-8") as log_file:
+        text = log_file.read()
+    assert simple_hash("secret") not in text
+    insert = [json.loads(line) for line in text.splitlines() if json.loads(line)["statement"].startswith("INSERT INTO clients")][0]
+    assert insert["parameters"] == ["Анна", "Иванова", "+79990000001", "anna@test.ru", "***"]
+    with open(log_path, encoding="utf-8") as log_file:
+        entries = log_file.readlines()
+    
+    # сбой SAVEPOINT и закрытия курсора не выходит за пределы журнала
+    class BrokenCursor:
+        def execute(self, statement, parameters=None):
+            raise RuntimeError("соединение потеряно")
+        def close(self):
+            raise RuntimeError("соединение потеряно")
+    broken = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), in_transaction=lambda: True,
+                             connection=SimpleNamespace(cursor=BrokenCursor, dbapi_connection=SimpleNamespace(autocommit=False)))
+    slow_log = SlowQueryLog(log_path)
+    assert slow_log.explain(broken, "SELECT 1", ()) == (None, "соединение потеряно")
+    slow_log.close()
+    
+    disable_slow_query_log(engine)
+    AppointmentService(session).get_master_appointments(7, None)
+    with open(log_path, encoding="utf-8") as log_file:
+        assert len(log_file.readlines()) == len(entries)
+    session.close()
+    
+    print("test_slow_query_log")
+
+def run_all_tests():
+    test_load_database_config_defaults()
+    test_load_database_config_file_and_env()
+    test_session_scope_commit_and_rollback()
+    test_scoped_sessions_per_thread()
+    test_slow_query_log()
+    print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
+
+if __name__ == "__main__":
+    run_all_tests()
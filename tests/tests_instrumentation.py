@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from management.instrumentation import enable_instrumentation, disable_instrumentation, is_instrumentation_enabled, metrics
+from management.client_management import ClientService, PurchaseService, ClientBulkService
+from models.base import Base
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import io
+import json
+import tempfile
+
+def test_instrumentation_off_by_default():
+    assert not is_instrumentation_enabled()
+    assert not hasattr(ClientService.get_clients_page, "__wrapped__")
+    print("test_instrumentation_off_by_default")
+
+def test_method_metrics():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    metrics.reset()
+    enable_instrumentation(engine)
+    try:
+        client_service = ClientService(session)
+        for i in range(3):
+            client_service.create_client("Клиент", str(i), f"+7911000000{i}", f"c{i}@test.ru", "pass")
+        assert len(client_service.get_clients_page(limit=10)) == 3
+        PurchaseService(session).add_purchase(1, 6000)
+
+        page = metrics.get("ClientService.get_clients_page")
+        assert page.calls == 1 and page.queries == 1 and page.rows == 3 #type:ignore
+        assert 0 < page.db_seconds <= page.total_seconds #type:ignore
+        assert metrics.get("ClientService.create_client").calls == 3 #type:ignore
+
+        # потоковая выгрузка (yield_per) тоже считается: строки засчитываются по мере чтения курсора
+        assert ClientBulkService(session, chunk_size=2).export_clients(io.StringIO()) == 3
+        assert metrics.get("ClientBulkService.export_clients").rows == 3 #type:ignore
+
+        # вложенный вызов post_purchase входит и в свои показатели, и в показатели add_purchase
+        posting = metrics.get("PurchaseService.post_purchase")
+        purchase = metrics.get("PurchaseService.add_purchase")
+        assert posting.calls == 1 and purchase.queries > posting.queries #type:ignore
+
+        prometheus = metrics.to_prometheus()
+        assert 'salon_method_calls_total{method="ClientService.create_client"} 3' in prometheus
+        assert "# TYPE salon_method_seconds_max gauge" in prometheus
+
+        path = os.path.join(tempfile.mkdtemp(), "metrics.jsonl")
+        metrics.write_json_lines(path)
+        with open(path, encoding="utf-8") as file:
+            lines = [json.loads(line) for line in file]
+        assert {line["method"] for line in lines} >= {"ClientService.get_clients_page", "PurchaseService.add_purchase"}
+    finally:
+        disable_instrumentation()
+        session.close()
+
+    assert not hasattr(ClientService.get_clients_page, "__wrapped__")
+    ClientService(sessionmaker(engine)()).get_clients_page()
+    assert metrics.get("ClientService.get_clients_page").calls == 1 #type:ignore
+    print("test_method_metrics")
+
+def test_streamed_result_rows():
+    # строки засчитываются оберткой context.cursor: если SQLAlchemy начнет строить результат
+    # до события after_cursor_execute, потоковые результаты перестанут считаться
+    from sqlalchemy import select
+    from models.clients import Client
+    
+    class StreamingReader:
+        def __init__(self, session):
+            self.session = session
+        
+        def read_partitions(self):
+            result = self.session.execute(select(Client.client_id).execution_options(stream_results=True, max_row_buffer=2))
+            return [list(partition) for partition in result.partitions(2)]
+        
+        def read_first(self):
+            # прочитана только первая порция: засчитываются прочитанные строки, а не весь результат
+            with self.session.connection().execution_options(stream_results=True).execute(select(Client.client_id)) as result:
+                return result.fetchmany(2)
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    for i in range(5):
+        ClientService(session).create_client("Клиент", str(i), f"+7911000000{i}", f"c{i}@test.ru", "pass")
+    metrics.reset()
+    enable_instrumentation(engine, classes=[StreamingReader])
+    try:
+        reader = StreamingReader(session)
+        assert [len(partition) for partition in reader.read_partitions()] == [2, 2, 1]
+        assert metrics.get("StreamingReader.read_partitions").rows == 5 #type:ignore
+        assert len(reader.read_first()) == 2
+        assert metrics.get("StreamingReader.read_first").rows == 2 #type:ignore
+    finally:
+        disable_instrumentation()
+        session.close()
+    print("test_streamed_result_rows")
+
+def run_all_tests():
+    test_instrumentation_off_by_default()
+    test_method_metrics()
+    test_streamed_result_rows()
+    print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
+
+if __name__ == "__main__":
+    run_all_tests()
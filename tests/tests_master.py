@@ -82,11 +82,50 @@ def test_delete():
     
     session.close()
 
+def test_capability_index():
+    from sqlalchemy import event
+    from management.caches import capability_index
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    session.add_all([ServiceCategory(category_id=1, category_name="стрижки"), ServiceCategory(category_id=2, category_name="маникюр")])
+    session.commit()
+    master_service = MasterService(session)
+    first = master_service.create_master("Анна", "Первая", "+79990000001", "a@test.ru", "Парикмахер", category_ids=[1])
+    second = master_service.create_master("Олег", "Второй", "+79990000002", "o@test.ru", "Универсал", category_ids=[1, 2])
+    first_id, second_id = first.master_id, second.master_id
+    
+    index = capability_index(session)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    assert index.masters_for_category(session, 1) == {first_id, second_id}
+    assert index.can_perform(session, second_id, 2)#type: ignore
+    assert not index.can_perform(session, first_id, 2)#type: ignore
+    assert len(queries) == 1
+    
+    # изменения через MasterService сразу видны в индексе без перестроения
+    master_service.add_categories_to_master(first_id, [2])#type: ignore
+    assert index.can_perform(session, first_id, 2)#type: ignore
+    master_service.remove_category_from_master(second_id, 1)#type: ignore
+    assert index.masters_for_category(session, 1) == {first_id}
+    master_service.delete_master(first_id)#type: ignore
+    assert index.masters_for_category(session, 2) == {second_id}
+    
+    queries.clear()
+    assert index.masters_for_category(session, 1) == set()
+    assert len(queries) == 0
+    
+    print("test_capability_index")
+    session.close()
+
 def run_all_tests():
     
     test_master_class()
     test_master_class_withot_phone_and_email()
     test_delete()
+    test_capability_index()
     
     print("ВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
 
@@ -3,11 +3,13 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from management.schedule_management import ScheduleService
+from management.slot_engine import find_free_slots, naive_free_slots, free_start_cells, interval_mask
 from models.schedule import MasterSchedule, Appointment, MasterBreak, AppointmentStatus
 from models.base import Base
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
+import random
 
 def test_master_schedule_class():
     """Тест класса MasterSchedule"""
@@ -164,6 +166,562 @@ def test_schedule_service_add_break():
     print("test_schedule_service_add_break")
     session.close()
 
+def test_find_free_slots_matches_naive():
+    """Тест совпадения интервального поиска слотов с пошаговым перебором"""
+    rnd = random.Random(42)
+    day = date(2025, 1, 15)
+    
+    for _ in range(300):
+        day_start = datetime.combine(day, time(rnd.choice([8, 9, 10]), rnd.choice([0, 15, 30])))
+        day_end = day_start + timedelta(minutes=rnd.randint(60, 720))
+        
+        breaks = []
+        for _ in range(rnd.randint(0, 3)):
+            start = day_start + timedelta(minutes=rnd.randint(0, 600))
+            breaks.append((start, start + timedelta(minutes=rnd.randint(5, 90))))
+        
+        appointments = []
+        for _ in range(rnd.randint(0, 15)):
+            start = day_start + timedelta(minutes=rnd.randint(-30, 700))
+            appointments.append((start, start + timedelta(minutes=rnd.choice([30, 45, 60, 90]))))
+        appointments.sort()
+        
+        duration = rnd.choice([30, 60, 90, 120])
+        expected = naive_free_slots(day_start, day_end, breaks, appointments, duration)
+        assert find_free_slots(day_start, day_end, breaks + appointments, duration) == expected
+    
+    print("test_find_free_slots_matches_naive")
+
+def test_schedule_service_available_time_slots():
+    """Тест поиска свободных слотов с учетом перерыва и записи"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    
+    Session = sessionmaker(engine)
+    session = Session()
+
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService
+    
+    category = CategoryService(session).create_category("стрижки")
+    service = ServiceService(session).create_service("Стрижка", 60, 1500, category.category_id)#type:ignore
+    master = MasterService(session).create_master(
+        first_name="Тест", last_name="Мастер", phone="+79991112233",
+        email="test@test.ru", specialty="Парикмахер", category_ids=[category.category_id]#type:ignore
+    )
+    client = ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "pass")
+    
+    schedule_service = ScheduleService(session)
+    schedule = schedule_service.add_work_day(master.master_id, date(2025, 1, 15), time(9, 0), time(14, 0))#type:ignore
+    schedule_service.add_break(schedule.schedule_id, time(12, 0), time(12, 30), "Обед")#type:ignore
+    AppointmentService(session).create_appointment(client.client_id, service.service_id, schedule.schedule_id,#type:ignore
+                                                   datetime(2025, 1, 15, 10, 0))
+    
+    slots = schedule_service.get_available_time_slots(schedule.schedule_id, 60)#type:ignore
+    assert [slot.strftime("%H:%M") for slot in slots] == ["09:00", "11:00", "12:30", "13:00"]
+    
+    print("test_schedule_service_available_time_slots")
+    session.close()
+
+def test_find_available_masters_constant_queries():
+    """Тест: поиск доступных мастеров делает одинаковое число запросов при любом числе мастеров"""
+    from sqlalchemy import event
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.schedule_management import AppointmentService
+    
+    def count_queries(masters_count: int):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(engine)()
+        
+        category = CategoryService(session).create_category("маникюр")
+        other = CategoryService(session).create_category("стрижки")
+        service = ServiceService(session).create_service("Маникюр", 60, 2000, category.category_id)#type:ignore
+        schedule_service = ScheduleService(session)
+        
+        for i in range(masters_count):
+            master = MasterService(session).create_master(
+                first_name="Мастер", last_name=str(i), phone=f"+7999000{i:04d}", email=f"m{i}@test.ru",
+                specialty="Маникюр", category_ids=[category.category_id if i % 3 else other.category_id]#type:ignore
+            )
+            schedule = schedule_service.add_work_day(master.master_id, date(2025, 1, 15), time(9, 0), time(18, 0))#type:ignore
+            schedule_service.add_break(schedule.schedule_id, time(13, 0), time(14, 0))#type:ignore
+        
+        session.expire_all()
+        queries = []
+        event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        masters = AppointmentService(session).find_available_masters(service.service_id, date(2025, 1, 15))#type:ignore
+        session.close()
+        return len(masters), len(queries)
+    
+    found_small, queries_small = count_queries(3)
+    found_large, queries_large = count_queries(30)
+    
+    assert found_small == 2
+    assert found_large == 20
+    assert queries_small == queries_large
+    
+    print("test_find_available_masters_constant_queries")
+
+def test_find_next_available_slots():
+    """Тест поиска ближайших свободных времен у всех мастеров"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService
+    
+    category = CategoryService(session).create_category("маникюр")
+    service = ServiceService(session).create_service("Маникюр", 60, 2000, category.category_id)#type:ignore
+    client = ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "pass")
+    schedule_service = ScheduleService(session)
+    appointment_service = AppointmentService(session)
+    
+    first = MasterService(session).create_master("Первый", "Мастер", "+79990000011", "m1@test.ru", "Маникюр", [category.category_id])#type:ignore
+    second = MasterService(session).create_master("Второй", "Мастер", "+79990000012", "m2@test.ru", "Маникюр", [category.category_id])#type:ignore
+    
+    # первый мастер работает только на второй день, второй - с утра первого дня, но занят до 11:00
+    schedule_service.add_work_day(first.master_id, date(2025, 1, 16), time(9, 0), time(12, 0))#type:ignore
+    busy_day = schedule_service.add_work_day(second.master_id, date(2025, 1, 15), time(9, 0), time(12, 0))#type:ignore
+    schedule_service.add_work_day(second.master_id, date(2025, 1, 16), time(10, 0), time(12, 0))#type:ignore
+    appointment_service.create_appointment(client.client_id, service.service_id, busy_day.schedule_id,#type:ignore
+                                           datetime(2025, 1, 15, 9, 0))
+    appointment_service.create_appointment(client.client_id, service.service_id, busy_day.schedule_id,#type:ignore
+                                           datetime(2025, 1, 15, 10, 0))
+    
+    options = appointment_service.find_next_available_slots(service.service_id, count=5, horizon_days=7,#type:ignore
+                                                            start_from=datetime(2025, 1, 15, 8, 0))
+    assert [(master.first_name, slot.strftime("%d %H:%M")) for master, slot, _ in options] == [
+        ("Второй", "15 11:00"), ("Первый", "16 09:00"), ("Первый", "16 09:30"), ("Первый", "16 10:00"), ("Второй", "16 10:00")]
+    assert options[0][2] == busy_day.schedule_id
+    
+    # уже прошедшие слоты не предлагаются
+    options = appointment_service.find_next_available_slots(service.service_id, count=1, horizon_days=7,#type:ignore
+                                                            start_from=datetime(2025, 1, 16, 9, 10))
+    assert [(master.first_name, slot.strftime("%d %H:%M")) for master, slot, _ in options] == [("Первый", "16 09:30")]
+    
+    print("test_find_next_available_slots")
+    session.close()
+
+def test_master_schedule_unique_per_date():
+    """Тест уникальности расписания мастера на дату на уровне базы"""
+    from sqlalchemy.exc import IntegrityError
+    from models.base import create_schema
+    
+    engine = create_engine("sqlite:///:memory:")
+    create_schema(engine)
+    create_schema(engine)
+    session = sessionmaker(engine)()
+    
+    session.add(MasterSchedule(master_id=1, work_date=date(2025, 1, 15), start_time=time(9, 0), end_time=time(18, 0)))
+    session.commit()
+    session.add(MasterSchedule(master_id=1, work_date=date(2025, 1, 15), start_time=time(10, 0), end_time=time(19, 0)))
+    try:
+        session.commit()
+        assert False, "дубликат расписания не должен сохраняться"
+    except IntegrityError:
+        session.rollback()
+    
+    print("test_master_schedule_unique_per_date")
+    session.close()
+
+def test_concurrent_bookings_never_overlap():
+    """Стресс-тест: параллельные записи к одному мастеру не пересекаются"""
+    import tempfile
+    import threading
+    from config.database import DatabaseConfig, create_salon_engine, create_session_factory
+    from models.base import create_schema
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService
+    from exceptions import ScheduleError
+    
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    engine = create_salon_engine(DatabaseConfig(url=f"sqlite:///{path}"))
+    create_schema(engine)
+    session_factory = create_session_factory(engine)
+    
+    session = session_factory()
+    category = CategoryService(session).create_category("маникюр")
+    service = ServiceService(session).create_service("Маникюр", 90, 2000, category.category_id)#type:ignore
+    master = MasterService(session).create_master("Тест", "Мастер", "+79991112233", "m@test.ru", "Маникюр", [category.category_id])#type:ignore
+    schedule = ScheduleService(session).add_work_day(master.master_id, date(2025, 1, 15), time(9, 0), time(18, 0))#type:ignore
+    clients = [ClientService(session).create_client("Клиент", str(i), f"+7999000{i:04d}", f"c{i}@test.ru", "pass").client_id
+               for i in range(8)]
+    service_id, schedule_id = service.service_id, schedule.schedule_id
+    session_factory.remove()
+    
+    starts = [datetime(2025, 1, 15, 9, 0) + timedelta(minutes=30 * i) for i in range(16)]
+    booked = []
+    errors = []
+    
+    def worker(client_id: int, seed: int):
+        thread_session = session_factory()
+        appointment_service = AppointmentService(thread_session)
+        order = starts[:]
+        random.Random(seed).shuffle(order)
+        for start in order:
+            try:
+                appointment = appointment_service.create_appointment(client_id, service_id, schedule_id, start)#type:ignore
+                booked.append(appointment.appointment_id)#type:ignore
+            except ScheduleError:
+                pass
+            except Exception as e:
+                errors.append(e)
+        session_factory.remove()
+    
+    threads = [threading.Thread(target=worker, args=(client_id, i)) for i, client_id in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    check_session = session_factory()
+    appointments = check_session.query(Appointment).filter_by(schedule_id=schedule_id, status=AppointmentStatus.SCHEDULED
+                                                               ).order_by(Appointment.start_datetime).all()
+    assert len(appointments) == len(booked) > 0
+    for previous, current in zip(appointments, appointments[1:]):
+        assert previous.end_datetime <= current.start_datetime#type:ignore
+    
+    print("test_concurrent_bookings_never_overlap")
+    session_factory.remove()
+
+def test_bulk_add_schedules_many_masters():
+    """Тест пакетного добавления расписания нескольким мастерам"""
+    from sqlalchemy import event
+    from management.master_management import MasterService
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    masters = [MasterService(session).create_master("Мастер", str(i), f"+7999000{i:04d}", f"m{i}@test.ru", "Парикмахер")
+               for i in range(3)]
+    master_ids = [master.master_id for master in masters]
+    schedule_service = ScheduleService(session)
+    schedule_service.add_work_day(master_ids[0], date(2025, 1, 13), time(10, 0), time(19, 0))#type:ignore
+    
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    # две недели, только понедельник-пятница
+    created_ids = schedule_service.bulk_add_schedules(master_ids, date(2025, 1, 13), date(2025, 1, 26),#type:ignore
+                                                      time(9, 0), time(18, 0), weekdays=[0, 1, 2, 3, 4])
+    assert len(queries) <= 4
+    
+    assert len(created_ids) == 3 * 10 - 1
+    assert session.query(MasterSchedule).count() == 30
+    existing = schedule_service.get_schedule_by_date(master_ids[0], date(2025, 1, 13))#type:ignore
+    assert existing.start_time == time(10, 0)#type:ignore
+    
+    # повторный вызов на все дни добавляет только выходные
+    weekend_ids = schedule_service.bulk_add_schedules(master_ids, date(2025, 1, 13), date(2025, 1, 26), time(9, 0), time(18, 0))#type:ignore
+    assert len(weekend_ids) == 3 * 4
+    assert schedule_service.bulk_add_schedule(master_ids[1], date(2025, 1, 13), date(2025, 1, 26), time(9, 0), time(18, 0)) == []#type:ignore
+    
+    print("test_bulk_add_schedules_many_masters")
+    session.close()
+
+def test_appointments_keyset_pages():
+    """Тест постраничного просмотра записей при одинаковом времени начала"""
+    from management.schedule_management import AppointmentService
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    # по две записи на каждое время: порядок внутри одного времени задает appointment_id
+    for i in range(7):
+        start = datetime(2025, 1, 15, 10, 0) + timedelta(hours=i // 2)
+        session.add(Appointment(master_id=1 + i % 2, client_id=1, service_id=1, schedule_id=1, start_datetime=start,
+                                end_datetime=start + timedelta(hours=1),
+                                status=AppointmentStatus.CANCELLED if i == 3 else AppointmentStatus.SCHEDULED))
+    session.add(Appointment(master_id=1, client_id=1, service_id=1, schedule_id=2, start_datetime=datetime(2025, 1, 16, 10, 0),
+                            end_datetime=datetime(2025, 1, 16, 11, 0), status=AppointmentStatus.SCHEDULED))
+    session.commit()
+    
+    appointment_service = AppointmentService(session)
+    seen = []
+    after = None
+    while True:
+        page = appointment_service.get_appointments_page(3, after, start_date=date(2025, 1, 15), end_date=date(2025, 1, 15))
+        if not page:
+            break
+        seen.extend(appointment.appointment_id for appointment in page)
+        after = (page[-1].start_datetime, page[-1].appointment_id)
+    assert seen == [1, 2, 3, 4, 5, 6, 7]
+    
+    scheduled = appointment_service.get_appointments_page(10, (datetime(2025, 1, 15, 11, 0), 3), status=AppointmentStatus.SCHEDULED)
+    assert [appointment.appointment_id for appointment in scheduled] == [5, 6, 7, 8]
+    
+    print("test_appointments_keyset_pages")
+    session.close()
+
+def test_appointment_lists_constant_queries():
+    """Тест: вывод списка записей не делает запрос на каждую запись"""
+    import io
+    import contextlib
+    from sqlalchemy import event
+    from management.schedule_management import AppointmentService, AppointmentLoadProfile
+    from models.masters import Master
+    from models.clients import Client
+    from models.services import Service
+    from user_interface.Schedule_UI import ScheduleUI, AppointmentUI
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    session.add(Master(master_id=1, first_name="Мастер", last_name="Один", phone="+79990000001", email="m@test.ru", specialty="Парикмахер"))
+    session.add(MasterSchedule(schedule_id=1, master_id=1, work_date=date(2025, 1, 15), start_time=time(9, 0), end_time=time(21, 0)))
+    session.add(Service(service_id=1, service_name="Стрижка", duration_minutes=30, price=1000))
+    for i in range(12):
+        session.add(Client(client_id=i + 1, first_name="Клиент", last_name=str(i), phone=f"+7911000{i:04d}", password_hash="x"))
+        start = datetime(2025, 1, 15, 9, 0) + timedelta(minutes=30 * i)
+        session.add(Appointment(master_id=1, client_id=i + 1, service_id=1, schedule_id=1, start_datetime=start,
+                                end_datetime=start + timedelta(minutes=30), status=AppointmentStatus.SCHEDULED))
+    session.commit()
+    
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    appointment_service = AppointmentService(session)
+    
+    def count_queries(render):
+        session.expunge_all()
+        queries.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            render()
+        return len(queries)
+    
+    assert count_queries(lambda: AppointmentUI.show_appointment_list(appointment_service.get_all_appointments())) == 1
+    assert count_queries(lambda: AppointmentUI.show_appointment_list(appointment_service.get_client_appointments(5))) == 1
+    
+    schedule_service = ScheduleService(session)
+    assert count_queries(lambda: ScheduleUI.show_schedule_details(schedule_service.get_schedule_by_id(1),
+                                                                  appointment_service.get_master_appointments(1, date(2025, 1, 15)))) == 3
+    
+    detailed = count_queries(lambda: [(appointment.client.salon_card, appointment.service.category, appointment.schedule_day.breaks)
+                                      for appointment in appointment_service.get_all_appointments(profile=AppointmentLoadProfile.DETAIL)])
+    assert detailed == 2
+    
+    lazy = count_queries(lambda: AppointmentUI.show_appointment_list(
+        appointment_service.get_all_appointments(profile=AppointmentLoadProfile.LAZY)))
+    assert lazy > 12
+    
+    print("test_appointment_lists_constant_queries")
+    session.close()
+
+def test_free_start_cells_matches_find_free_slots():
+    """Тест: поиск по маске ячеек совпадает с интервальным поиском для выровненных интервалов"""
+    rnd = random.Random(7)
+    day = date(2025, 1, 15)
+    midnight = datetime.combine(day, time(0, 0))
+    
+    for _ in range(300):
+        first_cell = rnd.randint(12, 24)
+        last_cell = min(first_cell + rnd.randint(2, 26), 47)
+        busy = []
+        for _ in range(rnd.randint(0, 8)):
+            start = rnd.randint(first_cell - 2, last_cell)
+            busy.append((start, start + rnd.randint(1, 4)))
+        
+        mask = 0
+        for start, end in busy:
+            mask |= interval_mask(time(start // 2, start % 2 * 30), time(min(end, 47) // 2, min(end, 47) % 2 * 30)) or 0
+        intervals = [(midnight + timedelta(minutes=30 * start), midnight + timedelta(minutes=30 * min(end, 47))) for start, end in busy]
+        
+        cells = rnd.randint(1, 4)
+        expected = find_free_slots(midnight + timedelta(minutes=30 * first_cell), midnight + timedelta(minutes=30 * last_cell),
+                                   intervals, cells * 30)
+        assert [midnight + timedelta(minutes=30 * cell) for cell in free_start_cells(mask, first_cell, last_cell, cells)] == expected
+    
+    print("test_free_start_cells_matches_find_free_slots")
+
+def test_occupancy_mask():
+    """Тест: маска занятости дня ведется сервисами и заменяет запросы к записям и перерывам"""
+    from sqlalchemy import event, text
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService, schedule_slots
+    from models.base import create_schema
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    category = CategoryService(session).create_category("стрижки")
+    service = ServiceService(session).create_service("Стрижка", 60, 1500, category.category_id)#type:ignore
+    master = MasterService(session).create_master("Тест", "Мастер", "+79991112233", "test@test.ru", "Парикмахер",
+                                                  category_ids=[category.category_id])#type:ignore
+    client = ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "pass")
+    schedule_service = ScheduleService(session)
+    appointment_service = AppointmentService(session)
+    
+    schedule = schedule_service.add_work_day(master.master_id, date(2025, 1, 15), time(9, 0), time(14, 0))#type:ignore
+    schedule_id = schedule.schedule_id
+    assert schedule.occupancy_mask == 0
+    lunch = schedule_service.add_break(schedule_id, time(12, 0), time(12, 30), "Обед")#type:ignore
+    appointment = appointment_service.create_appointment(client.client_id, service.service_id, schedule_id,#type:ignore
+                                                         datetime(2025, 1, 15, 10, 0))
+    # ячейка i - получас с 00:00: 10:00-11:00 -> 20, 21; 12:00-12:30 -> 24
+    assert schedule_service.get_schedule_by_id(schedule_id).occupancy_mask == (1 << 20) | (1 << 21) | (1 << 24)#type:ignore
+    
+    session.expire_all()
+    queries = []
+    count_query = lambda *args: queries.append(args[2])
+    event.listen(engine, "before_cursor_execute", count_query)
+    slots = schedule_service.get_available_time_slots(schedule_id, 60)#type:ignore
+    event.remove(engine, "before_cursor_execute", count_query)
+    assert len(queries) == 1 and "appointments" not in queries[0]
+    assert [slot.strftime("%H:%M") for slot in slots] == ["09:00", "11:00", "12:30", "13:00"]
+    
+    # перерыв поверх записи: после отмены записи ячейка перерыва остается занятой
+    schedule_service.add_break(schedule_id, time(10, 30), time(11, 30))#type:ignore
+    appointment_service.client_cancel_appointment(appointment.appointment_id, client.client_id)#type:ignore
+    assert schedule_service.get_schedule_by_id(schedule_id).occupancy_mask == (1 << 21) | (1 << 22) | (1 << 24)#type:ignore
+    assert schedule_service.remove_break(lunch.break_id)#type:ignore
+    assert schedule_service.get_schedule_by_id(schedule_id).occupancy_mask == (1 << 21) | (1 << 22)#type:ignore
+    assert schedule_service.check_occupancy() == []
+    
+    # запись в обход сервиса обнаруживается сверкой и исправляется пересчетом
+    session.add(Appointment(master_id=master.master_id, client_id=client.client_id, service_id=service.service_id, schedule_id=schedule_id,
+                            start_datetime=datetime(2025, 1, 15, 9, 0), end_datetime=datetime(2025, 1, 15, 10, 0)))
+    session.commit()
+    assert schedule_service.check_occupancy() == [schedule_id]
+    assert schedule_service.check_occupancy(rebuild=True) == [schedule_id]
+    assert schedule_service.check_occupancy() == []
+    
+    # невыровненный перерыв отключает маску, слоты считаются по записям и перерывам
+    schedule_service.add_break(schedule_id, time(12, 15), time(12, 45))#type:ignore
+    schedule = schedule_service.get_schedule_by_id(schedule_id)
+    assert schedule.occupancy_mask is None#type:ignore
+    breaks = [(b.break_start, b.break_end) for b in schedule.breaks]#type:ignore
+    expected = schedule_slots(schedule, breaks, [(datetime(2025, 1, 15, 9, 0), datetime(2025, 1, 15, 10, 0))], 30)#type:ignore
+    assert schedule_service.get_available_time_slots(schedule_id, 30) == expected#type:ignore
+    assert schedule_service.check_occupancy() == []
+    session.close()
+    
+    # старая база без столбца: create_schema добавляет его, маски строятся пересчетом
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE master_schedule DROP COLUMN occupancy_mask"))
+    create_schema(engine)
+    session = sessionmaker(engine)()
+    assert ScheduleService(session).get_schedule_by_id(schedule_id).occupancy_mask is None#type:ignore
+    assert ScheduleService(session).check_occupancy(rebuild=True) == []
+    session.close()
+    
+    print("test_occupancy_mask")
+
+def test_availability_grid():
+    """Тест сетки свободного времени: совпадает со слотами сервиса и строится одним запросом"""
+    from sqlalchemy import event
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService
+    from user_interface.Schedule_UI import ScheduleUI
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    category = CategoryService(session).create_category("маникюр")
+    other = CategoryService(session).create_category("стрижки")
+    service = ServiceService(session).create_service("Маникюр", 90, 2000, category.category_id)#type:ignore
+    client = ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "pass")
+    schedule_service = ScheduleService(session)
+    tuesday = date(2025, 1, 14)
+    
+    masters = []
+    for i, (start, end) in enumerate([(time(9, 0), time(18, 0)), (time(12, 0), time(16, 0)), (time(9, 0), time(13, 0))]):
+        master = MasterService(session).create_master("Мастер", str(i), f"+7999000000{i}", f"m{i}@test.ru", "Маникюр",
+                                                      category_ids=[category.category_id if i < 2 else other.category_id])#type:ignore
+        masters.append(master.master_id)
+        schedule_service.bulk_add_schedule(master.master_id, tuesday - timedelta(days=1), tuesday + timedelta(days=5), start, end)#type:ignore
+    schedule = schedule_service.get_schedule_by_date(masters[0], tuesday)
+    schedule_service.add_break(schedule.schedule_id, time(13, 0), time(14, 0))#type:ignore
+    AppointmentService(session).create_appointment(client.client_id, service.service_id, schedule.schedule_id,#type:ignore
+                                                   datetime(2025, 1, 14, 14, 0))
+    second = schedule_service.get_schedule_by_date(masters[1], tuesday)
+    AppointmentService(session).create_appointment(client.client_id, service.service_id, second.schedule_id,#type:ignore
+                                                   datetime(2025, 1, 14, 12, 30))
+    # день без маски (перерыв не на границе получаса) считается по перерывам и записям
+    schedule_service.add_break(schedule_service.get_schedule_id_by_date(masters[0], tuesday + timedelta(days=1)), time(9, 0), time(9, 45))#type:ignore
+    
+    session.expire_all()
+    queries = []
+    count_query = lambda *args: queries.append(args[2])
+    event.listen(engine, "before_cursor_execute", count_query)
+    grid = schedule_service.get_availability_grid(tuesday - timedelta(days=1), tuesday + timedelta(days=5))
+    event.remove(engine, "before_cursor_execute", count_query)
+    assert len(queries) == 3
+    
+    assert grid.master_ids == masters and grid.free.shape == (3, 7, 48)
+    for master_id in masters:
+        day_schedule = schedule_service.get_schedule_by_date(master_id, tuesday)
+        assert grid.slots(master_id, tuesday, 90) == schedule_service.get_available_time_slots(day_schedule.schedule_id, 90)#type:ignore
+    assert grid.slots(masters[0], tuesday + timedelta(days=1), 30)[0] == datetime(2025, 1, 15, 10, 0)
+    
+    # кто может взять 90 минут во вторник после обеда
+    assert grid.masters_with_room(90, tuesday, time(12, 0), time(18, 0)) == [masters[0], masters[1]]
+    assert grid.masters_with_room(150, tuesday, time(12, 0), time(18, 0)) == [masters[0]]
+    assert grid.masters_with_room(90, tuesday, time(9, 0), time(13, 0)) == [masters[0], masters[2]]
+    assert grid.masters_with_room(240, tuesday) == [masters[0], masters[2]]
+    assert grid.masters_with_room(270, tuesday) == []
+    assert grid.free_minutes()[1, 1] == 150
+    
+    assert schedule_service.get_availability_grid(tuesday, tuesday, category_id=other.category_id).master_ids == [masters[2]]
+    ScheduleUI.show_availability_grid(grid)
+    session.close()
+    
+    print("test_availability_grid")
+
+def test_occupancy_after_cascade_delete():
+    """Тест: удаление клиента или услуги освобождает ячейки их запланированных записей"""
+    from management.master_management import MasterService
+    from management.service_management import ServiceService, CategoryService
+    from management.client_management import ClientService
+    from management.schedule_management import AppointmentService
+    
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+    
+    category = CategoryService(session).create_category("стрижки")
+    haircut = ServiceService(session).create_service("Стрижка", 60, 1500, category.category_id)#type:ignore
+    styling = ServiceService(session).create_service("Укладка", 60, 1000, category.category_id)#type:ignore
+    master = MasterService(session).create_master("Тест", "Мастер", "+79991112233", "test@test.ru", "Парикмахер",
+                                                  category_ids=[category.category_id])#type:ignore
+    anna = ClientService(session).create_client("Анна", "Иванова", "+79990000001", "anna@test.ru", "pass")
+    olga = ClientService(session).create_client("Ольга", "Петрова", "+79990000002", "olga@test.ru", "pass")
+    schedule_service = ScheduleService(session)
+    appointment_service = AppointmentService(session)
+    schedule_id = schedule_service.add_work_day(master.master_id, date(2025, 1, 15), time(9, 0), time(12, 0)).schedule_id#type:ignore
+    
+    appointment_service.create_appointment(anna.client_id, haircut.service_id, schedule_id, datetime(2025, 1, 15, 9, 0))#type:ignore
+    appointment_service.create_appointment(olga.client_id, styling.service_id, schedule_id, datetime(2025, 1, 15, 10, 0))#type:ignore
+    appointment_service.create_appointment(olga.client_id, haircut.service_id, schedule_id, datetime(2025, 1, 15, 11, 0))#type:ignore
+    assert schedule_service.get_available_time_slots(schedule_id, 60) == []#type:ignore
+    
+    assert ClientService(session).delete_client(anna.client_id)#type:ignore
+    assert [slot.strftime("%H:%M") for slot in schedule_service.get_available_time_slots(schedule_id, 60)] == ["09:00"]#type:ignore
+    assert schedule_service.check_occupancy() == []
+    
+    assert ServiceService(session).delete_service(styling.service_id)#type:ignore
+    assert [slot.strftime("%H:%M") for slot in schedule_service.get_available_time_slots(schedule_id, 60)] == ["09:00", "09:30", "10:00"]#type:ignore
+    assert schedule_service.check_occupancy() == []
+    session.close()
+    
+    print("test_occupancy_after_cascade_delete")
+
 def run_all_tests():
     test_master_schedule_class()
     test_master_schedule_day_off()
@@ -172,6 +730,19 @@ def run_all_tests():
     test_appointment_status_enum()
     test_schedule_service_add_work_day()
     test_schedule_service_add_break()
+    test_find_free_slots_matches_naive()
+    test_schedule_service_available_time_slots()
+    test_find_available_masters_constant_queries()
+    test_find_next_available_slots()
+    test_master_schedule_unique_per_date()
+    test_concurrent_bookings_never_overlap()
+    test_bulk_add_schedules_many_masters()
+    test_appointments_keyset_pages()
+    test_appointment_lists_constant_queries()
+    test_free_start_cells_matches_find_free_slots()
+    test_occupancy_mask()
+    test_occupancy_after_cascade_delete()
+    test_availability_grid()
     
     print("ВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
 
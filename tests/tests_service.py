@@ -161,12 +161,70 @@ def test_delete_category_with_services():
         assert "Нельзя удалить категорию" in str(e)
         print("test_delete_category_with_services passed")
 
+# каталог читается из кэша и обновляется после изменений
+def test_catalog_cache():
+    from sqlalchemy import event
+    from sqlalchemy.orm.exc import DetachedInstanceError
+    from management.caches import catalog_cache
+    
+    session = setup_test_db()
+    category_service = CategoryService(session)
+    service_service = ServiceService(session)
+    
+    category = category_service.create_category("маникюр")
+    service = service_service.create_service("Маникюр", 60, 2000, category.category_id)#type: ignore
+    service_id = service.service_id
+    category_id = category.category_id
+    
+    queries = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: queries.append(args[2]))
+    assert [s.service_name for s in service_service.get_all_services()] == ["Маникюр"]
+    first_load = len(queries)
+    assert first_load == 2
+    
+    cached = service_service.get_service_by_id(service_id)#type: ignore
+    assert cached is not None
+    assert cached.category.category_name == "маникюр"
+    assert len(service_service.get_services_by_category(category_id)) == 1#type: ignore
+    assert len(category_service.get_all_categories()) == 1
+    assert len(queries) == first_load
+    
+    # каждый вызов получает свои копии: изменение одной не видно другим читателям
+    cached.price = 1#type: ignore
+    cached.category.category_name = "изменено"#type: ignore
+    again = service_service.get_service_by_id(service_id)#type: ignore
+    assert again is not cached and again.price == 2000 and again.category.category_name == "маникюр"#type: ignore
+    # связи, кроме service.category, у копий не загружены
+    try:
+        again.appointments#type: ignore
+        assert False
+    except DetachedInstanceError:
+        pass
+    assert len(queries) == first_load
+    
+    service_service.update_service(service_id, "price", "2500")#type: ignore
+    assert service_service.get_service_by_id(service_id).price == 2500#type: ignore
+    
+    service_service.delete_service(service_id)#type: ignore
+    assert service_service.get_service_by_id(service_id) is None#type: ignore
+    category_service.delete_category(category_id)#type: ignore
+    assert category_service.get_all_categories() == []
+    
+    # изменения другого процесса видны после истечения TTL
+    session.add(ServiceCategory(category_name="стрижка"))
+    session.commit()
+    assert category_service.get_all_categories() == []
+    catalog_cache(session).ttl_seconds = 0
+    assert [c.category_name for c in category_service.get_all_categories()] == ["стрижка"]
+    print("test_catalog_cache passed")
+
 def run_all_tests():
     test_service_creation()
     test_service_good_format_time()
     test_delete_service_function()
     test_delete_service_not_found()
     test_service_by_id_function()
+    test_catalog_cache()
     print("ВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from management.statistics_management import StatisticsService
+from management.schedule_management import AppointmentService
+from models.schedule import MasterSchedule, Appointment, MasterBreak, AppointmentStatus
+from models.masters import Master
+from models.clients import Client, SalonCard, DiscountLevel
+from models.services import Service, ServiceCategory
+from models.base import Base
+from models.statistics import DailyStats
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime, date, time, timedelta
+
+def setup_salon():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(engine)()
+
+    session.add(ServiceCategory(category_id=1, category_name="стрижки"))
+    session.add_all([Service(service_id=1, service_name="Стрижка", duration_minutes=60, price=1000, category_id=1),
+                     Service(service_id=2, service_name="Окрашивание", duration_minutes=120, price=3000, category_id=1)])
+    session.add_all([Master(master_id=1, first_name="Анна", last_name="Первая", phone="+79990000001", specialty="Парикмахер"),
+                     Master(master_id=2, first_name="Олег", last_name="Второй", phone="+79990000002", specialty="Колорист"),
+                     Master(master_id=3, first_name="Иван", last_name="Без работы", phone="+79990000003", specialty="Колорист")])
+    session.add_all([Client(client_id=1, first_name="Клиент", last_name="Один", phone="+79110000001", password_hash="x"),
+                     Client(client_id=2, first_name="Клиент", last_name="Два", phone="+79110000002", password_hash="x")])
+    session.add_all([SalonCard(client_id=1, discount_level=DiscountLevel.STANDARD, total_spent=0),
+                     SalonCard(client_id=2, discount_level=DiscountLevel.GOLD, total_spent=20000)])
+
+    # мастер 1: 9 часов минус час перерыва, мастер 2: 8 часов
+    session.add_all([MasterSchedule(schedule_id=1, master_id=1, work_date=date(2024, 3, 4), start_time=time(9, 0), end_time=time(18, 0)),
+                     MasterSchedule(schedule_id=2, master_id=2, work_date=date(2024, 3, 4), start_time=time(10, 0), end_time=time(18, 0)),
+                     MasterSchedule(schedule_id=3, master_id=2, work_date=date(2024, 3, 5), start_time=time(0, 0), end_time=time(0, 0), is_day_off=True)])
+    session.add(MasterBreak(schedule_id=1, break_start=time(13, 0), break_end=time(14, 0)))
+
+    def add(appointment_id, master_id, schedule_id, service_id, hour, minutes, status):
+        start = datetime(2024, 3, 4, hour, 0)
+        session.add(Appointment(appointment_id=appointment_id, master_id=master_id, client_id=1, service_id=service_id, schedule_id=schedule_id,
+                                start_datetime=start, end_datetime=start + timedelta(minutes=minutes), status=status))
+    add(1, 1, 1, 1, 9, 60, AppointmentStatus.COMPLETED)
+    add(2, 1, 1, 1, 10, 60, AppointmentStatus.NO_SHOW)
+    add(3, 1, 1, 1, 11, 60, AppointmentStatus.CANCELLED)
+    add(4, 2, 2, 2, 10, 120, AppointmentStatus.COMPLETED)
+    add(5, 2, 2, 1, 12, 60, AppointmentStatus.SCHEDULED)
+    session.commit()
+    StatisticsService(session).rebuild_daily_stats()
+    return engine, session
+
+def test_salon_report():
+    engine, session = setup_salon()
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    report = StatisticsService(session).get_salon_report(date(2024, 3, 1), date(2024, 3, 31))
+    assert len(queries) == 2 + 1 # + проверка, закрыт ли прошедший период
+
+    assert report.revenue == 4000
+    assert report.booked_hours == 4
+    assert abs(report.no_show_rate - 1 / 3) < 1e-9
+    assert [master.master_id for master in report.masters] == [2, 1]
+
+    oleg, anna = report.masters
+    assert oleg.revenue_rank == 1 and anna.revenue_rank == 2
+    assert oleg.revenue_share == 0.75
+    assert oleg.work_minutes == 480 and oleg.booked_minutes == 180
+    assert anna.work_minutes == 480 and anna.booked_minutes == 60
+    assert (anna.completed, anna.no_show, anna.cancelled) == (1, 1, 1)
+    assert report.utilisation == 240 / 960
+    assert report.tier_distribution[DiscountLevel.GOLD] == 1
+    assert report.tier_distribution[DiscountLevel.PLATINUM] == 0
+
+    print("test_salon_report")
+    session.close()
+
+def test_closed_period_cached():
+    from management.caches import report_cache
+    
+    engine, session = setup_salon()
+    statistics_service = StatisticsService(session)
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    
+    # в периоде осталась незакрытая запись 5 - отчет не кэшируется
+    statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31))
+    queries.clear()
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 4000
+    assert len(queries) > 1
+    
+    AppointmentService(session).update_appointment_status(5, AppointmentStatus.COMPLETED)
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 5000
+    queries.clear()
+    cached = statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31))
+    assert len(queries) == 1
+    assert cached.revenue == 5000
+    # каждый вызов получает свой объект отчета: изменения одного не видны другим
+    cached.tier_distribution.clear()
+    cached.masters.pop()
+    again = statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31))
+    assert again is not cached and len(again.masters) == 2
+    assert again.tier_distribution[DiscountLevel.GOLD] == 1
+
+    # изменение записи задним числом сбрасывает отчеты за этот день
+    AppointmentService(session).update_appointment_status(5, AppointmentStatus.NO_SHOW)
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 4000
+    
+    # изменения из другого процесса кэш не видит - отчет устаревает по времени
+    report_cache(session).ttl_seconds = 0
+    queries.clear()
+    statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31))
+    assert len(queries) > 1
+
+    print("test_closed_period_cached")
+    session.close()
+
+def test_daily_stats_incremental_matches_rebuild():
+    from sqlalchemy import select, update
+    from exceptions import ScheduleError
+    from management.master_management import MasterService
+    
+    engine, session = setup_salon()
+    session.add(Client(client_id=3, first_name="Клиент", last_name="Три", phone="+79110000003", password_hash="x"))
+    session.add(SalonCard(client_id=3, discount_level=DiscountLevel.PLATINUM, total_spent=40000))
+    session.commit()
+    MasterService(session).add_categories_to_master(1, [1])
+    
+    appointment_service = AppointmentService(session)
+    created = appointment_service.create_appointment(3, 2, 1, datetime(2024, 3, 4, 14, 0))
+    appointment_service.update_appointment_status(created.appointment_id, AppointmentStatus.COMPLETED)#type:ignore
+    second = appointment_service.create_appointment(2, 1, 1, datetime(2024, 3, 4, 16, 0))
+    appointment_service.admin_cancel_appointment(second.appointment_id)#type:ignore
+    appointment_service.update_appointment_status(2, AppointmentStatus.COMPLETED)
+    
+    def snapshot():
+        return sorted(tuple(row) for row in session.execute(select(DailyStats.__table__)))
+    incremental = snapshot()
+    
+    statistics_service = StatisticsService(session)
+    assert statistics_service.rebuild_daily_stats(chunk_days=1) == len(incremental)
+    assert snapshot() == incremental
+    
+    # сбой посреди пересчета откатывает и удаление: прежняя сводка остается целой
+    def fail_insert(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO daily_stats"):
+            raise RuntimeError("сбой вставки")
+    event.listen(engine, "before_cursor_execute", fail_insert)
+    try:
+        statistics_service.rebuild_daily_stats()
+        assert False, "ожидалась ошибка"
+    except RuntimeError:
+        pass
+    event.remove(engine, "before_cursor_execute", fail_insert)
+    assert snapshot() == incremental
+    
+    report = statistics_service.get_salon_report(date(2024, 3, 4), date(2024, 3, 4))
+    assert report.revenue == 4000 + 3000 + 1000
+    assert report.discounted_revenue == 4000 + 3000 * 0.9 + 1000
+    
+    print("test_daily_stats_incremental_matches_rebuild")
+    session.close()
+
+def test_close_day():
+    from sqlalchemy import select, update
+    from exceptions import ScheduleError
+    
+    engine, session = setup_salon()
+    start = datetime(2024, 3, 4, 15, 0)
+    session.add(Appointment(appointment_id=6, master_id=1, client_id=2, service_id=2, schedule_id=1, start_datetime=start,
+                            end_datetime=start + timedelta(minutes=120), status=AppointmentStatus.SCHEDULED))
+    session.commit()
+    StatisticsService(session).rebuild_daily_stats()
+    appointment_service = AppointmentService(session)
+    
+    # запись 6 еще не закончилась
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    assert appointment_service.close_day(until=datetime(2024, 3, 4, 14, 0)) == (1, 1)
+    assert len(queries) == 5 + 1 + 4 # + выручка выполненных записей и пересчет масок затронутых дней
+    assert session.get(Appointment, 5).status == AppointmentStatus.COMPLETED#type:ignore
+    assert session.get(Appointment, 6).status == AppointmentStatus.SCHEDULED#type:ignore
+    assert session.get(SalonCard, 1).total_spent == 1000#type:ignore
+    
+    try:
+        appointment_service.close_day(status=AppointmentStatus.CANCELLED)
+        assert False
+    except ScheduleError:
+        pass
+    
+    # услуга записи не найдена: закрытие откатывается целиком, покупки не проводятся
+    session.execute(update(Appointment).where(Appointment.appointment_id == 6).values(service_id=99))
+    session.commit()
+    try:
+        appointment_service.close_day(until=datetime(2024, 3, 4, 18, 0))
+        assert False
+    except ScheduleError:
+        pass
+    assert session.get(Appointment, 6).status == AppointmentStatus.SCHEDULED#type:ignore
+    assert session.get(SalonCard, 2).total_spent == 20000#type:ignore
+    session.execute(update(Appointment).where(Appointment.appointment_id == 6).values(service_id=2))
+    session.commit()
+    
+    assert appointment_service.close_day(until=datetime(2024, 3, 4, 18, 0), status=AppointmentStatus.NO_SHOW) == (1, 0)
+    assert session.get(SalonCard, 2).total_spent == 20000#type:ignore
+    # повторный запуск ничего не меняет
+    assert appointment_service.close_day(until=datetime(2024, 3, 4, 18, 0)) == (0, 0)
+    assert session.get(SalonCard, 1).total_spent == 1000#type:ignore
+    
+    def snapshot():
+        return sorted(tuple(row) for row in session.execute(select(DailyStats.__table__)))
+    incremental = snapshot()
+    StatisticsService(session).rebuild_daily_stats()
+    assert snapshot() == incremental
+    
+    report = StatisticsService(session).get_salon_report(date(2024, 3, 4), date(2024, 3, 4))
+    assert report.revenue == 5000
+    assert abs(report.no_show_rate - 2 / 5) < 1e-9
+    
+    print("test_close_day")
+    session.close()
+
+def test_daily_stats_reversal_and_deletes():
+    from sqlalchemy import select, update
+    from exceptions import ScheduleError
+    from management.master_management import MasterService
+    from management.client_management import ClientService
+    from management.service_management import ServiceService
+    
+    engine, session = setup_salon()
+    MasterService(session).add_categories_to_master(1, [1])
+    appointment_service = AppointmentService(session)
+    statistics_service = StatisticsService(session)
+    
+    def snapshot():
+        # суммы со скидкой складываются в разном порядке - сравниваются с точностью до копейки
+        return sorted(tuple(round(value, 2) if isinstance(value, float) else value for value in row)
+                      for row in session.execute(select(DailyStats.__table__)))
+    def matches_rebuild():
+        incremental = snapshot()
+        statistics_service.rebuild_daily_stats()
+        return snapshot() == incremental
+    
+    # выполнение учитывается по карте GOLD; после роста уровня отмена выполнения вычитает ту же сумму
+    created = appointment_service.create_appointment(2, 1, 1, datetime(2024, 3, 4, 15, 0))
+    appointment_service.update_appointment_status(created.appointment_id, AppointmentStatus.COMPLETED)#type:ignore
+    assert session.get(Appointment, created.appointment_id).completed_discounted_price == 1000 * (1 - 0.07)#type:ignore
+    session.get(SalonCard, 2).discount_level = DiscountLevel.PLATINUM#type:ignore
+    session.commit()
+    appointment_service.update_appointment_status(created.appointment_id, AppointmentStatus.NO_SHOW)#type:ignore
+    assert matches_rebuild()
+    
+    # услуга записи не найдена - выполнение не учитывается нулевой выручкой, а прерывается
+    session.execute(update(Appointment).where(Appointment.appointment_id == 5).values(service_id=99))
+    try:
+        appointment_service.update_appointment_status(5, AppointmentStatus.COMPLETED)
+        assert False, "ожидалась ScheduleError"
+    except ScheduleError:
+        session.rollback()
+    assert session.get(Appointment, 5).status == AppointmentStatus.SCHEDULED#type:ignore
+    
+    # записи, удаленные вместе с клиентом, услугой или мастером, вычитаются из сводки
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 4000
+    assert ClientService(session).delete_client(2)
+    assert matches_rebuild()
+    assert ServiceService(session).delete_service(2)
+    assert matches_rebuild()
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 1000
+    assert MasterService(session).delete_master(1)
+    assert matches_rebuild()
+    assert statistics_service.get_salon_report(date(2024, 3, 1), date(2024, 3, 31)).revenue == 0
+    
+    print("test_daily_stats_reversal_and_deletes")
+    session.close()
+
+def run_all_tests():
+    test_salon_report()
+    test_closed_period_cached()
+    test_daily_stats_incremental_matches_rebuild()
+    test_close_day()
+    test_daily_stats_reversal_and_deletes()
+    print("\nВСЕ ТЕСТЫ ПРОЙДЕНЫ!")
+
+if __name__ == "__main__":
+    run_all_tests()
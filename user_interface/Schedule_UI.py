@@ -1,7 +1,7 @@
 from models.schedule import MasterSchedule, MasterBreak, Appointment, AppointmentStatus
 from models.masters import Master
 from management.master_management import MasterService
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime, date
 
 # Класс для вывода информации о расписании
@@ -43,7 +43,7 @@ class ScheduleUI:
             i = 1
             for appointment in appointments:                    
                 print(f" {i}) {appointment.start_datetime.strftime('%H:%M')} - Клиент: {appointment.client.full_name}")
-                print(f"     Услуга: {appointment.service.service_name} | Статус: {appointment.status.value} | Длительность: {appointment.service.duration}")
+                print(f"     Услуга: {appointment.service.service_name} | Статус: {appointment.status.value} | Длительность: {appointment.service.good_format_time}")
                 if appointment.notes: #type: ignore
                     print(f" Заметки: {appointment.notes}")
         else:
@@ -122,6 +122,41 @@ class ScheduleUI:
             i += 1
         print()
 
+    @staticmethod
+    def show_availability_grid(grid) -> None:
+        """
+        Показывает сетку свободного времени: день - блок, мастер - строка, получас - символ.
+        
+        Args:
+            grid: AvailabilityGrid из ScheduleService.get_availability_grid
+        """
+        working_cells = grid.work.any(axis=(0, 1)).nonzero()[0]
+        if not grid.master_ids or not len(working_cells):
+            print("Нет рабочих дней мастеров за выбранный период")
+            print()
+            return
+        
+        first_cell, last_cell = int(working_cells[0]), int(working_cells[-1]) + 1
+        # ширина первой колонки: имя мастера или "Пн 01.01.2025"
+        name_width = max(min(max(len(name) for name in grid.master_names), 24), 13)
+        weekdays = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+        hours = "".join(f"{cell // 2:02d}" if cell % 2 == 0 else "" for cell in range(first_cell + first_cell % 2, last_cell))
+        free_minutes = grid.free_minutes()
+        
+        print("СВОБОДНОЕ ВРЕМЯ МАСТЕРОВ")
+        print()
+        for day, work_date in enumerate(grid.dates):
+            day_label = f"{weekdays[work_date.weekday()]} {work_date.strftime('%d.%m.%Y')}"
+            print(f"{day_label:<{name_width}} {' ' * (first_cell % 2)}{hours}")
+            for master, name in enumerate(grid.master_names):
+                cells = "".join("." if grid.free[master, day, cell] else "#" if grid.work[master, day, cell] else " "
+                                for cell in range(first_cell, last_cell))
+                summary = f"{free_minutes[master, day] / 60:.1f} ч" if grid.schedule_ids[master, day] else "не работает"
+                print(f"{name[:name_width]:<{name_width}} {cells} {summary}")
+            print()
+        print(". свободно   # занято   пробел - нерабочее время")
+        print()
+
 # Класс для вывода информации о записях
 class AppointmentUI:
     @staticmethod
@@ -248,4 +283,24 @@ class AppointmentUI:
         for i, master in enumerate(masters, 1):
             print(f"  {i}) {master.full_name} - {master.specialty}")
             print(f"     Телефон: {master.phone}")
-            print()
\ No newline at end of file
+            print()
+
+    @staticmethod
+    def show_nearest_slots(options: List[Tuple[Master, datetime, int]], service_name: str) -> None:
+        """
+        Показывает ближайшие свободные времена для услуги у разных мастеров.
+        
+        Args:
+            options: Список (мастер, время начала, ID расписания)
+            service_name: Название услуги
+        """
+        if not options:
+            print(f"Нет свободного времени для услуги '{service_name}' в ближайшие дни")
+            print()
+            return
+        
+        print(f"БЛИЖАЙШЕЕ СВОБОДНОЕ ВРЕМЯ ДЛЯ УСЛУГИ '{service_name}'")
+        print()
+        for i, (master, start_datetime, _) in enumerate(options, 1):
+            print(f"  {i}) {start_datetime.strftime('%d.%m.%Y %H:%M')} - {master.full_name} ({master.specialty})")
+        print()
@@ -0,0 +1,69 @@
+from typing import Tuple, Optional
+from datetime import date, datetime, timedelta
+from management.statistics_management import SalonReport
+
+#Класс для вывода статистики салона
+class StatisticsUI:
+    @staticmethod
+    def show_period_prompt() -> Optional[Tuple[date, date]]:
+        """
+        Спрашивает период отчета
+
+        Returns:
+            Optional[Tuple[date, date]]: (первый день, последний день) или None при неверном вводе
+        """
+        print("\nПериод:")
+        print("1. Текущий месяц")
+        print("2. Прошлый месяц")
+        print("3. Последние 7 дней")
+        print("4. Произвольный период")
+        choice = input("Выберите период (1-4): ").strip()
+
+        today = date.today()
+        month_start = today.replace(day=1)
+        if choice == "1":
+            return month_start, today
+        if choice == "2":
+            previous_month_end = month_start - timedelta(days=1)
+            return previous_month_end.replace(day=1), previous_month_end
+        if choice == "3":
+            return today - timedelta(days=6), today
+        if choice == "4":
+            try:
+                start_date = datetime.strptime(input("Начало (ДД.ММ.ГГГГ): ").strip(), "%d.%m.%Y").date()
+                end_date = datetime.strptime(input("Конец (ДД.ММ.ГГГГ): ").strip(), "%d.%m.%Y").date()
+                return start_date, end_date
+            except ValueError:
+                print("Неверный формат даты")
+                return None
+        print("Неверный выбор периода")
+        return None
+
+    @staticmethod
+    def show_salon_report(report: SalonReport) -> None:
+        """
+        Показывает сводный отчет салона
+
+        Args:
+            report: Отчет за период
+        """
+        print("\n" + "=" * 40)
+        print(f"СТАТИСТИКА {report.start_date.strftime('%d.%m.%Y')} - {report.end_date.strftime('%d.%m.%Y')}")
+        print("=" * 40)
+        print(f"Выручка: {report.revenue:.2f} руб.")
+        print(f"Выручка со скидками по картам: {report.discounted_revenue:.2f} руб.")
+        print(f"Занято часов: {report.booked_hours:.1f}")
+        print(f"Загрузка мастеров: {report.utilisation:.0%}")
+        print(f"Доля неявок: {report.no_show_rate:.0%}")
+
+        print("\nМастера:")
+        if not report.masters:
+            print("  Нет данных за период")
+        for master in report.masters:
+            print(f"  {master.revenue_rank}) {master.full_name}: {master.revenue:.2f} руб. ({master.revenue_share:.0%}), "
+                  f"загрузка {master.utilisation:.0%}, выполнено {master.completed}, неявок {master.no_show}, отмен {master.cancelled}")
+
+        print("\nКарты лояльности:")
+        for level, count in report.tier_distribution.items():
+            print(f"  {level.value}: {count}")
+        print("=" * 40)